@@ -39,10 +39,10 @@ class BFVDecryptor:
             The plaintext corresponding to the decrypted ciphertext.
         """
         (c0, c1) = (ciphertext.c0, ciphertext.c1)
-        intermed_message = c0.add(c1.multiply(self.secret_key.s, self.ciph_modulus),
+        intermed_message = c0.add(self.secret_key.multiply(c1, self.ciph_modulus),
                                   self.ciph_modulus)
         if c2:
-            secret_key_squared = self.secret_key.s.multiply(self.secret_key.s, self.ciph_modulus)
+            secret_key_squared = self.secret_key.multiply(self.secret_key.s, self.ciph_modulus)
             intermed_message = intermed_message.add(c2.multiply(secret_key_squared, self.ciph_modulus),
                                                     self.ciph_modulus)
 
@@ -3,6 +3,7 @@
 from util.ciphertext import Ciphertext
 from util.polynomial import Polynomial
 from util.random_sample import sample_triangle
+from util.ternary_polynomial import TernaryPolynomial
 
 
 class BFVEncryptor:
@@ -54,8 +55,9 @@ class BFVEncryptor:
                             sample_triangle(self.poly_degree))
         error2 = Polynomial(self.poly_degree,
                             [0] * self.poly_degree)
-        c0 = error1.add(p0.multiply(random_vec, self.coeff_modulus),
+        ternary_vec = TernaryPolynomial.from_polynomial(random_vec)
+        c0 = error1.add(ternary_vec.multiply(p0, self.coeff_modulus),
                         self.coeff_modulus).add(scaled_message, self.coeff_modulus)
-        c1 = error2.add(p1.multiply(random_vec, self.coeff_modulus), self.coeff_modulus)
+        c1 = error2.add(ternary_vec.multiply(p1, self.coeff_modulus), self.coeff_modulus)
 
         return Ciphertext(c0, c1)
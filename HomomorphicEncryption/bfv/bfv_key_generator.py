@@ -55,8 +55,8 @@ class BFVKeyGenerator:
                               sample_uniform(0, params.ciph_modulus, params.poly_degree))
         pk_error = Polynomial(params.poly_degree,
                               sample_triangle(params.poly_degree))
-        p0 = pk_error.add(pk_coeff.multiply(
-            self.secret_key.s, params.ciph_modulus), params.ciph_modulus).scalar_multiply(
+        p0 = pk_error.add(self.secret_key.multiply(
+            pk_coeff, params.ciph_modulus), params.ciph_modulus).scalar_multiply(
                 -1, params.ciph_modulus)
         p1 = pk_coeff
         self.public_key = PublicKey(p0, p1)
@@ -73,12 +73,12 @@ class BFVKeyGenerator:
 
         keys = [0] * num_levels
         power = 1
-        sk_squared = self.secret_key.s.multiply(self.secret_key.s, params.ciph_modulus)
+        sk_squared = self.secret_key.multiply(self.secret_key.s, params.ciph_modulus)
 
         for i in range(num_levels):
             k1 = Polynomial(params.poly_degree, sample_uniform(0, params.ciph_modulus, params.poly_degree))
             error = Polynomial(params.poly_degree, sample_triangle(params.poly_degree))
-            k0 = self.secret_key.s.multiply(k1, params.ciph_modulus).add(
+            k0 = self.secret_key.multiply(k1, params.ciph_modulus).add(
                     error, params.ciph_modulus).scalar_multiply(-1).add(
                         sk_squared.scalar_multiply(power), params.ciph_modulus).mod(params.ciph_modulus)
             keys[i] = (k0, k1)
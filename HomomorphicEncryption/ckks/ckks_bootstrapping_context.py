@@ -1,31 +1,63 @@
 """A module to encrypt for the CKKS scheme."""
 
 import math
+import os
 
+import numpy as np
+
+from ckks.ckks_linear_transform import LinearTransform
 from util.ciphertext import Ciphertext
 import util.matrix_operations
 from util.polynomial import Polynomial
+from util.polynomial_basis import chebyshev_interpolate
 from util.random_sample import sample_triangle
 
+EVAL_MOD_TAYLOR = 'taylor'
+EVAL_MOD_CHEBYSHEV = 'chebyshev'
+
+# Largest error of the Chebyshev approximation of sin(2 * pi * x) / (2 * pi) for
+# which the degree is chosen, and largest degree to try.
+EVAL_MOD_ERROR = 2 ** -25
+MAX_EVAL_MOD_DEGREE = 255
+
 class CKKSBootstrappingContext:
 
     """An object that stores information necessary for bootstrapping.
 
+    The encoding matrix encoding_mat0 is stored once as a complex ndarray.
+    The other matrices are derived from it when they are first encoded, as
+    transposed views and conjugates. If the parameters give a cache
+    directory, the matrices or FFT stages are saved to a file named after
+    the polynomial degree and the number of DFT levels, and loaded from it
+    by later contexts with the same parameters.
+
     Attributes:
         poly_degree: Polynomial degree of ring.
         old_modulus: Original modulus of initial ciphertext.
         num_taylor_iterations: Number of iterations to perform for Taylor series
             for exp.
-        encoding_mat0: Matrix for slot to coeff.
+        encoding_mat0: Matrix for slot to coeff, or None with dft_levels.
         encoding_mat1: Matrix for slot to coeff.
         encoding_mat_transpose0: Matrix for coeff to slot.
         encoding_mat_transpose1: Matrix for coeff to slot.
         encoding_mat_conj_transpose0: Matrix for coeff to slot.
         encoding_mat_conj_transpose1: Matrix for coeff to slot.
+        dft_levels: Number of levels of the factorized DFT for coeff to slot and
+            slot to coeff, or None to use the dense matrices.
+        fft_diagonals: Nonzero diagonals of the merged FFT stages, indexed by name.
+        transforms: LinearTransforms of the matrices, indexed by name and scaling factor.
+        cache_file: Path of the file with the saved matrices, or None.
+        eval_mod: EVAL_MOD_TAYLOR or EVAL_MOD_CHEBYSHEV.
+        eval_mod_range: Bound K on the slots before the modular reduction, with
+            EVAL_MOD_CHEBYSHEV.
+        eval_mod_coeffs: Chebyshev coefficients of the scaled cosine on [-1, 1],
+            with EVAL_MOD_CHEBYSHEV.
+        double_angle_constants: Constants of the double-angle steps, with
+            EVAL_MOD_CHEBYSHEV.
     """
 
     def __init__(self, params):
-        """Generates private/public key pair for CKKS scheme.
+        """Generates or loads the matrices for bootstrapping.
 
         Args:
             params (CKKSParameters): Parameters including polynomial degree,
@@ -34,49 +66,296 @@ class CKKSBootstrappingContext:
         self.poly_degree = params.poly_degree
         self.old_modulus = params.ciph_modulus
         self.num_taylor_iterations = params.num_taylor_iterations
-        self.generate_encoding_matrices()
+        self.dft_levels = params.dft_levels
+        self.generate_eval_mod(params)
+        self.transforms = {}
+        self.fft_diagonals = {}
+        self.encoding_mat0 = None
+        self.cache_file = None
+        if params.boot_cache_dir:
+            self.cache_file = os.path.join(
+                params.boot_cache_dir, 'ckks_boot_%d_%d.npz' % (self.poly_degree,
+                                                               self.dft_levels or 0))
+
+        if self.cache_file and os.path.exists(self.cache_file):
+            self.load(self.cache_file)
+            return
+
+        if self.dft_levels:
+            self.generate_fft_stages()
+        else:
+            self.generate_encoding_matrices()
+        if self.cache_file:
+            self.save(self.cache_file)
 
     def get_primitive_root(self, index):
         """Returns the ith out of the n roots of unity, where n is 2 * poly_degree.
 
         Args:
-            index (int): Index i to specify.
+            index (int or ndarray): Index i to specify.
 
         Returns:
             The ith out of nth root of unity.
         """
-        angle = math.pi * index / self.poly_degree
-        return complex(math.cos(angle), math.sin(angle))
+        return np.exp(1j * np.pi * np.asarray(index) / self.poly_degree)
+
+    def get_rotation_group(self):
+        """Returns the powers of 5 modulo 2 * poly_degree that index the slots.
+
+        Returns:
+            An ndarray with 5^i mod 2d for each slot i.
+        """
+        num_slots = self.poly_degree // 2
+        rot_group = np.ones(num_slots, dtype=np.int64)
+        for i in range(1, num_slots):
+            rot_group[i] = (5 * rot_group[i - 1]) % (2 * self.poly_degree)
+        return rot_group
 
     def generate_encoding_matrices(self):
         """Generates encoding matrices for coeff_to_slot and slot_to_coeff operations.
+
+        Entry (i, k) of encoding_mat0 is zeta_i^k for zeta_i = e^(pi * i * 5^i / d).
+        The exponents are reduced modulo 2d before the roots are looked up, so
+        each entry is computed directly instead of by repeated products.
+        """
+        num_slots = self.poly_degree // 2
+        exponents = np.outer(self.get_rotation_group(), np.arange(num_slots))
+        roots = self.get_primitive_root(np.arange(2 * self.poly_degree))
+        self.encoding_mat0 = roots[exponents % (2 * self.poly_degree)]
+
+    @property
+    def encoding_mat1(self):
+        """Returns the second matrix for slot to coeff.
+
+        Entry (i, k) is zeta_i^(k + d/2), and zeta_i^(d/2) = i for all roots.
+
+        Returns:
+            The matrix i * encoding_mat0.
+        """
+        return 1j * self.encoding_mat0
+
+    @property
+    def encoding_mat_transpose0(self):
+        """Returns the first matrix for coeff to slot.
+
+        Returns:
+            The transpose of encoding_mat0, as a view.
+        """
+        return self.encoding_mat0.T
+
+    @property
+    def encoding_mat_transpose1(self):
+        """Returns the second matrix for coeff to slot.
+
+        Returns:
+            The transpose of encoding_mat1.
+        """
+        return self.encoding_mat1.T
+
+    @property
+    def encoding_mat_conj_transpose0(self):
+        """Returns the first conjugate matrix for coeff to slot.
+
+        Returns:
+            The conjugate transpose of encoding_mat0.
+        """
+        return self.encoding_mat0.T.conj()
+
+    @property
+    def encoding_mat_conj_transpose1(self):
+        """Returns the second conjugate matrix for coeff to slot.
+
+        Returns:
+            The conjugate transpose of encoding_mat1.
+        """
+        return self.encoding_mat1.T.conj()
+
+    def save(self, path):
+        """Saves the encoding matrix or the FFT stages to a file.
+
+        Args:
+            path (str): Path of the .npz file.
+        """
+        arrays = {}
+        if self.encoding_mat0 is not None:
+            arrays['encoding_mat0'] = self.encoding_mat0
+        for name, diagonals in self.fft_diagonals.items():
+            for k, diag in diagonals.items():
+                arrays['%s:%d' % (name, k)] = diag
+        np.savez(path, **arrays)
+
+    def load(self, path):
+        """Loads the encoding matrix or the FFT stages saved by save.
+
+        Args:
+            path (str): Path of the .npz file.
+        """
+        with np.load(path) as arrays:
+            for key in arrays.files:
+                if key == 'encoding_mat0':
+                    self.encoding_mat0 = arrays[key]
+                else:
+                    name, k = key.rsplit(':', 1)
+                    self.fft_diagonals.setdefault(name, {})[int(k)] = arrays[key]
+
+    def generate_fft_stages(self):
+        """Factors the encoding matrices into merged FFT stages.
+
+        The encoding matrix encoding_mat0 is E = B_L * ... * B_1 * R, where R
+        is the bit-reversal permutation, and B_s is the sth butterfly stage of
+        FFTContext.embedding, which has only the diagonals 0, 2^(s-1) and
+        -2^(s-1). Since zeta_i^(d/2) = i for all roots, encoding_mat1 is i * E.
+
+        If the slots hold the coefficients in bit-reversed order, slot to
+        coeff is B * (z0 + i * z1), and coeff to slot is y + conj(y) and
+        -i * (y - conj(y)) for y = B^H * w / d, without the permutation R. The
+        L stages of B are merged into dft_levels groups S_1, ..., S_k, so
+        each transform takes dft_levels levels and a few rotations per level.
+
+        The stages are stored as 'slot_to_coeff_j' for S_(j+1), and
+        'coeff_to_slot_j' for S_(k-j)^H, in the order in which they are applied.
+        The factor i for z1 and the factors 1 / d and -i are merged into
+        'slot_to_coeff_0_i', 'coeff_to_slot_0' and 'coeff_to_slot_last_i'.
         """
         num_slots = self.poly_degree // 2
-        primitive_roots = [0] * num_slots
-        power = 1
-        for i in range(num_slots):
-            primitive_roots[i] = self.get_primitive_root(power)
-            power = (power * 5) % (2 * self.poly_degree)
-
-        # Compute matrices for slot to coeff transformation.
-        self.encoding_mat0 = [[1] * num_slots for _ in range(num_slots)]
-        self.encoding_mat1 = [[1] * num_slots for _ in range(num_slots)]
-
-        for i in range(num_slots):
-            for k in range(1, num_slots):
-                self.encoding_mat0[i][k] = self.encoding_mat0[i][k - 1] * primitive_roots[i]
-
-        for i in range(num_slots):
-            self.encoding_mat1[i][0] = self.encoding_mat0[i][-1] * primitive_roots[i]
-
-        for i in range(num_slots):
-            for k in range(1, num_slots):
-                self.encoding_mat1[i][k] = self.encoding_mat1[i][k - 1] * primitive_roots[i]
-
-        # Compute matrices for coeff to slot transformation.
-        self.encoding_mat_transpose0 = util.matrix_operations.transpose_matrix(self.encoding_mat0)
-        self.encoding_mat_conj_transpose0 = util.matrix_operations.conjugate_matrix(
-            self.encoding_mat_transpose0)
-        self.encoding_mat_transpose1 = util.matrix_operations.transpose_matrix(self.encoding_mat1)
-        self.encoding_mat_conj_transpose1 = util.matrix_operations.conjugate_matrix(
-            self.encoding_mat_transpose1)
+        log_slots = int(math.log(num_slots, 2))
+        assert 1 <= self.dft_levels <= log_slots, \
+            'Number of DFT levels must be between 1 and ' + str(log_slots)
+
+        rot_group = self.get_rotation_group()
+
+        stages = []
+        for logm in range(1, log_slots + 1):
+            half = 1 << (logm - 1)
+            idx_mod = 1 << (logm + 2)
+            gap = 2 * self.poly_degree // idx_mod
+            positions = np.arange(num_slots) % (2 * half)
+            is_even = positions < half
+            roots = self.get_primitive_root((rot_group[positions % half] % idx_mod) * gap)
+
+            # Even positions get x_j + w * x_(j+h), odd positions get x_(j-h) - w * x_j.
+            stage = {0: np.where(is_even, 1, -roots)}
+            stage[half] = np.where(is_even, roots, 0)
+            minus = (-half) % num_slots
+            stage[minus] = stage.get(minus, 0) + np.where(is_even, 0, 1)
+            stages.append(stage)
+
+        groups = []
+        start = 0
+        for j in range(self.dft_levels):
+            size = log_slots // self.dft_levels + (1 if j < log_slots % self.dft_levels else 0)
+            group = stages[start]
+            for stage in stages[start + 1:start + size]:
+                group = util.matrix_operations.multiply_diagonals(stage, group, num_slots)
+            groups.append(group)
+            start += size
+
+        self.fft_diagonals = {}
+        for j, group in enumerate(groups):
+            self.fft_diagonals['slot_to_coeff_%d' % j] = group
+            conj_group = util.matrix_operations.conjugate_transpose_diagonals(
+                groups[-1 - j], num_slots)
+            self.fft_diagonals['coeff_to_slot_%d' % j] = conj_group
+
+        self.fft_diagonals['slot_to_coeff_0_i'] = {
+            k: 1j * diag for k, diag in self.fft_diagonals['slot_to_coeff_0'].items()}
+        self.fft_diagonals['coeff_to_slot_0'] = {
+            k: diag / self.poly_degree
+            for k, diag in self.fft_diagonals['coeff_to_slot_0'].items()}
+        self.fft_diagonals['coeff_to_slot_last_i'] = {
+            k: -1j * diag
+            for k, diag in self.fft_diagonals['coeff_to_slot_%d' % (self.dft_levels - 1)].items()}
+
+    def generate_eval_mod(self, params):
+        """Generates the Chebyshev approximation for the modular reduction.
+
+        The modular reduction is approximated by sin(2 * pi * x) / (2 * pi) for x in
+        [-K, K], which is cos(2 * pi * (x - 1/4)) / (2 * pi). With r double-angle
+        steps cos(2y) = 2 * cos(y)^2 - 1, only cos(2 * pi * (x - 1/4) / 2^r) is
+        approximated, with a Chebyshev interpolant in u = x / K. The factor
+        a = 1 / (2 * pi) is merged into the steps: with c_j = a^(2^(j - r)) * cos(2^j * y),
+        c_(j+1) = 2 * c_j^2 - a^(2^(j + 1 - r)), so the interpolant is scaled by
+        a^(2^-r), and the steps subtract the double_angle_constants.
+
+        By default, K is derived from the Hamming weight h of the secret key. It
+        is at most (h + 1) / 2, and at most 6 standard deviations of a sum of
+        h + 1 uniform values in [-1/2, 1/2].
+
+        Args:
+            params (CKKSParameters): Parameters with the EvalMod settings.
+        """
+        self.eval_mod = params.eval_mod
+        self.eval_mod_range = None
+        self.eval_mod_coeffs = None
+        self.double_angle_constants = []
+        assert self.eval_mod in (EVAL_MOD_TAYLOR, EVAL_MOD_CHEBYSHEV), \
+            'Unknown EvalMod ' + str(self.eval_mod)
+        if self.eval_mod == EVAL_MOD_TAYLOR:
+            return
+
+        weight = params.hamming_weight
+        self.eval_mod_range = params.eval_mod_range or \
+            min((weight + 1) // 2, math.ceil(6 * math.sqrt((weight + 1) / 12))) + 1
+        iterations = params.double_angle_iterations
+        scale = 1 / (2 * math.pi)
+        constants = [scale ** (0.5 ** (iterations - j)) for j in range(iterations + 1)]
+        self.double_angle_constants = constants[1:]
+
+        def scaled_cosine(u):
+            return constants[0] * np.cos(2 * np.pi * (self.eval_mod_range * u - 0.25)
+                                         / 2 ** iterations)
+
+        if params.eval_mod_degree:
+            self.eval_mod_coeffs = chebyshev_interpolate(scaled_cosine, params.eval_mod_degree)
+            return
+
+        degree = 7
+        while True:
+            self.eval_mod_coeffs = chebyshev_interpolate(scaled_cosine, degree)
+            if self.eval_mod_error() < EVAL_MOD_ERROR:
+                return
+            degree = 2 * degree + 1
+            assert degree <= MAX_EVAL_MOD_DEGREE, 'No Chebyshev approximation of degree at ' \
+                + 'most %d for range %d' % (MAX_EVAL_MOD_DEGREE, self.eval_mod_range)
+
+    def eval_mod_error(self):
+        """Computes the error of the approximation of the modular reduction.
+
+        Returns:
+            The largest difference between the approximation, after the
+            double-angle steps, and sin(2 * pi * x) / (2 * pi) for x in [-K, K].
+        """
+        u = np.linspace(-1, 1, 64 * len(self.eval_mod_coeffs) + 1)
+        approx = np.polynomial.chebyshev.chebval(u, self.eval_mod_coeffs)
+        for constant in self.double_angle_constants:
+            approx = 2 * approx * approx - constant
+        exact = np.sin(2 * np.pi * self.eval_mod_range * u) / (2 * np.pi)
+        return np.max(np.abs(approx - exact))
+
+    def linear_transform(self, name, encoder, scaling_factor, crt_context=None):
+        """Returns the encoded diagonals of one of the encoding matrices.
+
+        The diagonals are encoded on the first call for each scaling factor,
+        and reused by later bootstraps.
+
+        Args:
+            name (str): Name of the matrix attribute, e.g. 'encoding_mat0', or of
+                the merged FFT stage, e.g. 'slot_to_coeff_0'.
+            encoder (CKKSEncoder): Encoder for CKKS.
+            scaling_factor (float): Scaling factor to encode the diagonals with.
+            crt_context (CRTContext): Context in which to store the NTT form of the
+                diagonals, or None.
+
+        Returns:
+            A LinearTransform for the matrix.
+        """
+        key = (name, scaling_factor)
+        if key not in self.transforms:
+            if name in self.fft_diagonals:
+                self.transforms[key] = LinearTransform.from_diagonals(
+                    self.fft_diagonals[name], self.poly_degree // 2, encoder, scaling_factor,
+                    crt_context)
+            else:
+                self.transforms[key] = LinearTransform(getattr(self, name), encoder,
+                                                       scaling_factor, crt_context)
+        return self.transforms[key]
@@ -1,6 +1,7 @@
 """A module to decrypt for the CKKS scheme."""
 
 from util.plaintext import Plaintext
+from util.rns_polynomial import RNSPolynomial
 
 
 class CKKSDecryptor:
@@ -9,6 +10,7 @@ class CKKSDecryptor:
     Attributes:
         poly_degree: Degree of polynomial in quotient ring.
         crt_context: CRT context for multiplication.
+        chain (CKKSModulusChain): Modulus chain for full-RNS CKKS, or None.
         secret_key (SecretKey): Secret key used for encryption.
     """
 
@@ -22,6 +24,7 @@ class CKKSDecryptor:
         """
         self.poly_degree = params.poly_degree
         self.crt_context = params.crt_context
+        self.chain = params.chain
         self.secret_key = secret_key
 
     def decrypt(self, ciphertext, c2=None):
@@ -32,19 +35,51 @@ class CKKSDecryptor:
         Args:
             ciphertext (Ciphertext): Ciphertext to be decrypted.
             c2 (Polynomial): Optional additional parameter for a ciphertext that
-                has not been relinearized.
+                has not been relinearized. Defaults to the third element of the
+                ciphertext.
 
         Returns:
             The plaintext corresponding to the decrypted ciphertext.
         """
+        if c2 is None:
+            c2 = ciphertext.c2
+        if ciphertext.level is not None:
+            return self.decrypt_rns(ciphertext, c2)
+
         (c0, c1) = (ciphertext.c0, ciphertext.c1)
 
-        message = c1.multiply(self.secret_key.s, ciphertext.modulus, crt=self.crt_context)
+        # With vectorized NTTs, the cached NTT form of the secret key is cheaper than
+        # the sparse product.
+        if self.crt_context and self.crt_context.vectorized:
+            message = c1.multiply(self.secret_key.s, ciphertext.modulus, crt=self.crt_context)
+        else:
+            message = self.secret_key.multiply(c1, ciphertext.modulus)
         message = c0.add(message, ciphertext.modulus)
         if c2:
-            secret_key_squared = self.secret_key.s.multiply(self.secret_key.s, ciphertext.modulus)
+            secret_key_squared = self.secret_key.multiply(self.secret_key.s, ciphertext.modulus)
             c2_message = c2.multiply(secret_key_squared, ciphertext.modulus, crt=self.crt_context)
             message = message.add(c2_message, ciphertext.modulus)
 
         message = message.mod_small(ciphertext.modulus)
         return Plaintext(message, ciphertext.scaling_factor)
+
+    def decrypt_rns(self, ciphertext, c2=None):
+        """Decrypts a full-RNS ciphertext.
+
+        Args:
+            ciphertext (Ciphertext): Ciphertext to be decrypted, whose components
+                are RNSPolynomials.
+            c2 (RNSPolynomial): Optional additional parameter for a ciphertext that
+                has not been relinearized.
+
+        Returns:
+            The plaintext corresponding to the decrypted ciphertext.
+        """
+        crt = self.chain.context(ciphertext.level)
+        secret = RNSPolynomial.from_polynomial(self.secret_key.s, crt)
+
+        message = ciphertext.c0.add(ciphertext.c1.multiply(secret))
+        if c2:
+            message = message.add(c2.multiply(secret).multiply(secret))
+
+        return Plaintext(message.to_polynomial(), ciphertext.scaling_factor)
@@ -1,5 +1,8 @@
 """A module to encode integers as specified in the CKKS scheme.
 """
+from array import array
+
+import numpy as np
 
 from util.ntt import FFTContext
 from util.plaintext import Plaintext
@@ -35,20 +38,43 @@ class CKKSEncoder:
         Returns:
             A Plaintext object which represents the encoded value.
         """
-        num_values = len(values)
-        plain_len = num_values << 1
+        return self.encode_batch([values], scaling_factor)[0]
 
-        # Canonical embedding inverse variant.
-        to_scale = self.fft.embedding_inv(values)
+    def encode_batch(self, values, scaling_factor, raw=False):
+        """Encodes several vectors of complex numbers at once.
 
-        # Multiply by scaling factor, and split up real and imaginary parts.
-        message = [0] * plain_len
-        for i in range(num_values):
-            message[i] = int(to_scale[i].real * scaling_factor + 0.5)
-            message[i + num_values] = int(to_scale[i].imag * scaling_factor + 0.5)
+        The inverse embedding runs on all rows together, and the scaling and
+        rounding are vectorized. Coefficients that fit into 64 bits are
+        stored as arrays of words in the plaintexts.
 
-        return Plaintext(Polynomial(plain_len, message), scaling_factor)
+        Args:
+            values (ndarray): (B x n) array of complex numbers, with one vector
+                to encode per row.
+            scaling_factor (float): Scaling factor to multiply by.
+            raw (bool): Whether to return the coefficients as an array instead
+                of Plaintexts.
 
+        Returns:
+            A list of B Plaintexts, or a (B x 2n) array of coefficients if raw is
+            set, with dtype int64 if the coefficients fit and object otherwise.
+        """
+        to_scale = self.fft.embedding_inv_batch(values)
+
+        # Multiply by scaling factor, and split up real and imaginary parts.
+        message = np.concatenate([to_scale.real, to_scale.imag], axis=1)
+        message = np.trunc(message * scaling_factor + 0.5)
+        if np.abs(message).max() < 2 ** 63:
+            message = message.astype(np.int64)
+        else:
+            message = np.vectorize(int, otypes=[object])(message)
+
+        if raw:
+            return message
+        if message.dtype == np.int64:
+            return [Plaintext(Polynomial(message.shape[1], array('q', row.tobytes())),
+                              scaling_factor) for row in message]
+        return [Plaintext(Polynomial(message.shape[1], row.tolist()), scaling_factor)
+                for row in message]
 
     def decode(self, plain):
         """Decodes a plaintext polynomial.
@@ -61,17 +87,39 @@ class CKKSEncoder:
         Returns:
             A decoded list of integers.
         """
-        if not isinstance(plain, Plaintext):
-            raise ValueError("Input to decode must be a Plaintext")
+        return self.decode_batch([plain])[0].tolist()
+
+    def decode_batch(self, plains, scaling_factor=None):
+        """Decodes several plaintexts at once.
+
+        Args:
+            plains (list or ndarray): Plaintexts to decode, or a (B x 2n) array of
+                coefficients as returned by encode_batch with raw set.
+            scaling_factor (float): Scaling factor of the array of coefficients.
+                Plaintexts use their own scaling factors.
 
-        plain_len = len(plain.poly.coeffs)
-        num_values = plain_len >> 1
+        Returns:
+            A (B x n) complex array with the decoded vector of each plaintext.
+        """
+        if isinstance(plains, np.ndarray):
+            assert scaling_factor, 'Decoding an array of coefficients needs a scaling factor'
+            scaled = np.array(plains / scaling_factor, dtype=np.float64)
+        else:
+            rows = []
+            for plain in plains:
+                if not isinstance(plain, Plaintext):
+                    raise ValueError("Input to decode must be a Plaintext")
+                coeffs = plain.poly.coeffs
+                if isinstance(coeffs, array):
+                    rows.append(np.frombuffer(coeffs, dtype=np.int64) / plain.scaling_factor)
+                else:
+                    rows.append(np.array([c / plain.scaling_factor for c in coeffs],
+                                         dtype=np.float64))
+            scaled = np.stack(rows)
 
         # Divide by scaling factor, and turn back into a complex number.
-        message = [0] * num_values
-        for i in range(num_values):
-            message[i] = complex(plain.poly.coeffs[i] / plain.scaling_factor,
-                                 plain.poly.coeffs[i + num_values] / plain.scaling_factor)
+        num_values = scaled.shape[1] >> 1
+        message = scaled[:, :num_values] + 1j * scaled[:, num_values:]
 
         # Compute canonical embedding variant.
-        return self.fft.embedding(message)
+        return self.fft.embedding_batch(message)
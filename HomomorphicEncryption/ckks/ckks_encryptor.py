@@ -3,6 +3,7 @@
 from util.ciphertext import Ciphertext
 from util.polynomial import Polynomial
 from util.random_sample import sample_triangle
+from util.rns_polynomial import RNSPolynomial
 
 
 class CKKSEncryptor:
@@ -13,6 +14,7 @@ class CKKSEncryptor:
         coeff_modulus: Coefficient modulus in ciphertext space.
         big_modulus: Bootstrapping modulus.
         crt_context: CRT context for multiplication.
+        chain (CKKSModulusChain): Modulus chain for full-RNS CKKS, or None.
         public_key (PublicKey): Public key used for encryption.
         secret_key (SecretKey): Only used for secret key encryption.
     """
@@ -30,6 +32,7 @@ class CKKSEncryptor:
         self.coeff_modulus = params.ciph_modulus
         self.big_modulus = params.big_modulus
         self.crt_context = params.crt_context
+        self.chain = params.chain
         self.public_key = public_key
         self.secret_key = secret_key
 
@@ -47,11 +50,17 @@ class CKKSEncryptor:
         """
         assert self.secret_key != None, 'Secret key does not exist'
 
+        if self.chain:
+            return self.encrypt_rns(plain, None)
+
         sk = self.secret_key.s
         random_vec = Polynomial(self.poly_degree, sample_triangle(self.poly_degree))
         error = Polynomial(self.poly_degree, sample_triangle(self.poly_degree))
 
-        c0 = sk.multiply(random_vec, self.coeff_modulus, crt=self.crt_context)
+        if self.crt_context and self.crt_context.vectorized:
+            c0 = sk.multiply(random_vec, self.coeff_modulus, crt=self.crt_context)
+        else:
+            c0 = self.secret_key.multiply(random_vec, self.coeff_modulus)
         c0 = error.add(c0, self.coeff_modulus)
         c0 = c0.add(plain.poly, self.coeff_modulus)
         c0 = c0.mod_small(self.coeff_modulus)
@@ -73,6 +82,9 @@ class CKKSEncryptor:
             A ciphertext consisting of a pair of polynomials in the ciphertext
             space.
         """
+        if self.chain:
+            return self.encrypt_rns(plain, self.public_key)
+
         p0 = self.public_key.p0
         p1 = self.public_key.p1
 
@@ -91,6 +103,36 @@ class CKKSEncryptor:
 
         return Ciphertext(c0, c1, plain.scaling_factor, self.coeff_modulus)
 
+    def encrypt_rns(self, plain, public_key):
+        """Encrypts a message at the top level of the modulus chain.
+
+        Args:
+            plain (Plaintext): Plaintext to be encrypted.
+            public_key (PublicKey): Public key, or None for secret key encryption.
+
+        Returns:
+            A ciphertext whose components are RNSPolynomials in NTT form.
+        """
+        level = self.chain.num_levels
+        crt = self.chain.context(level)
+
+        def sample():
+            return RNSPolynomial.from_polynomial(
+                Polynomial(self.poly_degree, sample_triangle(self.poly_degree)), crt)
+
+        random_vec = sample()
+        message = RNSPolynomial.from_polynomial(plain.poly, crt)
+        if public_key:
+            c0 = public_key.p0.restrict(crt).multiply(random_vec)
+            c1 = public_key.p1.restrict(crt).multiply(random_vec).add(sample())
+        else:
+            secret = RNSPolynomial.from_polynomial(self.secret_key.s, crt)
+            c0 = secret.multiply(random_vec)
+            c1 = random_vec.negate()
+        c0 = c0.add(sample()).add(message)
+
+        return Ciphertext(c0, c1, plain.scaling_factor, crt.modulus, level)
+
     def raise_modulus(self, new_modulus):
         """Rescales scheme to have a new modulus.
 
@@ -1,14 +1,29 @@
 """A module to perform computations on ciphertexts in CKKS."""
 
-from math import sqrt
+from collections import OrderedDict
 import math
 
-from ckks.ckks_bootstrapping_context import CKKSBootstrappingContext
+import numpy as np
+
+from ckks.ckks_bootstrapping_context import CKKSBootstrappingContext, EVAL_MOD_CHEBYSHEV
+from ckks.ckks_linear_transform import LinearTransform
+from ckks.ckks_rotation_planner import RotationComposer
 from util.ciphertext import Ciphertext
 from util.crt import CRTContext
+from util.galois import rotation_galois_elt, conjugation_galois_elt
 import util.matrix_operations
+import util.modular_operations as modops
 from util.plaintext import Plaintext
 from util.polynomial import Polynomial
+from util.polynomial_basis import POWER_BASIS, CHEBYSHEV_BASIS, split_coeffs, trim_coeffs
+from util.rns_polynomial import RNSPolynomial, NTT_DOMAIN
+
+# Largest relative difference of scaling factors that match_modulus corrects in full-RNS mode,
+# where rescaling divides by primes which are only close to the scaling factor.
+SCALE_DRIFT = 2 ** -16
+
+# Number of NTT encodings of complex constants kept by an evaluator.
+CONSTANT_CACHE_SIZE = 64
 
 class CKKSEvaluator:
 
@@ -21,8 +36,13 @@ class CKKSEvaluator:
         big_modulus (int): Modulus q of coefficients of polynomial
             ring R_q.
         scaling_factor (float): Scaling factor to encode new plaintexts with.
-        boot_context (CKKSBootstrappingContext): Bootstrapping pre-computations.
+        boot_context (CKKSBootstrappingContext): Bootstrapping pre-computations,
+            generated on first use.
         crt_context (CRTContext): CRT functions.
+        chain (CKKSModulusChain): Modulus chain for full-RNS CKKS, or None.
+        params (CKKSParameters): Parameters to generate the bootstrapping context with.
+        lazy_rescale (bool): Whether multiply_rescale and multiply_plain_rescale only
+            mark their products as pending instead of rescaling them.
     """
 
     def __init__(self, params):
@@ -35,8 +55,51 @@ class CKKSEvaluator:
         self.degree = params.poly_degree
         self.big_modulus = params.big_modulus
         self.scaling_factor = params.scaling_factor
-        self.boot_context = CKKSBootstrappingContext(params)
+        self.params = params
+        self._boot_context = None
+        self._composer = None
+        self._constants = OrderedDict()
         self.crt_context = params.crt_context
+        self.chain = params.chain
+        self.lazy_rescale = params.lazy_rescale
+
+    @property
+    def boot_context(self):
+        """Returns the bootstrapping context, generating it on the first call.
+
+        Returns:
+            The CKKSBootstrappingContext for the parameters.
+        """
+        if self._boot_context is None:
+            self._boot_context = CKKSBootstrappingContext(self.params)
+        return self._boot_context
+
+    def check_scaling_factors(self, scaling_factor1, scaling_factor2, name1, name2):
+        """Checks that two scaling factors are equal.
+
+        In full-RNS mode, scaling factors are floats, and they only have to be
+        equal up to a relative difference of 1 / scaling_factor, which is below
+        the precision of the encoding. Larger differences, e.g. after rescaling
+        by different primes, are corrected by match_modulus.
+
+        Args:
+            scaling_factor1 (float): First scaling factor.
+            scaling_factor2 (float): Second scaling factor.
+            name1 (str): Name of the first operand for the error message.
+            name2 (str): Name of the second operand for the error message.
+        """
+        if self.chain:
+            equal = math.isclose(scaling_factor1, scaling_factor2, rel_tol=1 / self.scaling_factor)
+            assert equal, "Scaling factors are not approximately equal. " \
+                + "%s scaling factor: %.6g, %s scaling factor: %.6g. " \
+                % (name1, scaling_factor1, name2, scaling_factor2) \
+                + "Use match_modulus with match_scale=True to align ciphertexts rescaled by " \
+                + "different primes."
+        else:
+            equal = scaling_factor1 == scaling_factor2
+            assert equal, "Scaling factors are not equal. " \
+                + "%s scaling factor: %d bits, %s scaling factor: %d bits" \
+                % (name1, math.log(scaling_factor1, 2), name2, math.log(scaling_factor2, 2))
 
     def add(self, ciph1, ciph2):
         """Adds two ciphertexts.
@@ -52,20 +115,30 @@ class CKKSEvaluator:
         """
         assert isinstance(ciph1, Ciphertext)
         assert isinstance(ciph2, Ciphertext)
-        assert ciph1.scaling_factor == ciph2.scaling_factor, "Scaling factors are not equal. " \
-            + "Ciphertext 1 scaling factor: %d bits, Ciphertext 2 scaling factor: %d bits" \
-            % (math.log(ciph1.scaling_factor, 2), math.log(ciph2.scaling_factor, 2))
+        if ciph1.pending_scale != ciph2.pending_scale:
+            ciph1 = self.rescale_pending(ciph1)
+            ciph2 = self.rescale_pending(ciph2)
+        self.check_scaling_factors(ciph1.scaling_factor, ciph2.scaling_factor,
+                                   "Ciphertext 1", "Ciphertext 2")
         assert ciph1.modulus == ciph2.modulus, "Moduli are not equal. " \
             + "Ciphertext 1 modulus: %d bits, Ciphertext 2 modulus: %d bits" \
             % (math.log(ciph1.modulus, 2), math.log(ciph2.modulus, 2))
 
         modulus = ciph1.modulus
 
+        c2 = self.add_third_components(ciph1, ciph2)
+
+        if ciph1.level is not None:
+            return Ciphertext(ciph1.c0.add(ciph2.c0), ciph1.c1.add(ciph2.c1),
+                              ciph1.scaling_factor, modulus, ciph1.level, c2,
+                              ciph1.pending_scale)
+
         c0 = ciph1.c0.add(ciph2.c0, modulus)
         c0 = c0.mod_small(modulus)
         c1 = ciph1.c1.add(ciph2.c1, modulus)
         c1 = c1.mod_small(modulus)
-        return Ciphertext(c0, c1, ciph1.scaling_factor, modulus)
+        return Ciphertext(c0, c1, ciph1.scaling_factor, modulus, c2=c2,
+                          pending_scale=ciph1.pending_scale)
 
     def add_plain(self, ciph, plain):
         """Adds a ciphertext with a plaintext.
@@ -81,14 +154,19 @@ class CKKSEvaluator:
         """
         assert isinstance(ciph, Ciphertext)
         assert isinstance(plain, Plaintext)
-        assert ciph.scaling_factor == plain.scaling_factor, "Scaling factors are not equal. " \
-            + "Ciphertext scaling factor: %d bits, Plaintext scaling factor: %d bits" \
-            % (math.log(ciph.scaling_factor, 2), math.log(plain.scaling_factor, 2))
+        self.check_scaling_factors(ciph.scaling_factor, plain.scaling_factor,
+                                   "Ciphertext", "Plaintext")
+
+        if ciph.level is not None:
+            c0 = ciph.c0.add(RNSPolynomial.from_polynomial(plain.poly, ciph.c0.crt_context))
+            return Ciphertext(c0, ciph.c1, ciph.scaling_factor, ciph.modulus, ciph.level, ciph.c2,
+                              ciph.pending_scale)
 
         c0 = ciph.c0.add(plain.poly, ciph.modulus)
         c0 = c0.mod_small(ciph.modulus)
 
-        return Ciphertext(c0, ciph.c1, ciph.scaling_factor, ciph.modulus)
+        return Ciphertext(c0, ciph.c1, ciph.scaling_factor, ciph.modulus, c2=ciph.c2,
+                          pending_scale=ciph.pending_scale)
 
     def subtract(self, ciph1, ciph2):
         """Subtracts second ciphertext from first ciphertext.
@@ -104,20 +182,30 @@ class CKKSEvaluator:
         """
         assert isinstance(ciph1, Ciphertext)
         assert isinstance(ciph2, Ciphertext)
-        assert ciph1.scaling_factor == ciph2.scaling_factor, "Scaling factors are not equal. " \
-            + "Ciphertext 1 scaling factor: %d bits, Ciphertext 2 scaling factor: %d bits" \
-            % (math.log(ciph1.scaling_factor, 2), math.log(ciph2.scaling_factor, 2))
+        if ciph1.pending_scale != ciph2.pending_scale:
+            ciph1 = self.rescale_pending(ciph1)
+            ciph2 = self.rescale_pending(ciph2)
+        self.check_scaling_factors(ciph1.scaling_factor, ciph2.scaling_factor,
+                                   "Ciphertext 1", "Ciphertext 2")
         assert ciph1.modulus == ciph2.modulus, "Moduli are not equal. " \
             + "Ciphertext 1 modulus: %d bits, Ciphertext 2 modulus: %d bits" \
             % (math.log(ciph1.modulus, 2), math.log(ciph2.modulus, 2))
 
         modulus = ciph1.modulus
 
+        c2 = self.add_third_components(ciph1, ciph2, subtract=True)
+
+        if ciph1.level is not None:
+            return Ciphertext(ciph1.c0.subtract(ciph2.c0), ciph1.c1.subtract(ciph2.c1),
+                              ciph1.scaling_factor, modulus, ciph1.level, c2,
+                              ciph1.pending_scale)
+
         c0 = ciph1.c0.subtract(ciph2.c0, modulus)
         c0 = c0.mod_small(modulus)
         c1 = ciph1.c1.subtract(ciph2.c1, modulus)
         c1 = c1.mod_small(modulus)
-        return Ciphertext(c0, c1, ciph1.scaling_factor, modulus)
+        return Ciphertext(c0, c1, ciph1.scaling_factor, modulus, c2=c2,
+                          pending_scale=ciph1.pending_scale)
 
     def multiply(self, ciph1, ciph2, relin_key):
         """Multiplies two ciphertexts.
@@ -132,13 +220,42 @@ class CKKSEvaluator:
         Returns:
             A Ciphertext which is the product of the two ciphertexts.
         """
+        return self.relinearize_ciphertext(self.multiply_no_relin(ciph1, ciph2), relin_key)
+
+    def multiply_no_relin(self, ciph1, ciph2):
+        """Multiplies two ciphertexts without relinearizing.
+
+        The product has a third element, which decrypts with the square of the
+        secret key. Such products can be added and subtracted, so that a sum of
+        products is relinearized once with relinearize_ciphertext, instead of
+        once for each product.
+
+        Args:
+            ciph1 (Ciphertext): First ciphertext.
+            ciph2 (Ciphertext): Second ciphertext.
+
+        Returns:
+            A Ciphertext with three elements which is the product of the two
+            ciphertexts.
+        """
         assert isinstance(ciph1, Ciphertext)
         assert isinstance(ciph2, Ciphertext)
+        ciph1 = self.rescale_pending(ciph1)
+        ciph2 = self.rescale_pending(ciph2)
+        assert ciph1.c2 is None and ciph2.c2 is None, \
+            'Ciphertexts must be relinearized before they are multiplied'
         assert ciph1.modulus == ciph2.modulus, "Moduli are not equal. " \
             + "Ciphertext 1 modulus: %d bits, Ciphertext 2 modulus: %d bits" \
             % (math.log(ciph1.modulus, 2), math.log(ciph2.modulus, 2))
 
         modulus = ciph1.modulus
+        scaling_factor = ciph1.scaling_factor * ciph2.scaling_factor
+
+        if ciph1.level is not None:
+            c0 = ciph1.c0.multiply(ciph2.c0)
+            c1 = ciph1.c0.multiply(ciph2.c1).add(ciph1.c1.multiply(ciph2.c0))
+            c2 = ciph1.c1.multiply(ciph2.c1)
+            return Ciphertext(c0, c1, scaling_factor, modulus, ciph1.level, c2)
 
         c0 = ciph1.c0.multiply(ciph2.c0, modulus, crt=self.crt_context)
         c0 = c0.mod_small(modulus)
@@ -151,8 +268,35 @@ class CKKSEvaluator:
         c2 = ciph1.c1.multiply(ciph2.c1, modulus, crt=self.crt_context)
         c2 = c2.mod_small(modulus)
 
-        return self.relinearize(relin_key, c0, c1, c2, ciph1.scaling_factor * ciph2.scaling_factor,
-                                modulus)
+        return Ciphertext(c0, c1, scaling_factor, modulus, c2=c2)
+
+    def multiply_rescale(self, ciph1, ciph2, relin_key, division_factor=None):
+        """Multiplies two ciphertexts, relinearizes, and rescales.
+
+        In big-integer mode, relinearization and rescaling share one division
+        of the key-switching term. In lazy-rescale mode, the product is only marked
+        with the pending division factor, so that a sum of products is rescaled
+        once, before it is multiplied again or by rescale_pending.
+
+        Args:
+            ciph1 (Ciphertext): First ciphertext.
+            ciph2 (Ciphertext): Second ciphertext.
+            relin_key (PublicKey): Relinearization keys.
+            division_factor (float): Factor to rescale by. Defaults to the
+                scaling factor.
+
+        Returns:
+            A Ciphertext which is the rescaled product of the two ciphertexts.
+        """
+        if division_factor is None:
+            division_factor = self.scaling_factor
+        prod = self.multiply_no_relin(ciph1, ciph2)
+        if self.lazy_rescale:
+            prod = self.relinearize_ciphertext(prod, relin_key)
+            prod.pending_scale = division_factor
+            return prod
+        return self.relinearize(relin_key, prod.c0, prod.c1, prod.c2, prod.scaling_factor,
+                                prod.modulus, division_factor)
 
     def multiply_plain(self, ciph, plain):
         """Multiplies a ciphertext with a plaintext.
@@ -168,20 +312,193 @@ class CKKSEvaluator:
         """
         assert isinstance(ciph, Ciphertext)
         assert isinstance(plain, Plaintext)
+        ciph = self.rescale_pending(ciph)
 
-        c0 = ciph.c0.multiply(plain.poly, ciph.modulus, crt=self.crt_context)
-        c0 = c0.mod_small(ciph.modulus)
+        if ciph.level is not None:
+            poly = RNSPolynomial.from_polynomial(plain.poly, ciph.c0.crt_context)
+            c2 = ciph.c2.multiply(poly) if ciph.c2 is not None else None
+            return Ciphertext(ciph.c0.multiply(poly), ciph.c1.multiply(poly),
+                              ciph.scaling_factor * plain.scaling_factor, ciph.modulus,
+                              ciph.level, c2)
 
-        c1 = ciph.c1.multiply(plain.poly, ciph.modulus, crt=self.crt_context)
-        c1 = c1.mod_small(ciph.modulus)
+        products = []
+        for poly in (ciph.c0, ciph.c1, ciph.c2):
+            if poly is None:
+                products.append(None)
+                continue
+            product = poly.multiply(plain.poly, ciph.modulus, crt=self.crt_context)
+            products.append(product.mod_small(ciph.modulus))
 
-        return Ciphertext(c0, c1, ciph.scaling_factor * plain.scaling_factor, ciph.modulus)
+        return Ciphertext(products[0], products[1], ciph.scaling_factor * plain.scaling_factor,
+                          ciph.modulus, c2=products[2])
 
-    def relinearize(self, relin_key, c0, c1, c2, new_scaling_factor, modulus):
+    def multiply_plain_rescale(self, ciph, plain, division_factor=None):
+        """Multiplies a ciphertext with a plaintext, and rescales.
+
+        In lazy-rescale mode, the product is only marked with the pending
+        division factor, as in multiply_rescale.
+
+        Args:
+            ciph (Ciphertext): A ciphertext to multiply.
+            plain (Plaintext): A plaintext to multiply.
+            division_factor (float): Factor to rescale by. Defaults to the
+                scaling factor.
+
+        Returns:
+            A Ciphertext which is the rescaled product of the ciphertext and plaintext.
+        """
+        if division_factor is None:
+            division_factor = self.scaling_factor
+        prod = self.multiply_plain(ciph, plain)
+        if self.lazy_rescale:
+            prod.pending_scale = division_factor
+            return prod
+        return self.rescale(prod, division_factor)
+
+    def encode_constant(self, const, scaling_factor, crt_context=None):
+        """Encodes a constant as the polynomial a + b * x^(d/2).
+
+        Since x^(d/2) evaluates to i at every root of the canonical embedding,
+        a constant re + i * im is encoded with a = round(re * scaling_factor) and
+        b = round(im * scaling_factor). In full-RNS mode, the NTT values of the
+        last CONSTANT_CACHE_SIZE complex encodings are kept, since they take an NTT.
+
+        Args:
+            const (complex): Constant to encode.
+            scaling_factor (float): Scaling factor to encode with.
+            crt_context (CRTContext): Context of the ciphertext in full-RNS mode,
+                or None.
+
+        Returns:
+            A tuple (a, b, values), where values holds the NTT values of the
+            encoding modulo each prime in full-RNS mode, as an (L x 1) column
+            if b is zero. It is None in big-integer mode.
+        """
+        const = complex(const)
+        real = int(round(const.real * scaling_factor))
+        imag = int(round(const.imag * scaling_factor))
+        if not crt_context:
+            return real, imag, None
+
+        # The NTT values of a constant polynomial are all equal to the constant.
+        values = modops.to_word_array([real % p for p in crt_context.primes]).reshape(-1, 1)
+        if not imag:
+            return real, imag, values
+
+        key = (real, imag, tuple(crt_context.primes))
+        if key in self._constants:
+            self._constants.move_to_end(key)
+            return self._constants[key]
+        residues = np.zeros((len(crt_context.primes), self.degree), dtype=np.uint64)
+        residues[:, :1] = values
+        residues[:, self.degree // 2] = [imag % p for p in crt_context.primes]
+        self._constants[key] = (real, imag, crt_context.ntt_fwd(residues))
+        if len(self._constants) > CONSTANT_CACHE_SIZE:
+            self._constants.popitem(last=False)
+        return self._constants[key]
+
+    def multiply_const(self, ciph, const, scaling_factor=None):
+        """Multiplies a ciphertext with a constant.
+
+        The constant is encoded as a + b * x^(d/2), so the product only scales
+        and shifts coefficients, without a polynomial multiplication. In
+        full-RNS mode, a complex constant multiplies the NTT values pointwise.
+
+        Args:
+            ciph (Ciphertext): A ciphertext to multiply.
+            const (complex): A real or complex constant to multiply.
+            scaling_factor (float): Scaling factor to encode the constant with.
+                Defaults to the scaling factor of the evaluator.
+
+        Returns:
+            A Ciphertext which is the product of the ciphertext and constant.
+        """
+        assert isinstance(ciph, Ciphertext)
+        ciph = self.rescale_pending(ciph)
+        if scaling_factor is None:
+            scaling_factor = self.scaling_factor
+        half = self.degree // 2
+
+        if ciph.level is not None:
+            crt = ciph.c0.crt_context
+            real, imag, values = self.encode_constant(const, scaling_factor, crt)
+            products = []
+            for poly in (ciph.c0, ciph.c1, ciph.c2):
+                if poly is None:
+                    products.append(None)
+                elif not imag:
+                    products.append(poly.scalar_multiply(real))
+                elif poly.domain == NTT_DOMAIN:
+                    products.append(poly.with_residues(crt.multiply_residues(poly.residues, values)))
+                else:
+                    products.append(poly.scalar_multiply(real).add(
+                        poly.multiply_monomial(half).scalar_multiply(imag)))
+            return Ciphertext(products[0], products[1], ciph.scaling_factor * scaling_factor,
+                              ciph.modulus, ciph.level, products[2])
+
+        real, imag, _ = self.encode_constant(const, scaling_factor)
+        products = []
+        for poly in (ciph.c0, ciph.c1, ciph.c2):
+            if poly is None:
+                products.append(None)
+                continue
+            product = poly.scalar_multiply(real)
+            if imag:
+                product = product.add(poly.multiply_monomial(half).scalar_multiply(imag))
+            products.append(product.mod_small(ciph.modulus))
+        return Ciphertext(products[0], products[1], ciph.scaling_factor * scaling_factor,
+                          ciph.modulus, c2=products[2])
+
+    def add_const(self, ciph, const):
+        """Adds a constant to a ciphertext.
+
+        The constant is encoded at the scaling factor of the ciphertext as
+        a + b * x^(d/2), so only two coefficients of the first component
+        change, or every NTT value in full-RNS mode.
+
+        Args:
+            ciph (Ciphertext): A ciphertext to add.
+            const (complex): A real or complex constant to add.
+
+        Returns:
+            A Ciphertext which is the sum of the ciphertext and constant.
+        """
+        assert isinstance(ciph, Ciphertext)
+        half = self.degree // 2
+
+        if ciph.level is not None:
+            c0 = ciph.c0
+            crt = c0.crt_context
+            real, imag, values = self.encode_constant(const, ciph.scaling_factor, crt)
+            if c0.domain == NTT_DOMAIN:
+                residues = modops.add_mod(c0.residues, values, crt.prime_column)
+            else:
+                residues = c0.residues.copy()
+                for index, value in ((0, real), (half, imag)):
+                    column = modops.to_word_array([value % p for p in crt.primes]).reshape(-1, 1)
+                    residues[:, index:index + 1] = modops.add_mod(
+                        residues[:, index:index + 1], column, crt.prime_column)
+            return Ciphertext(c0.with_residues(residues), ciph.c1, ciph.scaling_factor,
+                              ciph.modulus, ciph.level, ciph.c2, ciph.pending_scale)
+
+        real, imag, _ = self.encode_constant(const, ciph.scaling_factor)
+        coeffs = list(ciph.c0.coeffs)
+        coeffs[0] += real
+        coeffs[half] += imag
+        c0 = Polynomial(self.degree, coeffs).mod_small(ciph.modulus)
+        return Ciphertext(c0, ciph.c1, ciph.scaling_factor, ciph.modulus, c2=ciph.c2,
+                          pending_scale=ciph.pending_scale)
+
+    def relinearize(self, relin_key, c0, c1, c2, new_scaling_factor, modulus,
+                    division_factor=None):
         """Relinearizes a 3-dimensional ciphertext.
 
         Reduces 3-dimensional ciphertext back down to 2 dimensions.
 
+        If a division factor is given, the result is also rescaled. In big-integer
+        mode, the key-switching term is then divided by the special modulus and
+        the division factor at once, and no intermediate ciphertext is reduced.
+
         Args:
             relin_key (PublicKey): Relinearization keys.
             c0 (Polynomial): First component of ciphertext.
@@ -189,10 +506,33 @@ class CKKSEvaluator:
             c2 (Polynomial): Third component of ciphertext.
             new_scaling_factor (float): New scaling factor for ciphertext.
             modulus (int): Ciphertext modulus.
+            division_factor (float): Factor to rescale by, or None to not rescale.
 
         Returns:
             A Ciphertext which has only two components.
         """
+        if isinstance(c2, RNSPolynomial):
+            level = len(c2.crt_context.primes) - 1
+            new_c0, new_c1 = self.switch_key_rns(c2, level, relin_key)
+            ciph = Ciphertext(new_c0.add(c0), new_c1.add(c1), new_scaling_factor, modulus, level)
+            if division_factor is None:
+                return ciph
+            return self.rescale(ciph, division_factor)
+
+        if division_factor is not None:
+            divisor = self.big_modulus * division_factor
+            new_modulus = modulus // division_factor
+            new_c = []
+            # Dividing the two terms separately changes each coefficient by at most one.
+            for key_poly, poly in ((relin_key.p0, c0), (relin_key.p1, c1)):
+                prod = key_poly.multiply(c2, modulus * self.big_modulus, crt=self.crt_context)
+                prod = prod.mod_small(modulus * self.big_modulus)
+                prod = prod.scalar_integer_divide(divisor)
+                prod = prod.add(poly.scalar_integer_divide(division_factor), new_modulus)
+                new_c.append(prod.mod_small(new_modulus))
+            return Ciphertext(new_c[0], new_c[1], new_scaling_factor // division_factor,
+                              new_modulus)
+
         new_c0 = relin_key.p0.multiply(c2, modulus * self.big_modulus, crt=self.crt_context)
         new_c0 = new_c0.mod_small(modulus * self.big_modulus)
         new_c0 = new_c0.scalar_integer_divide(self.big_modulus)
@@ -207,12 +547,61 @@ class CKKSEvaluator:
 
         return Ciphertext(new_c0, new_c1, new_scaling_factor, modulus)
 
+    def relinearize_ciphertext(self, ciph, relin_key):
+        """Relinearizes a ciphertext with three elements.
+
+        Args:
+            ciph (Ciphertext): Ciphertext, e.g. a sum of products from
+                multiply_no_relin.
+            relin_key (PublicKey): Relinearization keys.
+
+        Returns:
+            A Ciphertext with two elements, or ciph if it has only two elements.
+        """
+        if ciph.c2 is None:
+            return ciph
+        relin_ciph = self.relinearize(relin_key, ciph.c0, ciph.c1, ciph.c2, ciph.scaling_factor,
+                                      ciph.modulus)
+        relin_ciph.pending_scale = ciph.pending_scale
+        return relin_ciph
+
+    def add_third_components(self, ciph1, ciph2, subtract=False):
+        """Adds the third elements of two ciphertexts, where a missing element is zero.
+
+        Args:
+            ciph1 (Ciphertext): First ciphertext.
+            ciph2 (Ciphertext): Second ciphertext.
+            subtract (bool): Whether to subtract the second element instead.
+
+        Returns:
+            The third element of the sum or difference, or None if neither
+            ciphertext has one.
+        """
+        if ciph2.c2 is None:
+            return ciph1.c2
+
+        if ciph1.level is not None:
+            if ciph1.c2 is None:
+                return ciph2.c2.negate() if subtract else ciph2.c2
+            return ciph1.c2.subtract(ciph2.c2) if subtract else ciph1.c2.add(ciph2.c2)
+
+        modulus = ciph1.modulus
+        c2 = ciph1.c2
+        if c2 is None:
+            c2 = Polynomial(self.degree, [0] * self.degree)
+        c2 = c2.subtract(ciph2.c2, modulus) if subtract else c2.add(ciph2.c2, modulus)
+        return c2.mod_small(modulus)
+
     def rescale(self, ciph, division_factor):
         """Rescales a ciphertext to a new scaling factor.
 
         Divides ciphertext by division factor, and updates scaling factor
         and ciphertext. modulus.
 
+        In full-RNS mode, the ciphertext is divided by the last prime of its
+        level instead, which is close to the division factor, and the limb of
+        that prime is dropped.
+
         Args:
             ciph (Ciphertext): Ciphertext to modify.
             division_factor (float): Factor to divide by.
@@ -220,10 +609,33 @@ class CKKSEvaluator:
         Returns:
             Rescaled ciphertext.
         """
+        if ciph.level is not None:
+            prime = self.chain.primes[ciph.level]
+            c0 = self.chain.rescale(ciph.c0, ciph.level)
+            c1 = self.chain.rescale(ciph.c1, ciph.level)
+            c2 = self.chain.rescale(ciph.c2, ciph.level) if ciph.c2 is not None else None
+            return Ciphertext(c0, c1, ciph.scaling_factor / prime, c0.crt_context.modulus,
+                              ciph.level - 1, c2)
+
         c0 = ciph.c0.scalar_integer_divide(division_factor)
         c1 = ciph.c1.scalar_integer_divide(division_factor)
+        c2 = ciph.c2.scalar_integer_divide(division_factor) if ciph.c2 is not None else None
         return Ciphertext(c0, c1, ciph.scaling_factor // division_factor,
-                          ciph.modulus // division_factor)
+                          ciph.modulus // division_factor, c2=c2)
+
+    def rescale_pending(self, ciph):
+        """Rescales a ciphertext by its pending division factor.
+
+        Args:
+            ciph (Ciphertext): Ciphertext, e.g. a sum of products from
+                multiply_rescale in lazy-rescale mode.
+
+        Returns:
+            The rescaled ciphertext, or ciph if no rescaling is pending.
+        """
+        if ciph.pending_scale is None:
+            return ciph
+        return self.rescale(ciph, ciph.pending_scale)
 
     def lower_modulus(self, ciph, division_factor):
         """Rescales a ciphertext to a new scaling factor.
@@ -231,6 +643,9 @@ class CKKSEvaluator:
         Divides ciphertext by division factor, and updates scaling factor
         and ciphertext modulus.
 
+        In full-RNS mode, the limbs of the last primes are dropped, as many
+        as are closest to the division factor.
+
         Args:
             ciph (Ciphertext): Ciphertext to modify.
             division_factor (float): Factor to divide by.
@@ -238,10 +653,20 @@ class CKKSEvaluator:
         Returns:
             Rescaled ciphertext.
         """
+        if ciph.level is not None:
+            level = ciph.level
+            dropped = 1
+            while level > 0 and dropped * math.sqrt(self.chain.primes[level]) < division_factor:
+                dropped *= self.chain.primes[level]
+                level -= 1
+            return self.lower_level(ciph, level)
+
         new_modulus = ciph.modulus // division_factor
         c0 = ciph.c0.mod_small(new_modulus)
         c1 = ciph.c1.mod_small(new_modulus)
-        return Ciphertext(c0, c1, ciph.scaling_factor, new_modulus)
+        c2 = ciph.c2.mod_small(new_modulus) if ciph.c2 is not None else None
+        return Ciphertext(c0, c1, ciph.scaling_factor, new_modulus, c2=c2,
+                          pending_scale=ciph.pending_scale)
 
     def switch_key(self, ciph, key):
         """Outputs ciphertext with switching key.
@@ -250,11 +675,15 @@ class CKKSEvaluator:
 
         Args:
             ciph (Ciphertext): Ciphertext to change.
-            switching_key (PublicKey): Switching key.
+            key (PublicKey or SwitchingKey): Switching key, or SwitchingKey in full-RNS mode.
 
         Returns:
             A Ciphertext which encrypts the same message under a different key.
         """
+        assert ciph.c2 is None, 'Ciphertext must be relinearized before it is key-switched'
+        if ciph.level is not None:
+            c0, c1 = self.switch_key_rns(ciph.c1, ciph.level, key)
+            return Ciphertext(c0.add(ciph.c0), c1, ciph.scaling_factor, ciph.modulus, ciph.level)
 
         c0 = key.p0.multiply(ciph.c1, ciph.modulus * self.big_modulus, crt=self.crt_context)
         c0 = c0.mod_small(ciph.modulus * self.big_modulus)
@@ -269,6 +698,207 @@ class CKKSEvaluator:
 
         return Ciphertext(c0, c1, ciph.scaling_factor, ciph.modulus)
 
+    def switch_key_rns(self, poly, level, key):
+        """Multiplies a polynomial by a switching key in full-RNS mode.
+
+        Decomposes the polynomial into digits, extends each digit to the
+        primes of Q_l * P, multiplies it by the key of the digit, and divides
+        the sum by P, as in the hybrid key switching of Han and Ki.
+
+        Args:
+            poly (RNSPolynomial): Polynomial at the given level, e.g. c1 or c2.
+            level (int): Level l.
+            key (SwitchingKey): Switching key modulo Q_L * P.
+
+        Returns:
+            A tuple of RNSPolynomials (u0, u1) at level l, such that
+            u0 + u1 * s is approximately poly times the new key.
+        """
+        u0, u1 = self.multiply_digits(self.chain.mod_up(poly, level), level, key)
+        return self.chain.mod_down(u0, level), self.chain.mod_down(u1, level)
+
+    def multiply_digits(self, digits, level, key):
+        """Multiplies extended digits by a switching key and sums the products.
+
+        Args:
+            digits (list): RNSPolynomials in NTT form modulo Q_l * P, one for
+                each digit, as returned by CKKSModulusChain.mod_up.
+            level (int): Level l.
+            key (SwitchingKey): Switching key modulo Q_L * P.
+
+        Returns:
+            A tuple of RNSPolynomials (u0, u1) modulo Q_l * P, which still
+            have to be divided by P.
+        """
+        crt = self.chain.extended_context(level)
+        u0 = None
+        u1 = None
+        for extended, digit_key in zip(digits, key.keys):
+            prod0 = extended.multiply(digit_key.p0.restrict(crt))
+            prod1 = extended.multiply(digit_key.p1.restrict(crt))
+            u0 = u0.add(prod0) if u0 else prod0
+            u1 = u1.add(prod1) if u1 else prod1
+        return u0, u1
+
+    def rotate_extended(self, c0, digits, level, rotation, rot_key):
+        """Rotates a ciphertext from its hoisted decomposition, without dividing by P.
+
+        The automorphism commutes with the decomposition and base extension
+        of c1, so it is applied directly to the extended digits, which only
+        permutes their NTT values.
+
+        Args:
+            c0 (RNSPolynomial): First element of the ciphertext at level l.
+            digits (list): Extended digits of the second element of the
+                ciphertext, as returned by CKKSModulusChain.mod_up.
+            level (int): Level l.
+            rotation (int): Amount to rotate by.
+            rot_key (RotationKey): Rotation key corresponding to the rotation.
+
+        Returns:
+            A tuple of RNSPolynomials modulo Q_l * P, which give the rotated
+            ciphertext after CKKSModulusChain.mod_down.
+        """
+        galois_elt = rotation_galois_elt(self.degree, rotation)
+        rotated_digits = [digit.automorphism(galois_elt) for digit in digits]
+        u0, u1 = self.multiply_digits(rotated_digits, level, rot_key.key)
+        rot_c0 = self.chain.multiply_special_modulus(c0.automorphism(galois_elt), level)
+        return u0.add(rot_c0), u1
+
+    def rotate_many(self, ciph, rotations, rot_keys):
+        """Rotates a ciphertext by several amounts.
+
+        In full-RNS mode, the rotations are hoisted: c1 is decomposed,
+        extended and transformed only once, and each rotation only permutes
+        the extended digits and multiplies them by its key. Rotations without
+        a key are composed with rotate_any.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to rotate.
+            rotations (list): Amounts to rotate by.
+            rot_keys (dict (RotationKey)): Rotation keys, indexed by rotation.
+
+        Returns:
+            A list with a Ciphertext for each rotation, in the same order.
+        """
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, 'Ciphertext must be relinearized before it is rotated'
+        if ciph.level is None:
+            return [self.rotate_any(ciph, rotation, rot_keys) for rotation in rotations]
+
+        level = ciph.level
+        digits = self.chain.mod_up(ciph.c1, level)
+        c0 = ciph.c0.to_ntt()
+
+        rot_ciphs = []
+        for rotation in rotations:
+            if rotation == 0 or rotation not in rot_keys:
+                rot_ciphs.append(self.rotate_any(ciph, rotation, rot_keys))
+                continue
+            rot_c0, rot_c1 = self.rotate_extended(c0, digits, level, rotation,
+                                                  rot_keys[rotation])
+            rot_ciphs.append(Ciphertext(self.chain.mod_down(rot_c0, level),
+                                        self.chain.mod_down(rot_c1, level),
+                                        ciph.scaling_factor, ciph.modulus, level))
+        return rot_ciphs
+
+    def lower_level(self, ciph, level, scaling_factor=None):
+        """Drops limbs of a full-RNS ciphertext until it is at the given level.
+
+        If a scaling factor is given, the last limb is not dropped, but the
+        ciphertext is multiplied by round(scaling_factor * q / scaling factor of ciph),
+        where q is the prime of the limb, and rescaled by q. This sets the scaling
+        factor up to a relative error of about 1 / q, at the cost of one product by
+        an integer.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to modify.
+            level (int): New level, at most the level of ciph.
+            scaling_factor (float): New scaling factor, or None to keep the
+                scaling factor of ciph.
+
+        Returns:
+            A Ciphertext at the given level.
+        """
+        assert 0 <= level <= ciph.level, 'Cannot raise level from %d to %d' % (ciph.level, level)
+        if scaling_factor is not None and level < ciph.level:
+            assert ciph.pending_scale is None, 'Ciphertext must be rescaled first'
+            ciph = self.lower_level(ciph, level + 1)
+            factor = round(scaling_factor * self.chain.primes[level + 1] / ciph.scaling_factor)
+            c2 = ciph.c2.scalar_multiply(factor) if ciph.c2 is not None else None
+            ciph = Ciphertext(ciph.c0.scalar_multiply(factor), ciph.c1.scalar_multiply(factor),
+                              ciph.scaling_factor * factor, ciph.modulus, ciph.level, c2)
+            ciph = self.rescale(ciph, self.chain.primes[level + 1])
+            ciph.scaling_factor = scaling_factor
+            return ciph
+
+        crt = self.chain.context(level)
+        c2 = ciph.c2.restrict(crt) if ciph.c2 is not None else None
+        return Ciphertext(ciph.c0.restrict(crt), ciph.c1.restrict(crt), ciph.scaling_factor,
+                          crt.modulus, level, c2, ciph.pending_scale)
+
+    def match_modulus(self, ciph1, ciph2, match_scale=False):
+        """Lowers the modulus of one of two ciphertexts, so that both moduli are equal.
+
+        In full-RNS mode, if the scaling factors differ by less than SCALE_DRIFT,
+        the scaling factor of the lowered ciphertext is set to that of the other
+        ciphertext, so that the two can be added. If both ciphertexts are at the
+        same level, this needs one more level, so it is only done if match_scale
+        is set, e.g. before the ciphertexts are added.
+
+        Args:
+            ciph1 (Ciphertext): First ciphertext.
+            ciph2 (Ciphertext): Second ciphertext.
+            match_scale (bool): Whether to also match drifted scaling factors of
+                ciphertexts at the same level.
+
+        Returns:
+            The two ciphertexts at the smaller of their moduli.
+        """
+        ciph1 = self.rescale_pending(ciph1)
+        ciph2 = self.rescale_pending(ciph2)
+        drifted = ciph1.level is not None and ciph1.scaling_factor != ciph2.scaling_factor \
+            and math.isclose(ciph1.scaling_factor, ciph2.scaling_factor, rel_tol=SCALE_DRIFT)
+        if ciph1.modulus == ciph2.modulus:
+            if drifted and match_scale:
+                assert ciph1.level > 0, 'No level left to match the scaling factors'
+                return (self.lower_level(ciph1, ciph1.level - 1, ciph2.scaling_factor),
+                        self.lower_level(ciph2, ciph2.level - 1))
+            return ciph1, ciph2
+        if ciph1.modulus < ciph2.modulus:
+            ciph2, ciph1 = self.match_modulus(ciph2, ciph1)
+            return ciph1, ciph2
+        if ciph1.level is not None:
+            scaling_factor = ciph2.scaling_factor if drifted else None
+            return self.lower_level(ciph1, ciph2.level, scaling_factor), ciph2
+        return self.lower_modulus(ciph1, ciph1.modulus // ciph2.modulus), ciph2
+
+    def multiply_const_to_scale(self, ciph, const, scaling_factor):
+        """Multiplies a ciphertext by a constant, so that the product has the given scaling factor.
+
+        The constant is encoded at the ratio of the scaling factors, which should
+        be large, e.g. close to the scaling factor of the parameters. This aligns
+        a ciphertext with an unrescaled product before they are added, so that
+        the sum is rescaled once, without drift of the scaling factors.
+
+        Args:
+            ciph (Ciphertext): A ciphertext to multiply.
+            const (complex): A real or complex constant to multiply.
+            scaling_factor (float): Scaling factor of the product.
+
+        Returns:
+            A Ciphertext which is the product of the ciphertext and constant.
+        """
+        if isinstance(scaling_factor, int) and isinstance(ciph.scaling_factor, int):
+            assert scaling_factor % ciph.scaling_factor == 0, \
+                'Scaling factor must be a multiple of the scaling factor of the ciphertext'
+            ratio = scaling_factor // ciph.scaling_factor
+        else:
+            ratio = scaling_factor / ciph.scaling_factor
+        product = self.multiply_const(ciph, const, ratio)
+        product.scaling_factor = scaling_factor
+        return product
+
     def rotate(self, ciph, rotation, rot_key):
         """Rotates a ciphertext by the amount specified in rotation.
 
@@ -284,11 +914,61 @@ class CKKSEvaluator:
             A Ciphertext which is the encryption of the rotation of the original
             plaintext.
         """
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, 'Ciphertext must be relinearized before it is rotated'
+        if ciph.level is not None:
+            galois_elt = rotation_galois_elt(self.degree, rotation)
+            rot_ciph = Ciphertext(ciph.c0.automorphism(galois_elt),
+                                  ciph.c1.automorphism(galois_elt), ciph.scaling_factor,
+                                  ciph.modulus, ciph.level)
+            return self.switch_key(rot_ciph, rot_key.key)
+
         rot_ciph0 = ciph.c0.rotate(rotation)
         rot_ciph1 = ciph.c1.rotate(rotation)
         rot_ciph = Ciphertext(rot_ciph0, rot_ciph1, ciph.scaling_factor, ciph.modulus)
         return self.switch_key(rot_ciph, rot_key.key)
 
+    def rotation_composer(self, rot_keys):
+        """Returns a RotationComposer for a set of rotation keys.
+
+        The composer of the last set of keys is cached.
+
+        Args:
+            rot_keys (dict (RotationKey)): Rotation keys, indexed by rotation.
+
+        Returns:
+            A RotationComposer for the rotations of the keys.
+        """
+        rotations = frozenset(rot_keys)
+        if self._composer is None or self._composer[0] != rotations:
+            self._composer = (rotations, RotationComposer(rotations, self.degree // 2))
+        return self._composer[1]
+
+    def rotate_any(self, ciph, rotation, rot_keys):
+        """Rotates a ciphertext by any amount, with the keys that are available.
+
+        If there is no key for the rotation, it is composed from the fewest
+        rotations with keys, e.g. by its signed-binary decomposition if there
+        are keys for the powers of two and their negatives. Each of them costs
+        one key switch. RotationKeyPlanner chooses keys for this trade-off.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to rotate.
+            rotation (int): Amount to rotate by.
+            rot_keys (dict (RotationKey)): Rotation keys, indexed by rotation. This can
+                also be a RotationKeyStore, which only loads the keys that are used.
+
+        Returns:
+            A Ciphertext which is the encryption of the rotation of the original
+            plaintext.
+        """
+        assert ciph.c2 is None, 'Ciphertext must be relinearized before it is rotated'
+        if rotation in rot_keys:
+            return self.rotate(ciph, rotation, rot_keys[rotation])
+        for step in self.rotation_composer(rot_keys).decompose(rotation):
+            ciph = self.rotate(ciph, step, rot_keys[step])
+        return ciph
+
     def conjugate(self, ciph, conj_key):
         """Conjugates the ciphertext.
 
@@ -302,6 +982,14 @@ class CKKSEvaluator:
             A Ciphertext which is the encryption of the conjugation of the original
             plaintext.
         """
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, 'Ciphertext must be relinearized before it is conjugated'
+        if ciph.level is not None:
+            galois_elt = conjugation_galois_elt(self.degree)
+            conj_ciph = Ciphertext(ciph.c0.automorphism(galois_elt),
+                                   ciph.c1.automorphism(galois_elt), ciph.scaling_factor,
+                                   ciph.modulus, ciph.level)
+            return self.switch_key(conj_ciph, conj_key)
 
         conj_ciph0 = ciph.c0.conjugate().mod_small(ciph.modulus)
         conj_ciph1 = ciph.c1.conjugate().mod_small(ciph.modulus)
@@ -322,6 +1010,9 @@ class CKKSEvaluator:
         Returns:
             A Ciphertext which is the product of matrix and ciph.
         """
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, \
+            'Ciphertext must be relinearized before it is multiplied by a matrix'
         diag = util.matrix_operations.diagonal(matrix, 0)
         diag = encoder.encode(diag, self.scaling_factor)
         ciph_prod = self.multiply_plain(ciph, diag)
@@ -343,51 +1034,392 @@ class CKKSEvaluator:
 
         Args:
             ciph (Ciphertext): Ciphertext to multiply.
-            matrix (2-D Array): Matrix to multiply.
-            rot_keys (dict (RotationKey)): Rotation keys
+            matrix (2-D Array or LinearTransform): Matrix to multiply, or a LinearTransform
+                with its encoded diagonals.
+            rot_keys (dict (RotationKey)): Rotation keys. Rotations without a key are
+                composed with rotate_any.
             encoder (CKKSEncoder): Encoder for CKKS.
 
         Returns:
             A Ciphertext which is the product of matrix and ciph.
         """
-
-        # Compute two factors of matrix_len (a power of two), both near its square root.
-        matrix_len = len(matrix)
-        matrix_len_factor1 = int(sqrt(matrix_len))
-        if matrix_len != matrix_len_factor1 * matrix_len_factor1:
-            matrix_len_factor1 = int(sqrt(2 * matrix_len))
-        matrix_len_factor2 = matrix_len // matrix_len_factor1
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, \
+            'Ciphertext must be relinearized before it is multiplied by a matrix'
+        transform = matrix
+        if not isinstance(transform, LinearTransform):
+            transform = self.create_linear_transform(matrix, encoder, ciph.level)
+        assert transform.level == ciph.level, 'Linear transform is for level %s, not %s' \
+            % (transform.level, ciph.level)
+
+        if ciph.level is not None:
+            return self.multiply_matrix_hoisted(ciph, transform, rot_keys)
 
         # Compute rotations.
-        ciph_rots = [0] * matrix_len_factor1
-        ciph_rots[0] = ciph
-        for i in range(1, matrix_len_factor1):
-            ciph_rots[i] = self.rotate(ciph, i, rot_keys[i])
+        ciph_rots = dict(zip(transform.baby_rotations,
+                             self.rotate_many(ciph, transform.baby_rotations, rot_keys)))
 
         # Compute sum.
         outer_sum = None
-        for j in range(matrix_len_factor2):
+        for shift, row in transform.diagonals.items():
             inner_sum = None
-            shift = matrix_len_factor1 * j
-            for i in range(matrix_len_factor1):
-                diagonal = util.matrix_operations.diagonal(matrix, shift + i)
-                diagonal = util.matrix_operations.rotate(diagonal, -shift)
-                diagonal_plain = encoder.encode(diagonal, self.scaling_factor)
+            for i, diagonal_plain in row.items():
                 dot_prod = self.multiply_plain(ciph_rots[i], diagonal_plain)
                 if inner_sum:
                     inner_sum = self.add(inner_sum, dot_prod)
                 else:
                     inner_sum = dot_prod
 
-            rotated_sum = self.rotate(inner_sum, shift, rot_keys[shift])
+            rotated_sum = inner_sum
+            if shift:
+                rotated_sum = self.rotate_any(inner_sum, shift, rot_keys)
             if outer_sum:
                 outer_sum = self.add(outer_sum, rotated_sum)
             else:
                 outer_sum = rotated_sum
 
-        outer_sum = self.rescale(outer_sum, self.scaling_factor)
+        outer_sum = self.rescale(outer_sum, transform.scaling_factor)
         return outer_sum
 
+    def create_linear_transform(self, matrix, encoder, level=None):
+        """Encodes the diagonals of a matrix for multiply_matrix.
+
+        The diagonals are encoded with the current scaling factor, and
+        transformed to NTT form if possible.
+
+        Args:
+            matrix (2-D Array): Matrix to multiply by.
+            encoder (CKKSEncoder): Encoder for CKKS.
+            level (int): Level of the ciphertexts in full-RNS mode, or None.
+
+        Returns:
+            A LinearTransform for the matrix.
+        """
+        if level is not None:
+            return LinearTransform(matrix, encoder, self.scaling_factor,
+                                   self.chain.extended_context(level), level)
+        return LinearTransform(matrix, encoder, self.scaling_factor, self.crt_context)
+
+    def multiply_matrix_hoisted(self, ciph, transform, rot_keys):
+        """Multiplies a full-RNS ciphertext by a linear transform with double hoisting.
+
+        The baby-step rotations share one decomposition of c1, and they are
+        kept modulo Q_l * P, so that each inner sum is divided by P only once.
+        The giant-step rotations are also summed modulo Q_l * P, and divided
+        by P once at the end.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to multiply.
+            transform (LinearTransform): Encoded diagonals of the matrix at the
+                level of ciph.
+            rot_keys (dict (RotationKey)): Rotation keys. Rotations without a key are
+                composed with rotate_any.
+
+        Returns:
+            A Ciphertext which is the product of the matrix and ciph.
+        """
+        ciph = self.rescale_pending(ciph)
+        assert ciph.c2 is None, \
+            'Ciphertext must be relinearized before it is multiplied by a matrix'
+        chain = self.chain
+        level = ciph.level
+
+        # Compute rotations modulo Q_l * P.
+        c0 = ciph.c0.to_ntt()
+        digits = chain.mod_up(ciph.c1, level)
+        ciph_rots = {}
+        for i in transform.baby_rotations:
+            if i in rot_keys:
+                ciph_rots[i] = self.rotate_extended(c0, digits, level, i, rot_keys[i])
+            else:
+                rot = self.rotate_any(ciph, i, rot_keys)
+                ciph_rots[i] = (chain.multiply_special_modulus(rot.c0.to_ntt(), level),
+                                chain.multiply_special_modulus(rot.c1.to_ntt(), level))
+
+        # Compute sum.
+        outer_sum = None
+        for shift, row in transform.diagonals.items():
+            inner_sum = None
+            for i, diagonal in row.items():
+                dot_prod = [ciph_rots[i][0].multiply(diagonal), ciph_rots[i][1].multiply(diagonal)]
+                if inner_sum:
+                    inner_sum = [inner_sum[0].add(dot_prod[0]), inner_sum[1].add(dot_prod[1])]
+                else:
+                    inner_sum = dot_prod
+
+            inner_c0 = chain.mod_down(inner_sum[0], level)
+            inner_c1 = chain.mod_down(inner_sum[1], level)
+            if shift in rot_keys:
+                rotated_sum = self.rotate_extended(inner_c0, chain.mod_up(inner_c1, level), level,
+                                                   shift, rot_keys[shift])
+            else:
+                inner = self.rotate_any(Ciphertext(inner_c0, inner_c1, ciph.scaling_factor,
+                                                   ciph.modulus, level), shift, rot_keys)
+                rotated_sum = (chain.multiply_special_modulus(inner.c0.to_ntt(), level),
+                               chain.multiply_special_modulus(inner.c1.to_ntt(), level))
+            if outer_sum:
+                outer_sum = [outer_sum[0].add(rotated_sum[0]), outer_sum[1].add(rotated_sum[1])]
+            else:
+                outer_sum = list(rotated_sum)
+
+        outer_sum = Ciphertext(chain.mod_down(outer_sum[0], level),
+                               chain.mod_down(outer_sum[1], level),
+                               ciph.scaling_factor * transform.scaling_factor, ciph.modulus, level)
+        return self.rescale(outer_sum, transform.scaling_factor)
+
+    # POLYNOMIAL EVALUATION
+
+    def basis_power(self, powers, index, relin_key, basis):
+        """Computes a power x^index, or a Chebyshev polynomial T_index, of a ciphertext.
+
+        The index is split into the largest power of two a < index and
+        b = index - a, and x^index = x^a * x^b, or T_index = 2 * T_a * T_b - T_(a - b),
+        so that the depth is the smallest possible, ceil(log2(index)).
+
+        Args:
+            powers (dict): Ciphertexts of the powers computed so far, indexed by
+                degree, which must contain the ciphertext of degree 1. New powers
+                are added to it.
+            index (int): Degree of the power.
+            relin_key (PublicKey): Relinearization key.
+            basis (str): POWER_BASIS or CHEBYSHEV_BASIS.
+
+        Returns:
+            A Ciphertext for the power.
+        """
+        if index in powers:
+            return powers[index]
+
+        high = 1 << ((index - 1).bit_length() - 1)
+        low = index - high
+        ciph1, ciph2 = self.match_modulus(self.basis_power(powers, high, relin_key, basis),
+                                          self.basis_power(powers, low, relin_key, basis))
+        if basis == POWER_BASIS:
+            powers[index] = self.multiply_rescale(ciph1, ciph2, relin_key)
+            return powers[index]
+
+        power = self.multiply(ciph1, ciph2, relin_key)
+        power = self.add(power, power)
+        if high == low:
+            power = self.add_const(self.rescale(power, self.scaling_factor), -1)
+        else:
+            diff = self.basis_power(powers, high - low, relin_key, basis)
+            power = self.subtract_rescale(power, diff)
+
+        powers[index] = power
+        return power
+
+    def add_rescale(self, prod, ciph, subtract=False):
+        """Adds a ciphertext to a product that has not been rescaled, and rescales.
+
+        If the ciphertext has at least the modulus of the product, it is lowered
+        and multiplied by 1 at the ratio of the scaling factors before the sum is
+        rescaled, which takes no level and gives exactly equal scaling factors.
+        Otherwise, the product is rescaled first, and the scaling factors are
+        matched by match_modulus.
+
+        Args:
+            prod (Ciphertext): Product that has not been rescaled.
+            ciph (Ciphertext): Ciphertext at about the scaling factor of the
+                rescaled product.
+            subtract (bool): Whether to subtract the ciphertext instead.
+
+        Returns:
+            A Ciphertext for the rescaled sum or difference.
+        """
+        combine = self.subtract if subtract else self.add
+        ciph = self.rescale_pending(ciph)
+        if ciph.modulus >= prod.modulus:
+            prod, ciph = self.match_modulus(prod, ciph)
+            ciph = self.multiply_const_to_scale(ciph, 1, prod.scaling_factor)
+            return self.rescale(combine(prod, ciph), self.scaling_factor)
+
+        prod, ciph = self.match_modulus(self.rescale(prod, self.scaling_factor), ciph,
+                                        match_scale=True)
+        return combine(prod, ciph)
+
+    def subtract_rescale(self, prod, ciph):
+        """Subtracts a ciphertext from a product that has not been rescaled, and rescales.
+
+        Args:
+            prod (Ciphertext): Product that has not been rescaled.
+            ciph (Ciphertext): Ciphertext at about the scaling factor of the
+                rescaled product.
+
+        Returns:
+            A Ciphertext for the rescaled difference, as in add_rescale.
+        """
+        return self.add_rescale(prod, ciph, subtract=True)
+
+    def evaluate_polynomial(self, ciph, coeffs, relin_key, basis=POWER_BASIS):
+        """Evaluates a polynomial on a ciphertext.
+
+        Uses the baby-step giant-step algorithm of Paterson and Stockmeyer. For a
+        polynomial of degree d < 2^m, the baby steps are the powers below k = 2^(m/2),
+        rounded up, and the giant steps are the powers k, 2k, 4k, ..., 2^(m - 1). The
+        polynomial is divided recursively by the giant steps, down to polynomials
+        of degree smaller than k, which are sums of baby steps times constants.
+        This takes about k + d / k + m - m / 2 multiplications of ciphertexts
+        instead of d, and a depth of m + 1.
+
+        In the Chebyshev basis, the slots of the ciphertext should lie in [-1, 1].
+
+        Args:
+            ciph (Ciphertext): Ciphertext to evaluate the polynomial on.
+            coeffs (list): Coefficients of the polynomial, with the constant term
+                first. They may be complex.
+            relin_key (PublicKey): Relinearization key.
+            basis (str): POWER_BASIS if coeffs[i] is the coefficient of x^i, or
+                CHEBYSHEV_BASIS if it is the coefficient of the Chebyshev
+                polynomial T_i.
+
+        Returns:
+            A Ciphertext for the value of the polynomial.
+        """
+        assert basis in (POWER_BASIS, CHEBYSHEV_BASIS), 'Unknown basis ' + str(basis)
+        coeffs = trim_coeffs(coeffs)
+        degree = len(coeffs) - 1
+        assert degree > 0, 'Polynomial must not be constant'
+
+        log_degree = degree.bit_length()
+        baby_steps = 1 << ((log_degree + 1) // 2)
+        powers = {1: ciph}
+        for index in range(2, min(baby_steps, degree) + 1):
+            self.basis_power(powers, index, relin_key, basis)
+        giant_step = baby_steps
+        while giant_step <= degree:
+            self.basis_power(powers, giant_step, relin_key, basis)
+            giant_step *= 2
+
+        return self.evaluate_giant_step(coeffs, powers, baby_steps, relin_key, basis)
+
+    def evaluate_giant_step(self, coeffs, powers, baby_steps, relin_key, basis,
+                            scaling_factor=None):
+        """Evaluates a polynomial by dividing it by the largest giant step.
+
+        In full-RNS mode, the remainder is evaluated at the scaling factor of the
+        rescaled product of the quotient and giant step, so that the two can be
+        added without matching drifted scaling factors, which would take a level.
+
+        Args:
+            coeffs (list): Coefficients of the polynomial.
+            powers (dict): Ciphertexts of the baby steps and giant steps.
+            baby_steps (int): Number k of baby steps.
+            relin_key (PublicKey): Relinearization key.
+            basis (str): POWER_BASIS or CHEBYSHEV_BASIS.
+            scaling_factor (float): Scaling factor of the result in full-RNS mode,
+                or None for any scaling factor close to that of the parameters.
+
+        Returns:
+            A Ciphertext for the value of the polynomial, or the constant
+            coefficient if the polynomial is constant.
+        """
+        coeffs = trim_coeffs(coeffs)
+        degree = len(coeffs) - 1
+        if degree < baby_steps:
+            return self.evaluate_baby_step(coeffs, powers, scaling_factor=scaling_factor)
+
+        giant_step = 1 << (degree.bit_length() - 1)
+        quotient, remainder = split_coeffs(coeffs, giant_step, basis)
+        quotient = self.evaluate_giant_step(quotient, powers, baby_steps, relin_key, basis)
+        result = self.multiply_giant_step(quotient, powers[giant_step], relin_key, scaling_factor)
+
+        # A remainder of baby steps at no smaller modulus is added before the product
+        # is rescaled, so that it takes no level of its own.
+        remainder = trim_coeffs(remainder)
+        if len(remainder) <= baby_steps and all(
+                powers[i].modulus >= result.modulus for i in range(1, len(remainder))):
+            return self.evaluate_baby_step(remainder, powers, result)
+
+        remainder_scale = None
+        if self.chain:
+            remainder_scale = result.scaling_factor / self.chain.primes[result.level]
+        remainder = self.evaluate_giant_step(remainder, powers, baby_steps, relin_key, basis,
+                                             remainder_scale)
+        if isinstance(remainder, Ciphertext):
+            return self.add_rescale(result, remainder)
+        result = self.rescale(result, self.scaling_factor)
+        if remainder:
+            return self.add_const(result, remainder)
+        return result
+
+    def multiply_giant_step(self, quotient, giant, relin_key, scaling_factor=None):
+        """Multiplies the value of a quotient by a giant step, without rescaling.
+
+        If a scaling factor is given in full-RNS mode, the operand at the higher
+        level is lowered to the level of the other at a scaling factor such
+        that the rescaled product has the given scaling factor. This is not
+        possible if both are at the same level.
+
+        Args:
+            quotient (Ciphertext): Value of the quotient, or a constant.
+            giant (Ciphertext): Giant step.
+            relin_key (PublicKey): Relinearization key.
+            scaling_factor (float): Scaling factor of the rescaled product, or None.
+
+        Returns:
+            A Ciphertext for the product.
+        """
+        if not isinstance(quotient, Ciphertext):
+            if scaling_factor is None:
+                return self.multiply_const(giant, quotient)
+            prod_scale = scaling_factor * self.chain.primes[giant.level]
+            return self.multiply_const_to_scale(giant, quotient, prod_scale)
+
+        if scaling_factor is not None and quotient.level != giant.level:
+            level = min(quotient.level, giant.level)
+            prod_scale = scaling_factor * self.chain.primes[level]
+            if quotient.level > level:
+                quotient = self.lower_level(quotient, level, prod_scale / giant.scaling_factor)
+            else:
+                giant = self.lower_level(giant, level, prod_scale / quotient.scaling_factor)
+        quotient, giant = self.match_modulus(quotient, giant)
+        return self.multiply(quotient, giant, relin_key)
+
+    def evaluate_baby_step(self, coeffs, powers, prod=None, scaling_factor=None):
+        """Evaluates a polynomial of degree smaller than the number of baby steps.
+
+        The baby steps are lowered to the smallest of their moduli and multiplied
+        by constants, so that the sum is only rescaled once. The constants are
+        encoded such that all terms have the same scaling factor.
+
+        Args:
+            coeffs (list): Coefficients of the polynomial.
+            powers (dict): Ciphertexts of the baby steps.
+            prod (Ciphertext): Product that has not been rescaled, or None. If it
+                is given, the terms are lowered to its modulus, encoded at its
+                scaling factor and added to it before the sum is rescaled.
+            scaling_factor (float): Scaling factor of the result in full-RNS mode
+                if prod is None, or None for any scaling factor close to that of
+                the parameters.
+
+        Returns:
+            A Ciphertext for the value of the polynomial, plus prod if it is given,
+            or the constant coefficient if the polynomial is constant.
+        """
+        terms = [(coeff, powers[i]) for i, coeff in enumerate(coeffs) if i and coeff]
+        if not terms and prod is None:
+            return coeffs[0]
+
+        if prod is not None:
+            lowest = prod
+            sum_scale = prod.scaling_factor
+        else:
+            lowest = min((power for _, power in terms), key=lambda power: power.modulus)
+            if scaling_factor is not None:
+                sum_scale = scaling_factor * self.chain.primes[lowest.level]
+            else:
+                sum_scale = lowest.scaling_factor * self.scaling_factor
+        result = prod
+        for coeff, power in terms:
+            power, _ = self.match_modulus(power, lowest)
+            term = self.multiply_const_to_scale(power, coeff, sum_scale)
+            result = self.add(result, term) if result is not None else term
+        result = self.rescale(result, self.scaling_factor)
+        if coeffs[0]:
+            result = self.add_const(result, coeffs[0])
+        return result
+
     # BOOTSTRAPPING
 
     def create_constant_plain(self, const):
@@ -420,6 +1452,20 @@ class CKKSEvaluator:
         plain_vec = [const] * (self.degree // 2)
         return encoder.encode(plain_vec, self.scaling_factor)
 
+    def boot_transform(self, name, encoder):
+        """Returns the encoded diagonals of a bootstrapping matrix.
+
+        Args:
+            name (str): Name of the matrix in the bootstrapping context.
+            encoder (CKKSEncoder): Encoder for CKKS.
+
+        Returns:
+            A LinearTransform at the current scaling factor, which is reused
+            by later bootstraps.
+        """
+        return self.boot_context.linear_transform(name, encoder, self.scaling_factor,
+                                                  self.crt_context)
+
     def coeff_to_slot(self, ciph, rot_keys, conj_key, encoder):
         """Takes a ciphertext coefficients and puts into plaintext slots.
 
@@ -437,23 +1483,22 @@ class CKKSEvaluator:
             Two Ciphertexts which are transformed.
         """
         # Compute new ciphertexts.
-        s1 = self.multiply_matrix(ciph, self.boot_context.encoding_mat_conj_transpose0,
+        s1 = self.multiply_matrix(ciph, self.boot_transform('encoding_mat_conj_transpose0', encoder),
                                   rot_keys, encoder)
         s2 = self.conjugate(ciph, conj_key)
-        s2 = self.multiply_matrix(s2, self.boot_context.encoding_mat_transpose0, rot_keys,
-                                  encoder)
+        s2 = self.multiply_matrix(s2, self.boot_transform('encoding_mat_transpose0', encoder),
+                                  rot_keys, encoder)
         ciph0 = self.add(s1, s2)
-        constant = self.create_constant_plain(1 / self.degree)
-        ciph0 = self.multiply_plain(ciph0, constant)
+        ciph0 = self.multiply_const(ciph0, 1 / self.degree)
         ciph0 = self.rescale(ciph0, self.scaling_factor)
 
-        s1 = self.multiply_matrix(ciph, self.boot_context.encoding_mat_conj_transpose1,
+        s1 = self.multiply_matrix(ciph, self.boot_transform('encoding_mat_conj_transpose1', encoder),
                                   rot_keys, encoder)
         s2 = self.conjugate(ciph, conj_key)
-        s2 = self.multiply_matrix(s2, self.boot_context.encoding_mat_transpose1, rot_keys,
-                                  encoder)
+        s2 = self.multiply_matrix(s2, self.boot_transform('encoding_mat_transpose1', encoder),
+                                  rot_keys, encoder)
         ciph1 = self.add(s1, s2)
-        ciph1 = self.multiply_plain(ciph1, constant)
+        ciph1 = self.multiply_const(ciph1, 1 / self.degree)
         ciph1 = self.rescale(ciph1, self.scaling_factor)
 
         return ciph0, ciph1
@@ -474,14 +1519,72 @@ class CKKSEvaluator:
         Returns:
             Ciphertext which is transformed.
         """
-        s1 = self.multiply_matrix(ciph0, self.boot_context.encoding_mat0, rot_keys,
+        s1 = self.multiply_matrix(ciph0, self.boot_transform('encoding_mat0', encoder), rot_keys,
                                   encoder)
-        s2 = self.multiply_matrix(ciph1, self.boot_context.encoding_mat1, rot_keys,
+        s2 = self.multiply_matrix(ciph1, self.boot_transform('encoding_mat1', encoder), rot_keys,
                                   encoder)
         ciph = self.add(s1, s2)
 
         return ciph
 
+    def coeff_to_slot_fft(self, ciph, rot_keys, conj_key, encoder):
+        """Takes a ciphertext coefficients and puts into plaintext slots with FFT stages.
+
+        Like coeff_to_slot, but multiplies by the merged FFT stages of the
+        bootstrapping context, so the transformed vectors are in bit-reversed
+        order. This takes dft_levels levels.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to transform.
+            rot_keys (dict (RotationKey)): Rotation keys
+            conj_key (PublicKey): Conjugation key.
+            encoder (CKKSEncoder): Encoder for CKKS.
+
+        Returns:
+            Two Ciphertexts which are transformed, with slots in bit-reversed order.
+        """
+        num_stages = self.boot_context.dft_levels
+        for j in range(num_stages - 1):
+            ciph = self.multiply_matrix(ciph, self.boot_transform('coeff_to_slot_%d' % j, encoder),
+                                        rot_keys, encoder)
+
+        # The last stage gives y = B^H * w / d and -i * y, where B is the product of the stages.
+        last = self.boot_transform('coeff_to_slot_%d' % (num_stages - 1), encoder)
+        ciph0 = self.multiply_matrix(ciph, last, rot_keys, encoder)
+        ciph0 = self.add(ciph0, self.conjugate(ciph0, conj_key))
+        last = self.boot_transform('coeff_to_slot_last_i', encoder)
+        ciph1 = self.multiply_matrix(ciph, last, rot_keys, encoder)
+        ciph1 = self.add(ciph1, self.conjugate(ciph1, conj_key))
+
+        return ciph0, ciph1
+
+    def slot_to_coeff_fft(self, ciph0, ciph1, rot_keys, encoder):
+        """Takes plaintext slots and puts into ciphertext coefficients with FFT stages.
+
+        Like slot_to_coeff, but for slots in bit-reversed order, as returned
+        by coeff_to_slot_fft. This takes dft_levels levels.
+
+        Args:
+            ciph0 (Ciphertext): First ciphertext to transform.
+            ciph1 (Ciphertext): Second ciphertext to transform.
+            rot_keys (dict (RotationKey)): Rotation keys.
+            encoder (CKKSEncoder): Encoder for CKKS.
+
+        Returns:
+            Ciphertext which is transformed.
+        """
+        s1 = self.multiply_matrix(ciph0, self.boot_transform('slot_to_coeff_0', encoder),
+                                  rot_keys, encoder)
+        s2 = self.multiply_matrix(ciph1, self.boot_transform('slot_to_coeff_0_i', encoder),
+                                  rot_keys, encoder)
+        ciph = self.add(s1, s2)
+
+        for j in range(1, self.boot_context.dft_levels):
+            ciph = self.multiply_matrix(ciph, self.boot_transform('slot_to_coeff_%d' % j, encoder),
+                                        rot_keys, encoder)
+
+        return ciph
+
     def exp_taylor(self, ciph, relin_key, encoder):
         """Evaluates the exponential function on the ciphertext.
 
@@ -495,53 +1598,40 @@ class CKKSEvaluator:
         Returns:
             Ciphertext for exponential.
         """
-        ciph2 = self.multiply(ciph, ciph, relin_key)
-        ciph2 = self.rescale(ciph2, self.scaling_factor)
+        ciph2 = self.multiply_rescale(ciph, ciph, relin_key)
 
-        ciph4 = self.multiply(ciph2, ciph2, relin_key)
-        ciph4 = self.rescale(ciph4, self.scaling_factor)
+        ciph4 = self.multiply_rescale(ciph2, ciph2, relin_key)
 
-        const = self.create_constant_plain(1)
-        ciph01 = self.add_plain(ciph, const)
+        ciph01 = self.add_const(ciph, 1)
 
-        const = self.create_constant_plain(1)
-        ciph01 = self.multiply_plain(ciph01, const)
+        ciph01 = self.multiply_const(ciph01, 1)
         ciph01 = self.rescale(ciph01, self.scaling_factor)
 
-        const = self.create_constant_plain(3)
-        ciph23 = self.add_plain(ciph, const)
+        ciph23 = self.add_const(ciph, 3)
 
-        const = self.create_constant_plain(1 / 6)
-        ciph23 = self.multiply_plain(ciph23, const)
+        ciph23 = self.multiply_const(ciph23, 1 / 6)
         ciph23 = self.rescale(ciph23, self.scaling_factor)
 
-        ciph23 = self.multiply(ciph23, ciph2, relin_key)
-        ciph23 = self.rescale(ciph23, self.scaling_factor)
+        ciph23 = self.multiply_rescale(ciph23, ciph2, relin_key)
         ciph01 = self.lower_modulus(ciph01, self.scaling_factor)
         ciph23 = self.add(ciph23, ciph01)
 
-        const = self.create_constant_plain(5)
-        ciph45 = self.add_plain(ciph, const)
+        ciph45 = self.add_const(ciph, 5)
 
-        const = self.create_constant_plain(1 / 120)
-        ciph45 = self.multiply_plain(ciph45, const)
+        ciph45 = self.multiply_const(ciph45, 1 / 120)
         ciph45 = self.rescale(ciph45, self.scaling_factor)
 
-        const = self.create_constant_plain(7)
-        ciph = self.add_plain(ciph, const)
+        ciph = self.add_const(ciph, 7)
 
-        const = self.create_constant_plain(1 / 5040)
-        ciph = self.multiply_plain(ciph, const)
+        ciph = self.multiply_const(ciph, 1 / 5040)
         ciph = self.rescale(ciph, self.scaling_factor)
 
-        ciph = self.multiply(ciph, ciph2, relin_key)
-        ciph = self.rescale(ciph, self.scaling_factor)
+        ciph = self.multiply_rescale(ciph, ciph2, relin_key)
 
         ciph45 = self.lower_modulus(ciph45, self.scaling_factor)
         ciph = self.add(ciph, ciph45)
 
-        ciph = self.multiply(ciph, ciph4, relin_key)
-        ciph = self.rescale(ciph, self.scaling_factor)
+        ciph = self.multiply_rescale(ciph, ciph4, relin_key)
 
         ciph23 = self.lower_modulus(ciph23, self.scaling_factor)
         ciph = self.add(ciph, ciph23)
@@ -581,14 +1671,41 @@ class CKKSEvaluator:
             Ciphertext for exponential.
         """
         num_iterations = self.boot_context.num_taylor_iterations
-        const_plain = self.create_complex_constant_plain(const / 2**num_iterations, encoder)
-        ciph = self.multiply_plain(ciph, const_plain)
+        ciph = self.multiply_const(ciph, const / 2**num_iterations)
         ciph = self.rescale(ciph, self.scaling_factor)
         ciph = self.exp_taylor(ciph, relin_key, encoder)
 
         for _ in range(num_iterations):
-            ciph = self.multiply(ciph, ciph, relin_key)
-            ciph = self.rescale(ciph, self.scaling_factor)
+            ciph = self.multiply_rescale(ciph, ciph, relin_key)
+
+        return ciph
+
+    def eval_mod_chebyshev(self, ciph, relin_key):
+        """Reduces the slots of a ciphertext modulo 1 with a Chebyshev approximation.
+
+        Takes an encryption of x in [-K, K], and returns an encryption of
+        sin(2 * pi * x) / (2 * pi), which is close to x minus the nearest integer.
+        The slots are divided by K, the Chebyshev approximation of the scaled
+        cosine in the bootstrapping context is evaluated, and the double-angle
+        steps are applied.
+
+        Args:
+            ciph (Ciphertext): Ciphertext to reduce.
+            relin_key (PublicKey): Relinearization key.
+
+        Returns:
+            Ciphertext for the reduced values.
+        """
+        boot_context = self.boot_context
+        ciph = self.multiply_const(ciph, 1 / boot_context.eval_mod_range)
+        ciph = self.rescale(ciph, self.scaling_factor)
+        ciph = self.evaluate_polynomial(ciph, boot_context.eval_mod_coeffs, relin_key,
+                                        CHEBYSHEV_BASIS)
+
+        for constant in boot_context.double_angle_constants:
+            ciph = self.multiply_rescale(ciph, ciph, relin_key)
+            ciph = self.add(ciph, ciph)
+            ciph = self.add_const(ciph, -constant)
 
         return ciph
 
@@ -608,36 +1725,48 @@ class CKKSEvaluator:
         Returns:
             Ciphertext for exponential.
         """
+        assert ciph.level is None, 'Bootstrapping requires a big-integer ciphertext modulus'
+
         # Raise modulus.
         old_modulus = ciph.modulus
         old_scaling_factor = self.scaling_factor
         self.raise_modulus(ciph)
 
         # Coeff to slot.
-        ciph0, ciph1 = self.coeff_to_slot(ciph, rot_keys, conj_key, encoder)
-
-        # Exponentiate.
-        const = self.scaling_factor / old_modulus * 2 * math.pi * 1j
-        ciph_exp0 = self.exp(ciph0, const, relin_key, encoder)
-        ciph_neg_exp0 = self.conjugate(ciph_exp0, conj_key)
-        ciph_exp1 = self.exp(ciph1, const, relin_key, encoder)
-        ciph_neg_exp1 = self.conjugate(ciph_exp1, conj_key)
-
-        # Compute sine.
-        ciph_sin0 = self.subtract(ciph_exp0, ciph_neg_exp0)
-        ciph_sin1 = self.subtract(ciph_exp1, ciph_neg_exp1)
-
-        # Scale answer.
-        plain_const = self.create_complex_constant_plain(
-            old_modulus / self.scaling_factor * 0.25 / math.pi / 1j, encoder)
-        ciph0 = self.multiply_plain(ciph_sin0, plain_const)
-        ciph1 = self.multiply_plain(ciph_sin1, plain_const)
-        ciph0 = self.rescale(ciph0, self.scaling_factor)
-        ciph1 = self.rescale(ciph1, self.scaling_factor)
+        if self.boot_context.dft_levels:
+            ciph0, ciph1 = self.coeff_to_slot_fft(ciph, rot_keys, conj_key, encoder)
+        else:
+            ciph0, ciph1 = self.coeff_to_slot(ciph, rot_keys, conj_key, encoder)
+
+        # Reduce modulo the old modulus.
+        if self.boot_context.eval_mod == EVAL_MOD_CHEBYSHEV:
+            ciph0 = self.eval_mod_chebyshev(ciph0, relin_key)
+            ciph1 = self.eval_mod_chebyshev(ciph1, relin_key)
+        else:
+            # Exponentiate.
+            const = self.scaling_factor / old_modulus * 2 * math.pi * 1j
+            ciph_exp0 = self.exp(ciph0, const, relin_key, encoder)
+            ciph_neg_exp0 = self.conjugate(ciph_exp0, conj_key)
+            ciph_exp1 = self.exp(ciph1, const, relin_key, encoder)
+            ciph_neg_exp1 = self.conjugate(ciph_exp1, conj_key)
+
+            # Compute sine.
+            ciph_sin0 = self.subtract(ciph_exp0, ciph_neg_exp0)
+            ciph_sin1 = self.subtract(ciph_exp1, ciph_neg_exp1)
+
+            # Scale answer.
+            const = old_modulus / self.scaling_factor * 0.25 / math.pi / 1j
+            ciph0 = self.multiply_const(ciph_sin0, const)
+            ciph1 = self.multiply_const(ciph_sin1, const)
+            ciph0 = self.rescale(ciph0, self.scaling_factor)
+            ciph1 = self.rescale(ciph1, self.scaling_factor)
 
         # Slot to coeff.
         old_ciph = ciph
-        ciph = self.slot_to_coeff(ciph0, ciph1, rot_keys, encoder)
+        if self.boot_context.dft_levels:
+            ciph = self.slot_to_coeff_fft(ciph0, ciph1, rot_keys, encoder)
+        else:
+            ciph = self.slot_to_coeff(ciph0, ciph1, rot_keys, encoder)
 
         # Reset scaling factor.
         self.scaling_factor = old_scaling_factor
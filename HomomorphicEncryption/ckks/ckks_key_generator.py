@@ -1,10 +1,12 @@
 """A module to generate public and private keys for the CKKS scheme."""
 
 from util.polynomial import Polynomial
-from util.public_key import PublicKey
+from util.rns_polynomial import RNSPolynomial
 from util.rotation_key import RotationKey
 from util.secret_key import SecretKey
-from util.random_sample import sample_triangle, sample_uniform, sample_hamming_weight_vector
+from util.seeded_key import SeededPublicKey, expand_uniform
+from util.switching_key import SwitchingKey
+from util.random_sample import sample_triangle, sample_hamming_weight_vector, sample_seed
 
 class CKKSKeyGenerator:
 
@@ -14,6 +16,13 @@ class CKKSKeyGenerator:
     pair (-as + e, a). The relinearization keys are generated, as
     specified in the CKKS paper.
 
+    In full-RNS mode, the public key is stored modulo Q_L, and switching keys
+    are stored modulo Q_L * P with one pair for each digit of the modulus
+    chain, both as RNSPolynomials in NTT form.
+
+    The uniformly random second element of each key is generated from a
+    seed, and the keys are SeededPublicKeys which only store the seed.
+
     Attributes:
         params (Parameters): Parameters including polynomial degree, plaintext,
             and ciphertext modulus.
@@ -53,15 +62,68 @@ class CKKSKeyGenerator:
             params (Parameters): Parameters including polynomial degree,
                 plaintext, and ciphertext modulus.
         """
+        if params.chain:
+            self.generate_public_key_rns(params)
+            return
+
         mod = self.params.big_modulus
 
-        pk_coeff = Polynomial(params.poly_degree, sample_uniform(0, mod, params.poly_degree))
+        seed = sample_seed()
+        pk_coeff = expand_uniform(seed, params.poly_degree, modulus=mod)
         pk_error = Polynomial(params.poly_degree, sample_triangle(params.poly_degree))
-        p0 = pk_coeff.multiply(self.secret_key.s, mod)
+        p0 = self.secret_key.multiply(pk_coeff, mod)
         p0 = p0.scalar_multiply(-1, mod)
         p0 = p0.add(pk_error, mod)
-        p1 = pk_coeff
-        self.public_key = PublicKey(p0, p1)
+        self.public_key = SeededPublicKey(p0, seed, params.poly_degree, modulus=mod)
+
+    def generate_public_key_rns(self, params):
+        """Generates a public key modulo Q_L for full-RNS CKKS.
+
+        Args:
+            params (Parameters): Parameters including polynomial degree,
+                plaintext, and ciphertext modulus.
+        """
+        crt = params.chain.context(params.chain.num_levels)
+        seed = sample_seed()
+        pk_coeff = expand_uniform(seed, params.poly_degree, crt_context=crt)
+        pk_error = Polynomial(params.poly_degree, sample_triangle(params.poly_degree))
+        secret = RNSPolynomial.from_polynomial(self.secret_key.s, crt)
+
+        p0 = pk_coeff.multiply(secret).negate()
+        p0 = p0.add(RNSPolynomial.from_polynomial(pk_error, crt))
+        self.public_key = SeededPublicKey(p0, seed, params.poly_degree, crt_context=crt)
+
+    def generate_switching_key_rns(self, new_key):
+        """Generates a switching key modulo Q_L * P for full-RNS CKKS.
+
+        The key for digit j is (-a_j s + e_j + P * g_j * new_key, a_j) for a
+        uniformly random a_j, where g_j is 1 modulo the primes of digit j and
+        0 modulo the other primes of Q_L.
+
+        Args:
+            new_key (Polynomial): New key to generate switching key.
+
+        Returns:
+            A SwitchingKey.
+        """
+        chain = self.params.chain
+        crt = chain.extended_context(chain.num_levels)
+        secret = RNSPolynomial.from_polynomial(self.secret_key.s, crt)
+        new_key = RNSPolynomial.from_polynomial(new_key, crt)
+
+        keys = []
+        for digit in range(chain.dnum):
+            seed = sample_seed()
+            swk_coeff = expand_uniform(seed, self.params.poly_degree, crt_context=crt)
+            swk_error = Polynomial(self.params.poly_degree,
+                                   sample_triangle(self.params.poly_degree))
+            sw0 = swk_coeff.multiply(secret).negate()
+            sw0 = sw0.add(RNSPolynomial.from_polynomial(swk_error, crt))
+            gadget = chain.special_modulus * chain.digit_gadget(digit)
+            sw0 = sw0.add(new_key.scalar_multiply(gadget))
+            keys.append(SeededPublicKey(sw0, seed, self.params.poly_degree, crt_context=crt))
+
+        return SwitchingKey(keys)
 
     def generate_switching_key(self, new_key):
         """Generates a switching key for CKKS scheme.
@@ -74,19 +136,22 @@ class CKKSKeyGenerator:
         Returns:
             A switching key.
         """
+        if self.params.chain:
+            return self.generate_switching_key_rns(new_key)
+
         mod = self.params.big_modulus
         mod_squared = mod ** 2
 
-        swk_coeff = Polynomial(self.params.poly_degree, sample_uniform(0, mod_squared, self.params.poly_degree))
+        seed = sample_seed()
+        swk_coeff = expand_uniform(seed, self.params.poly_degree, modulus=mod_squared)
         swk_error = Polynomial(self.params.poly_degree, sample_triangle(self.params.poly_degree))
 
-        sw0 = swk_coeff.multiply(self.secret_key.s, mod_squared)
+        sw0 = self.secret_key.multiply(swk_coeff, mod_squared)
         sw0 = sw0.scalar_multiply(-1, mod_squared)
         sw0 = sw0.add(swk_error, mod_squared)
         temp = new_key.scalar_multiply(mod, mod_squared)
         sw0 = sw0.add(temp, mod_squared)
-        sw1 = swk_coeff
-        return PublicKey(sw0, sw1)
+        return SeededPublicKey(sw0, seed, self.params.poly_degree, modulus=mod_squared)
 
     def generate_relin_key(self, params):
         """Generates a relinearization key for CKKS scheme.
@@ -95,7 +160,10 @@ class CKKSKeyGenerator:
             params (Parameters): Parameters including polynomial degree,
                 plaintext, and ciphertext modulus.
         """
-        sk_squared = self.secret_key.s.multiply(self.secret_key.s, self.params.big_modulus)
+        if params.chain:
+            sk_squared = self.secret_key.multiply(self.secret_key.s, None)
+        else:
+            sk_squared = self.secret_key.multiply(self.secret_key.s, self.params.big_modulus)
         self.relin_key = self.generate_switching_key(sk_squared)
 
     def generate_rot_key(self, rotation):
@@ -0,0 +1,149 @@
+"""A module to precompute the plaintexts of a matrix-vector product for the CKKS scheme."""
+
+import numpy as np
+
+import util.matrix_operations
+from util.rns_polynomial import RNSPolynomial
+
+class LinearTransform:
+
+    """A matrix prepared for repeated products with ciphertexts.
+
+    The product of a matrix with the slots of a ciphertext is computed with
+    the Baby-Step Giant-Step algorithm described in the CKKS paper, which
+    multiplies rotations of the ciphertext by the diagonals of the matrix.
+    Diagonal k is split into a giant step g and a baby step b with k = g + b,
+    and rotated by -g, so that the product is the sum over g of the rotation
+    by g of the sum over b of the diagonals times the rotations by b. The
+    diagonals are extracted, rotated, and encoded once, so that the same
+    matrix can be applied many times. Only nonzero diagonals are stored, so
+    sparse matrices need fewer rotations.
+
+    If a CRT context is given, the encoded diagonals are also transformed
+    to NTT form in that context. For full-RNS ciphertexts, the diagonals are
+    RNSPolynomials modulo Q_l * P for a level l, since the products are
+    computed before dividing by P.
+
+    Attributes:
+        matrix_len (int): Size of the matrix, a power of two.
+        baby_steps (int): Baby steps are the rotations 0, ..., baby_steps - 1,
+            and giant steps are multiples of baby_steps.
+        scaling_factor (float): Scaling factor of the encoded diagonals.
+        level (int): Level l for full-RNS ciphertexts, or None.
+        baby_rotations (list): Baby steps that are used by some diagonal.
+        diagonals (dict): diagonals[g][b] is diagonal g + b of the matrix,
+            rotated by -g, as a Plaintext, or as an RNSPolynomial in full-RNS
+            mode.
+    """
+
+    def __init__(self, matrix, encoder, scaling_factor, crt_context=None, level=None):
+        """Inits LinearTransform by encoding the diagonals of a matrix.
+
+        Args:
+            matrix (2-D Array): Matrix to multiply by, as a list of rows or an ndarray.
+            encoder (CKKSEncoder): Encoder for CKKS.
+            scaling_factor (float): Scaling factor to encode the diagonals with.
+            crt_context (CRTContext): Context in which to store the NTT form of the
+                diagonals, or None to only encode them. In full-RNS mode, this must
+                be the extended context of the level.
+            level (int): Level l of the ciphertexts in full-RNS mode, or None for
+                big-integer ciphertexts.
+        """
+        matrix = np.asarray(matrix)
+        rows = np.arange(len(matrix))
+        diagonals = {k: matrix[rows, (rows + k) % len(matrix)] for k in range(len(matrix))}
+        self.encode_diagonals(diagonals, len(matrix), encoder, scaling_factor, crt_context,
+                              level)
+
+    @classmethod
+    def from_diagonals(cls, diagonals, matrix_len, encoder, scaling_factor, crt_context=None,
+                       level=None):
+        """Creates a LinearTransform from the nonzero diagonals of a matrix.
+
+        Args:
+            diagonals (dict): Diagonal k of the matrix for each nonzero diagonal,
+                where diagonal k of a matrix A is (A_0k, A_1(k+1), ...).
+            matrix_len (int): Size of the matrix, a power of two.
+            encoder (CKKSEncoder): Encoder for CKKS.
+            scaling_factor (float): Scaling factor to encode the diagonals with.
+            crt_context (CRTContext): Context in which to store the NTT form of the
+                diagonals, as for __init__.
+            level (int): Level l of the ciphertexts in full-RNS mode, or None.
+
+        Returns:
+            A LinearTransform for the matrix.
+        """
+        transform = cls.__new__(cls)
+        transform.encode_diagonals(diagonals, matrix_len, encoder, scaling_factor, crt_context,
+                                   level)
+        return transform
+
+    def encode_diagonals(self, diagonals, matrix_len, encoder, scaling_factor, crt_context,
+                         level):
+        """Splits the diagonals into baby steps and giant steps, and encodes them.
+
+        Args:
+            diagonals (dict): Nonzero diagonals of the matrix, indexed by rotation.
+            matrix_len (int): Size of the matrix, a power of two.
+            encoder (CKKSEncoder): Encoder for CKKS.
+            scaling_factor (float): Scaling factor to encode the diagonals with.
+            crt_context (CRTContext): Context for the NTT form of the diagonals, or None.
+            level (int): Level l of the ciphertexts in full-RNS mode, or None.
+        """
+        if level is not None:
+            assert crt_context, 'Full-RNS transforms need the extended context of the level'
+
+        self.matrix_len = matrix_len
+        self.scaling_factor = scaling_factor
+        self.level = level
+
+        rotations = sorted(set(k % matrix_len for k in diagonals))
+        self.baby_steps = self.choose_baby_steps(rotations, matrix_len)
+        self.baby_rotations = sorted(set(k % self.baby_steps for k in rotations))
+
+        self.diagonals = {}
+        for k, diagonal in diagonals.items():
+            k %= matrix_len
+            shift = k - k % self.baby_steps
+            diagonal = util.matrix_operations.rotate(list(diagonal), -shift)
+            plain = encoder.encode(diagonal, scaling_factor)
+            if level is not None:
+                encoded = RNSPolynomial.from_polynomial(plain.poly, crt_context).to_ntt()
+            else:
+                if crt_context and crt_context.vectorized:
+                    plain.poly.to_ntt(crt_context)
+                encoded = plain
+            self.diagonals.setdefault(shift, {})[k % self.baby_steps] = encoded
+
+    @staticmethod
+    def choose_baby_steps(rotations, matrix_len):
+        """Chooses the number of baby steps with the fewest rotations.
+
+        For a dense matrix, this gives two factors of matrix_len near its
+        square root.
+
+        Args:
+            rotations (list): Indices of the nonzero diagonals.
+            matrix_len (int): Size of the matrix, a power of two.
+
+        Returns:
+            A power of two n1, such that the numbers of distinct values of
+            k mod n1 and k - k mod n1 for the rotations k have the smallest sum.
+        """
+        best = None
+        baby_steps = 1
+        while baby_steps <= matrix_len:
+            cost = len(set(k % baby_steps for k in rotations)) \
+                + len(set(k // baby_steps for k in rotations))
+            if best is None or cost <= best[0]:
+                best = (cost, baby_steps)
+            baby_steps *= 2
+        return best[1]
+
+    def rotations(self):
+        """Returns the rotations that multiplying by the transform needs keys for.
+
+        Returns:
+            A sorted list of nonzero rotations.
+        """
+        return sorted((set(self.baby_rotations) | set(self.diagonals)) - {0})
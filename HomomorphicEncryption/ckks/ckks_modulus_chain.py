@@ -0,0 +1,413 @@
+"""A module to keep track of the chain of primes for full-RNS CKKS."""
+
+import math
+
+import numpy as np
+
+import util.modular_operations as modops
+import util.number_theory as nbtheory
+from util.base_converter import BaseConverter
+from util.crt import CRTContext
+from util.ntt import VectorizedNTTContext
+from util.rns_polynomial import RNSPolynomial, NTT_DOMAIN
+
+class CKKSModulusChain:
+
+    """An instance of a modulus chain for full-RNS CKKS.
+
+    A ciphertext at level l has coefficients modulo Q_l = q_0 * q_1 * ... * q_l,
+    stored as residues modulo each prime. The primes q_1, ..., q_L are close
+    to the scaling factor, so rescaling divides by the last prime q_l and
+    drops its residues. The base prime q_0 holds the final message. Key
+    switching works modulo Q_l * P, where P is the product of special primes.
+
+    For key switching, the primes of the chain are split into dnum digits of
+    consecutive primes. A polynomial is decomposed into its residues modulo
+    each digit, and each digit is extended to Q_l * P separately, so P only
+    has to be larger than the product of the primes in a digit. A larger dnum
+    means fewer special primes, but more switching keys and more NTTs per
+    key switch.
+
+    Attributes:
+        poly_degree (int): Degree d of polynomial that determines the
+            quotient ring R.
+        num_levels (int): Number of levels L, i.e. number of rescales.
+        dnum (int): Number of digits for key switching.
+        digit_size (int): Number of primes in each digit, except maybe the last.
+        primes (list): Primes q_0, q_1, ..., q_L of the chain.
+        special_primes (list): Special primes whose product is P.
+        modulus (int): Product Q_L of all primes of the chain.
+        special_modulus (int): Product P of the special primes.
+        level_contexts (list): CRTContext with primes q_0, ..., q_l for each level l.
+        extended_contexts (list): CRTContext with primes q_0, ..., q_l and the
+            special primes for each level l.
+        special_context (CRTContext): CRTContext with the special primes.
+        rescale_constants (list): For each level l > 0, a tuple of columns with
+            q_l^(-1) mod q_i, its Shoup companions, and floor(q_l / 2) mod q_i
+            for i < l.
+        special_inv (tuple): Columns with P^(-1) mod q_i and its Shoup companions.
+        converters (dict): Cache of BaseConverters between contexts of the chain.
+        digit_contexts (dict): Cache of the digit decompositions of each level.
+    """
+
+    def __init__(self, poly_degree, scaling_factor, num_levels, prime_size, dnum=1):
+        """Inits CKKSModulusChain by generating primes.
+
+        Args:
+            poly_degree (int): Degree d of polynomial of ring R.
+            scaling_factor (float): Scaling factor, which the primes q_1, ..., q_L
+                are close to.
+            num_levels (int): Number of levels L.
+            prime_size (int): Number of bits in the base prime and special primes.
+            dnum (int): Number of digits for key switching, between 1 and L + 1.
+        """
+        assert 0 < prime_size < modops.MAX_MODULUS_BITS, \
+            'Prime size must be smaller than ' + str(modops.MAX_MODULUS_BITS) + ' bits'
+        assert scaling_factor < (1 << prime_size), \
+            'Scaling factor must be smaller than the base prime'
+
+        assert 1 <= dnum <= num_levels + 1, 'Number of digits must be between 1 and L + 1'
+
+        self.poly_degree = poly_degree
+        self.num_levels = num_levels
+        self.dnum = dnum
+        self.digit_size = math.ceil((num_levels + 1) / dnum)
+
+        base_prime = self.generate_large_primes(1, prime_size, [])[0]
+        self.primes = [base_prime] + self.generate_primes_near(scaling_factor, num_levels,
+                                                               [base_prime])
+        self.modulus = 1
+        for prime in self.primes:
+            self.modulus *= prime
+
+        # P must be larger than the product of each digit, so that the error from key
+        # switching is small.
+        digit_bits = max(self.digit_modulus(j).bit_length() for j in range(dnum))
+        num_special_primes = math.ceil(digit_bits / prime_size)
+        self.special_primes = self.generate_large_primes(num_special_primes, prime_size,
+                                                         self.primes)
+        self.special_modulus = 1
+        for prime in self.special_primes:
+            self.special_modulus *= prime
+
+        self.generate_contexts()
+        self.precompute_chain()
+
+    def generate_large_primes(self, num_primes, prime_size, excluded):
+        """Generates primes that are 1 (mod 2d) and larger than 2^prime_size.
+
+        Args:
+            num_primes (int): Number of primes.
+            prime_size (int): Minimum number of bits in primes.
+            excluded (list): Primes that must not be generated again.
+
+        Returns:
+            A list of primes.
+        """
+        mod = 2 * self.poly_degree
+        primes = []
+        possible_prime = (1 << prime_size) + 1
+        while len(primes) < num_primes:
+            possible_prime += mod
+            if possible_prime not in excluded and nbtheory.is_prime(possible_prime):
+                primes.append(possible_prime)
+        return primes
+
+    def generate_primes_near(self, value, num_primes, excluded):
+        """Generates primes that are 1 (mod 2d) and close to the given value.
+
+        Primes are taken alternately from above and below the value, so that
+        the product of the first l primes stays close to value^l.
+
+        Args:
+            value (float): Value that the primes should be close to.
+            num_primes (int): Number of primes.
+            excluded (list): Primes that must not be generated again.
+
+        Returns:
+            A list of primes.
+        """
+        mod = 2 * self.poly_degree
+        # Candidates below the value start at the largest one that is at most the value.
+        above = (int(value) // mod) * mod + 1
+        below = above + mod
+        log_excess = 0.0
+        primes = []
+
+        while len(primes) < num_primes:
+            if log_excess <= 0:
+                above += mod
+                while above in excluded or not nbtheory.is_prime(above):
+                    above += mod
+                prime = above
+            else:
+                below -= mod
+                while below in excluded or not nbtheory.is_prime(below):
+                    below -= mod
+                prime = below
+            assert prime.bit_length() < modops.MAX_MODULUS_BITS, 'Scaling factor is too large'
+            primes.append(prime)
+            log_excess += math.log(prime) - math.log(value)
+
+        return primes
+
+    def generate_contexts(self):
+        """Generates the CRTContexts of all levels, which share NTTContexts.
+        """
+        ntts = [VectorizedNTTContext(self.poly_degree, prime) for prime in self.primes]
+        special_ntts = [VectorizedNTTContext(self.poly_degree, prime)
+                        for prime in self.special_primes]
+
+        self.level_contexts = []
+        self.extended_contexts = []
+        for level in range(self.num_levels + 1):
+            self.level_contexts.append(CRTContext.from_primes(
+                self.primes[:level + 1], self.poly_degree, ntts[:level + 1]))
+            self.extended_contexts.append(CRTContext.from_primes(
+                self.primes[:level + 1] + self.special_primes, self.poly_degree,
+                ntts[:level + 1] + special_ntts))
+        self.special_context = CRTContext.from_primes(self.special_primes, self.poly_degree,
+                                                      special_ntts)
+
+        self.converters = {}
+        self.digit_contexts = {}
+
+    def precompute_chain(self):
+        """Precomputes the constants for rescaling and key switching.
+        """
+        def column(values, primes):
+            shoup = [modops.shoup_precompute(val, p) for val, p in zip(values, primes)]
+            return (modops.to_word_array(values).reshape(-1, 1),
+                    modops.to_word_array(shoup).reshape(-1, 1))
+
+        self.rescale_constants = [None]
+        for level in range(1, self.num_levels + 1):
+            last = self.primes[level]
+            lower = self.primes[:level]
+            inv, inv_shoup = column([nbtheory.mod_inv(last % q, q) for q in lower], lower)
+            half = modops.to_word_array([(last // 2) % q for q in lower]).reshape(-1, 1)
+            self.rescale_constants.append((inv, inv_shoup, half))
+
+        self.special_inv = column([nbtheory.mod_inv(self.special_modulus % q, q)
+                                   for q in self.primes], self.primes)
+
+    def digit_range(self, digit):
+        """Returns the indices of the primes in a digit.
+
+        Args:
+            digit (int): Index j of the digit.
+
+        Returns:
+            A range of prime indices.
+        """
+        start = digit * self.digit_size
+        return range(start, min(start + self.digit_size, self.num_levels + 1))
+
+    def digit_modulus(self, digit):
+        """Returns the product of the primes in a digit.
+
+        Args:
+            digit (int): Index j of the digit.
+
+        Returns:
+            The product Q~_j of the primes in digit j.
+        """
+        modulus = 1
+        for i in self.digit_range(digit):
+            modulus *= self.primes[i]
+        return modulus
+
+    def digit_gadget(self, digit):
+        """Returns the CRT basis element of a digit.
+
+        Args:
+            digit (int): Index j of the digit.
+
+        Returns:
+            The integer g_j modulo Q_L which is 1 modulo the primes of digit j
+            and 0 modulo the other primes of the chain.
+        """
+        crt = self.level_contexts[self.num_levels]
+        gadget = sum(crt.crt_vals[i] * crt.crt_inv_vals[i] for i in self.digit_range(digit))
+        return gadget % self.modulus
+
+    def digits(self, level):
+        """Returns the digit decomposition of the given level.
+
+        At level l, only the primes q_0, ..., q_l of each digit are used, and
+        digits without such primes are left out. For each digit, the
+        residues modulo its primes are extended to the remaining primes of
+        Q_l * P. The contexts for this are created once and cached.
+
+        Args:
+            level (int): Level l.
+
+        Returns:
+            A list with a tuple (start, end, digit_context, complement_context)
+            for each digit, where the digit has the primes with indices from
+            start to end - 1, and the complement context has the other primes
+            of the extended context of level l.
+        """
+        if level not in self.digit_contexts:
+            ntts = self.extended_contexts[level].ntts
+            primes = self.extended_contexts[level].primes
+            digits = []
+            for start in range(0, level + 1, self.digit_size):
+                end = min(start + self.digit_size, level + 1)
+                if start == 0 and end == level + 1:
+                    digit_crt = self.level_contexts[level]
+                    complement_crt = self.special_context
+                else:
+                    digit_crt = CRTContext.from_primes(primes[start:end], self.poly_degree,
+                                                       ntts[start:end])
+                    complement_crt = CRTContext.from_primes(
+                        primes[:start] + primes[end:], self.poly_degree,
+                        ntts[:start] + ntts[end:])
+                digits.append((start, end, digit_crt, complement_crt))
+            self.digit_contexts[level] = digits
+        return self.digit_contexts[level]
+
+    def context(self, level):
+        """Returns the CRTContext of the given level.
+
+        Args:
+            level (int): Level l.
+
+        Returns:
+            The CRTContext with primes q_0, ..., q_l.
+        """
+        return self.level_contexts[level]
+
+    def extended_context(self, level):
+        """Returns the CRTContext of the given level with the special primes.
+
+        Args:
+            level (int): Level l.
+
+        Returns:
+            The CRTContext with primes q_0, ..., q_l and the special primes.
+        """
+        return self.extended_contexts[level]
+
+    def converter(self, source, target):
+        """Returns a BaseConverter between two contexts of the chain.
+
+        Converters are created once and cached.
+
+        Args:
+            source (CRTContext): Context of the source base.
+            target (CRTContext): Context of the target base.
+
+        Returns:
+            A BaseConverter from source to target.
+        """
+        key = (id(source), id(target))
+        if key not in self.converters:
+            self.converters[key] = BaseConverter(source, target)
+        return self.converters[key]
+
+    def rescale(self, poly, level):
+        """Divides a polynomial by the last prime of its level and rounds.
+
+        Computes round(c / q_l) modulo Q_(l-1) from the residues of c modulo
+        Q_l, without big integers. Only the last limb is transformed if the
+        polynomial is in NTT form.
+
+        Args:
+            poly (RNSPolynomial): Polynomial at level l.
+            level (int): Level l > 0.
+
+        Returns:
+            An RNSPolynomial at level l - 1 in the domain of poly.
+        """
+        assert level > 0, 'Cannot rescale at level 0'
+        crt = self.level_contexts[level]
+        new_crt = self.level_contexts[level - 1]
+        inv, inv_shoup, half = self.rescale_constants[level]
+        last_prime = np.uint64(self.primes[level])
+
+        last = poly.residues[level]
+        if poly.domain == NTT_DOMAIN:
+            last = crt.ntts[level].ftt_inv_array(last)
+
+        # With t = (c + floor(q_l / 2)) mod q_l, round(c / q_l) = (c - (t - floor(q_l / 2))) / q_l.
+        # The correction t - floor(q_l / 2) is computed in coefficient form, since adding
+        # floor(q_l / 2) to every coefficient is not the same as adding it to every NTT value.
+        shifted = modops.add_mod(last, last_prime // np.uint64(2), last_prime)
+        correction = modops.sub_mod(shifted % new_crt.prime_column, half, new_crt.prime_column)
+        if poly.domain == NTT_DOMAIN:
+            correction = new_crt.ntt_fwd(correction)
+
+        diff = modops.sub_mod(poly.residues[:level], correction, new_crt.prime_column)
+        new_residues = modops.mul_mod_shoup(diff, inv, inv_shoup, new_crt.prime_column)
+        return RNSPolynomial(self.poly_degree, new_residues, new_crt, poly.domain)
+
+    def mod_up(self, poly, level):
+        """Decomposes a polynomial at level l into digits, and extends each
+        digit to the primes of Q_l * P.
+
+        The residues of the digit primes are kept, so only the other primes
+        need to be converted and transformed.
+
+        Args:
+            poly (RNSPolynomial): Polynomial at level l.
+            level (int): Level l.
+
+        Returns:
+            A list with an RNSPolynomial in NTT form in the extended context of
+            level l for each digit j, which equals poly modulo the primes of
+            the digit, plus a small multiple of their product Q~_j.
+        """
+        coeff_residues = poly.to_coeff().residues
+        ntt_residues = poly.to_ntt().residues
+        extended = []
+
+        for start, end, digit_crt, complement_crt in self.digits(level):
+            converter = self.converter(digit_crt, complement_crt)
+            converted = complement_crt.ntt_fwd(converter.convert(coeff_residues[start:end]))
+            residues = np.concatenate((converted[:start], ntt_residues[start:end],
+                                       converted[start:]))
+            extended.append(RNSPolynomial(self.poly_degree, residues,
+                                          self.extended_contexts[level], NTT_DOMAIN))
+
+        return extended
+
+    def multiply_special_modulus(self, poly, level):
+        """Multiplies a polynomial at level l by P, as a polynomial modulo Q_l * P.
+
+        This is exact, and mod_down(multiply_special_modulus(poly)) is poly
+        again, so sums that end in mod_down can include such terms.
+
+        Args:
+            poly (RNSPolynomial): Polynomial at level l.
+            level (int): Level l.
+
+        Returns:
+            An RNSPolynomial in the domain of poly in the extended context of level l.
+        """
+        crt = self.extended_contexts[level]
+        residues = np.zeros((len(crt.primes), self.poly_degree), dtype=np.uint64)
+        residues[:level + 1] = poly.scalar_multiply(self.special_modulus).residues
+        return RNSPolynomial(self.poly_degree, residues, crt, poly.domain)
+
+    def mod_down(self, poly, level):
+        """Divides a polynomial modulo Q_l * P by P.
+
+        Args:
+            poly (RNSPolynomial): Polynomial in the extended context of level l.
+            level (int): Level l.
+
+        Returns:
+            An RNSPolynomial in NTT form at level l, which is poly / P up to a
+            small error.
+        """
+        crt = self.level_contexts[level]
+        residues = poly.to_ntt().residues
+        special = self.special_context.ntt_inv(residues[level + 1:])
+        converted = crt.ntt_fwd(self.converter(self.special_context, crt).convert(special))
+
+        inv, inv_shoup = self.special_inv
+        diff = modops.sub_mod(residues[:level + 1], converted, crt.prime_column)
+        new_residues = modops.mul_mod_shoup(diff, inv[:level + 1], inv_shoup[:level + 1],
+                                            crt.prime_column)
+        return RNSPolynomial(self.poly_degree, new_residues, crt, NTT_DOMAIN)
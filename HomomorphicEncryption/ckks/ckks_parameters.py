@@ -1,6 +1,8 @@
 """A module to keep track of parameters for the CKKS scheme."""
 
 import math
+from ckks.ckks_bootstrapping_context import EVAL_MOD_TAYLOR
+from ckks.ckks_modulus_chain import CKKSModulusChain
 from util.crt import CRTContext
 
 class CKKSParameters:
@@ -18,10 +20,27 @@ class CKKSParameters:
             bootstrapping.
         prime_size (int): Minimum number of bits in primes for RNS representation.
         crt_context (CRTContext): Context to manage RNS representation.
+        chain (CKKSModulusChain): Chain of primes for full-RNS CKKS, or None if
+            ciphertexts use a big-integer modulus.
+        dft_levels (int): Number of levels for each homomorphic DFT in bootstrapping,
+            or None to use dense matrices.
+        boot_cache_dir (str): Directory in which to cache the bootstrapping matrices,
+            or None.
+        eval_mod (str): Approximation of the modular reduction in bootstrapping,
+            EVAL_MOD_TAYLOR or EVAL_MOD_CHEBYSHEV.
+        eval_mod_range (int): Bound K on the multiple of the old modulus that
+            is removed by bootstrapping, or None to derive it from the Hamming weight.
+        eval_mod_degree (int): Degree of the Chebyshev approximation, or None to
+            choose the smallest sufficient degree.
+        double_angle_iterations (int): Number of double-angle steps after the
+            Chebyshev approximation.
+        lazy_rescale (bool): Whether evaluators defer rescaling after products.
     """
 
     def __init__(self, poly_degree, ciph_modulus, big_modulus, scaling_factor, taylor_iterations=6,
-                 prime_size=59):
+                 prime_size=59, num_levels=None, dnum=1, dft_levels=None,
+                 boot_cache_dir=None, eval_mod=EVAL_MOD_TAYLOR, eval_mod_range=None,
+                 eval_mod_degree=None, double_angle_iterations=3, lazy_rescale=False):
         """Inits Parameters with the given parameters.
 
         Args:
@@ -33,6 +52,34 @@ class CKKSParameters:
                 bootstrapping.
             prime_size (int): Minimum number of bits in primes for RNS representation. Can set to
                 None if using the RNS representation if undesirable.
+            num_levels (int): Number of levels for full-RNS CKKS. If it is given, the
+                ciphertext modulus is a chain of primes close to the scaling factor, and
+                ciph_modulus and big_modulus are replaced by the product of the chain and
+                the product of the special primes. Can be None for big-integer moduli.
+            dnum (int): Number of digits for key switching in full-RNS CKKS. Larger values
+                need fewer special primes, but more switching keys and more time per
+                key switch.
+            dft_levels (int): Number of levels for each of the homomorphic DFTs in
+                bootstrapping, which then use FFT stages merged into this many levels.
+                Fewer levels need more rotations per level. Can be None to use dense
+                matrices.
+            boot_cache_dir (str): Directory in which to save the bootstrapping matrices
+                for these parameters, so that later evaluators load them instead of
+                computing them again. Can be None to not cache them.
+            eval_mod (str): EVAL_MOD_TAYLOR to approximate the modular reduction in
+                bootstrapping with the exponential, or EVAL_MOD_CHEBYSHEV to use a
+                Chebyshev approximation of the cosine and double-angle steps, which
+                takes fewer levels and no conjugation.
+            eval_mod_range (int): Bound K such that the slots before the modular
+                reduction lie in [-K, K]. Can be None to derive it from the Hamming
+                weight of the secret key.
+            eval_mod_degree (int): Degree of the Chebyshev approximation. Can be None
+                to choose the smallest degree 2^k - 1 that is precise enough.
+            double_angle_iterations (int): Number of double-angle steps, each of which
+                takes one level and halves the range of the Chebyshev approximation.
+            lazy_rescale (bool): Whether multiply_rescale and multiply_plain_rescale of
+                CKKSEvaluator only mark their products as pending, so that sums of
+                products are rescaled once, before the next product or on demand.
         """
         self.poly_degree = poly_degree
         self.ciph_modulus = ciph_modulus
@@ -40,9 +87,23 @@ class CKKSParameters:
         self.scaling_factor = scaling_factor
         self.num_taylor_iterations = taylor_iterations
         self.hamming_weight = poly_degree // 4
+        self.dft_levels = dft_levels
+        self.boot_cache_dir = boot_cache_dir
+        self.eval_mod = eval_mod
+        self.eval_mod_range = eval_mod_range
+        self.eval_mod_degree = eval_mod_degree
+        self.double_angle_iterations = double_angle_iterations
+        self.lazy_rescale = lazy_rescale
         self.crt_context = None
+        self.chain = None
 
-        if prime_size:
+        if num_levels:
+            assert prime_size, 'Full-RNS CKKS requires a prime size'
+            self.chain = CKKSModulusChain(poly_degree, scaling_factor, num_levels, prime_size,
+                                          dnum)
+            self.ciph_modulus = self.chain.modulus
+            self.big_modulus = self.chain.special_modulus
+        elif prime_size:
             num_primes = 1 + int((1 + math.log(poly_degree, 2) + 4 * math.log(big_modulus, 2) \
              / prime_size))
             self.crt_context = CRTContext(num_primes, prime_size, poly_degree)
@@ -55,8 +116,14 @@ class CKKSParameters:
         print("\t Ciphertext modulus size: %d bits" % (int(math.log(self.ciph_modulus, 2))))
         print("\t Big ciphertext modulus size: %d bits" % (int(math.log(self.big_modulus, 2))))
         print("\t Scaling factor size: %d bits" % (int(math.log(self.scaling_factor, 2))))
-        print("\t Number of Taylor iterations: %d" % (self.num_taylor_iterations))
-        if self.crt_context:
+        if self.eval_mod == EVAL_MOD_TAYLOR:
+            print("\t Number of Taylor iterations: %d" % (self.num_taylor_iterations))
+        else:
+            print("\t Double-angle iterations: %d" % (self.double_angle_iterations))
+        if self.chain:
+            rns = "Full RNS with %d levels and %d key-switching digits" \
+                % (self.chain.num_levels, self.chain.dnum)
+        elif self.crt_context:
             rns = "Yes"
         else:
             rns = "No"
@@ -0,0 +1,280 @@
+"""A module to choose rotation keys for a workload in the CKKS scheme."""
+
+import math
+
+import numpy as np
+
+from ckks.ckks_linear_transform import LinearTransform
+
+class RotationComposer:
+
+    """Composes rotations from the rotations that have keys.
+
+    Since rotating by a and then by b rotates by a + b modulo the number of
+    slots, a rotation without a key can be computed as a sequence of
+    rotations with keys. The shortest sequences for all rotations are found
+    with one breadth-first search over the slots, where each step adds a
+    rotation with a key. With the keys for the powers of two and their
+    negatives, this gives the signed-binary decomposition of the rotation,
+    or a shorter one if there are more keys.
+
+    Attributes:
+        num_slots (int): Number of slots n.
+        keys (dict): Rotation with a key for each nonzero rotation modulo n.
+        distance (ndarray): Number of key switches for each rotation, or -1 if
+            the rotation cannot be composed.
+        last_step (ndarray): Last rotation modulo n of a shortest sequence for
+            each rotation.
+    """
+
+    def __init__(self, rotations, num_slots):
+        """Inits RotationComposer with the shortest sequences of rotations.
+
+        Args:
+            rotations (iterable): Rotations that have keys.
+            num_slots (int): Number of slots n.
+        """
+        self.num_slots = num_slots
+        self.keys = {}
+        for rotation in rotations:
+            if rotation % num_slots:
+                self.keys.setdefault(rotation % num_slots, rotation)
+
+        self.distance = np.full(num_slots, -1, dtype=np.int64)
+        self.last_step = np.zeros(num_slots, dtype=np.int64)
+        self.distance[0] = 0
+        steps = np.array(sorted(self.keys), dtype=np.int64)
+        frontier = np.zeros(1, dtype=np.int64)
+        num_steps = 0
+        while frontier.size and steps.size:
+            num_steps += 1
+            reached = ((frontier[:, None] + steps[None, :]) % num_slots).ravel()
+            last = np.broadcast_to(steps, (frontier.size, steps.size)).ravel()
+            unseen = self.distance[reached] < 0
+            frontier, first = np.unique(reached[unseen], return_index=True)
+            self.distance[frontier] = num_steps
+            self.last_step[frontier] = last[unseen][first]
+
+    def cost(self, rotation):
+        """Returns the number of key switches for a rotation.
+
+        Args:
+            rotation (int): Amount to rotate by.
+
+        Returns:
+            The length of the shortest sequence of rotations with keys, or
+            None if the rotation cannot be composed.
+        """
+        distance = int(self.distance[rotation % self.num_slots])
+        return distance if distance >= 0 else None
+
+    def decompose(self, rotation):
+        """Splits a rotation into rotations that have keys.
+
+        Args:
+            rotation (int): Amount to rotate by.
+
+        Returns:
+            A shortest list of rotations with keys whose sum is the rotation
+            modulo n, as they are indexed in the keys.
+        """
+        rotation %= self.num_slots
+        assert self.distance[rotation] >= 0, \
+            'Rotation %d cannot be composed from the available keys' % rotation
+        steps = []
+        while rotation:
+            step = int(self.last_step[rotation])
+            steps.append(self.keys[step])
+            rotation = (rotation - step) % self.num_slots
+        return steps
+
+
+class RotationKeyPlan:
+
+    """A set of rotation keys chosen for a workload.
+
+    Attributes:
+        rotations (list): Sorted rotations to generate keys for.
+        key_size (int): Estimated size of one rotation key in bytes.
+        memory (int): Estimated size of all the keys in bytes.
+        key_switches (int): Number of key switches for the rotations of the
+            workload with these keys.
+        direct_key_switches (int): Number of key switches with a key for every
+            rotation of the workload.
+        decompositions (dict): Rotations with keys for each rotation of the
+            workload without a key.
+    """
+
+    def __init__(self, rotations, key_size, key_switches, direct_key_switches, decompositions):
+        """Inits RotationKeyPlan.
+
+        Args:
+            rotations (list): Rotations to generate keys for.
+            key_size (int): Estimated size of one rotation key in bytes.
+            key_switches (int): Number of key switches of the workload.
+            direct_key_switches (int): Number of key switches with all keys.
+            decompositions (dict): Rotations with keys for each composed rotation.
+        """
+        self.rotations = sorted(rotations)
+        self.key_size = key_size
+        self.memory = key_size * len(self.rotations)
+        self.key_switches = key_switches
+        self.direct_key_switches = direct_key_switches
+        self.decompositions = decompositions
+
+    def __str__(self):
+        """Represents RotationKeyPlan as a string.
+
+        Returns:
+            A string which summarizes the plan.
+        """
+        return '%d rotation keys (%.1f MB), %d key switches (%d extra)' \
+            % (len(self.rotations), self.memory / 2 ** 20, self.key_switches,
+               self.key_switches - self.direct_key_switches)
+
+
+class RotationKeyPlanner:
+
+    """Chooses which rotation keys to generate for a workload.
+
+    The workload counts how often each rotation is used by the linear
+    transforms, rotations and rotate-and-sum operations that are added to
+    it. Without a memory budget, the plan has a key for each rotation. With
+    a budget, it starts from keys for the powers of two, and their negatives
+    if they fit, so that every rotation can be composed with
+    CKKSEvaluator.rotate_any, and then greedily adds keys for the rotations
+    that save the most key switches.
+
+    Attributes:
+        num_slots (int): Number of slots n.
+        key_size (int): Estimated size of one rotation key in bytes.
+        demand (dict): Number of uses of each nonzero rotation modulo n.
+    """
+
+    def __init__(self, params):
+        """Inits RotationKeyPlanner with an empty workload.
+
+        Args:
+            params (CKKSParameters): Parameters of the keys.
+        """
+        self.num_slots = params.poly_degree // 2
+        if params.chain:
+            num_primes = len(params.chain.primes) + len(params.chain.special_primes)
+            self.key_size = params.chain.dnum * 2 * params.poly_degree * num_primes * 8
+        else:
+            # Keys have two polynomials modulo big_modulus^2.
+            coeff_size = int(math.ceil(2 * math.log(params.big_modulus, 2) / 8))
+            self.key_size = 2 * params.poly_degree * coeff_size
+        self.demand = {}
+
+    def add_rotations(self, rotations, count=1):
+        """Adds rotations to the workload.
+
+        Args:
+            rotations (iterable): Amounts to rotate by.
+            count (int): Number of times each rotation is used.
+        """
+        for rotation in rotations:
+            rotation %= self.num_slots
+            if rotation:
+                self.demand[rotation] = self.demand.get(rotation, 0) + count
+
+    def add_transform(self, transform, count=1):
+        """Adds the baby-step and giant-step rotations of a linear transform.
+
+        Args:
+            transform (LinearTransform): Transform to multiply by.
+            count (int): Number of products with the transform.
+        """
+        self.add_rotations(transform.baby_rotations, count)
+        self.add_rotations(transform.diagonals, count)
+
+    def add_diagonals(self, diagonals, matrix_len, count=1):
+        """Adds the rotations of a matrix product, before its diagonals are encoded.
+
+        The baby steps are chosen as in LinearTransform.
+
+        Args:
+            diagonals (iterable): Indices of the nonzero diagonals.
+            matrix_len (int): Size of the matrix.
+            count (int): Number of products with the matrix.
+        """
+        rotations = sorted(set(k % matrix_len for k in diagonals))
+        baby_steps = LinearTransform.choose_baby_steps(rotations, matrix_len)
+        self.add_rotations(set(k % baby_steps for k in rotations), count)
+        self.add_rotations(set(k - k % baby_steps for k in rotations), count)
+
+    def add_rotate_and_sum(self, length, count=1):
+        """Adds the rotations that sum blocks of slots.
+
+        Args:
+            length (int): Number of consecutive slots to sum, a power of two.
+            count (int): Number of sums.
+        """
+        self.add_rotations([1 << i for i in range(int(math.log(length, 2)))], count)
+
+    def add_bootstrap(self, boot_context, count=1):
+        """Adds the rotations of the homomorphic DFTs of bootstrapping.
+
+        Each merged FFT stage is used once per bootstrap, while the dense
+        path uses six dense matrices.
+
+        Args:
+            boot_context (CKKSBootstrappingContext): Bootstrapping context.
+            count (int): Number of bootstraps.
+        """
+        if boot_context.dft_levels:
+            for diagonals in boot_context.fft_diagonals.values():
+                self.add_diagonals(diagonals, self.num_slots, count)
+        else:
+            self.add_diagonals(range(self.num_slots), self.num_slots, 6 * count)
+
+    def key_switches(self, composer):
+        """Counts the key switches of the workload with the keys of a composer.
+
+        Args:
+            composer (RotationComposer): Composer for a set of keys.
+
+        Returns:
+            The number of key switches.
+        """
+        return sum(count * composer.cost(rotation) for rotation, count in self.demand.items())
+
+    def plan(self, memory_budget=None):
+        """Chooses rotation keys for the workload.
+
+        Args:
+            memory_budget (int): Largest total size of the keys in bytes, or None
+                for a key for each rotation.
+
+        Returns:
+            A RotationKeyPlan.
+        """
+        direct_key_switches = sum(self.demand.values())
+        if memory_budget is None or len(self.demand) * self.key_size <= memory_budget:
+            return RotationKeyPlan(self.demand, self.key_size, direct_key_switches,
+                                   direct_key_switches, {})
+
+        max_keys = memory_budget // self.key_size
+        log_slots = int(math.log(self.num_slots, 2))
+        assert max_keys >= log_slots, \
+            'Memory budget must fit at least %d rotation keys of %d bytes' \
+            % (log_slots, self.key_size)
+
+        rotations = set(1 << i for i in range(log_slots))
+        if max_keys >= 2 * log_slots - 1:
+            rotations |= set(self.num_slots - (1 << i) for i in range(log_slots - 1))
+
+        composer = RotationComposer(rotations, self.num_slots)
+        while len(rotations) < max_keys:
+            savings = {rotation: count * (composer.cost(rotation) - 1)
+                       for rotation, count in self.demand.items() if rotation not in rotations}
+            if not savings or max(savings.values()) <= 0:
+                break
+            rotations.add(max(savings, key=savings.get))
+            composer = RotationComposer(rotations, self.num_slots)
+
+        decompositions = {rotation: composer.decompose(rotation)
+                          for rotation in self.demand if rotation not in rotations}
+        return RotationKeyPlan(rotations, self.key_size, self.key_switches(composer),
+                               direct_key_switches, decompositions)
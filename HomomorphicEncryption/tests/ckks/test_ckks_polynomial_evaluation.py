@@ -0,0 +1,65 @@
+"""Tests polynomial evaluation on full-RNS ciphertexts.
+
+Evaluates polynomials of every degree up to 2^5 in the power and Chebyshev
+bases, including degrees other than 2^k - 1, whose remainders are added to
+products of giant steps at drifted scaling factors.
+To run, use
+python3 -m pytest tests/ckks/test_ckks_polynomial_evaluation.py"""
+
+import unittest
+
+import numpy as np
+
+from ckks.ckks_decryptor import CKKSDecryptor
+from ckks.ckks_encoder import CKKSEncoder
+from ckks.ckks_encryptor import CKKSEncryptor
+from ckks.ckks_evaluator import CKKSEvaluator
+from ckks.ckks_key_generator import CKKSKeyGenerator
+from ckks.ckks_parameters import CKKSParameters
+from util.polynomial_basis import POWER_BASIS, CHEBYSHEV_BASIS
+
+DEGREE = 16
+NUM_LEVELS = 10
+MAX_POLY_DEGREE = 32
+MAX_ERROR = 1e-6
+
+
+class TestPolynomialEvaluation(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.params = CKKSParameters(poly_degree=DEGREE, ciph_modulus=None, big_modulus=None,
+                                    scaling_factor=1 << 40, num_levels=NUM_LEVELS)
+        key_generator = CKKSKeyGenerator(cls.params)
+        cls.relin_key = key_generator.relin_key
+        cls.encoder = CKKSEncoder(cls.params)
+        cls.encryptor = CKKSEncryptor(cls.params, key_generator.public_key,
+                                      key_generator.secret_key)
+        cls.decryptor = CKKSDecryptor(cls.params, key_generator.secret_key)
+        cls.evaluator = CKKSEvaluator(cls.params)
+
+    def run_test_evaluate(self, basis, evaluate):
+        rng = np.random.default_rng(1)
+        values = rng.uniform(-1, 1, DEGREE // 2)
+        ciph = self.encryptor.encrypt(self.encoder.encode(values.tolist(),
+                                                          self.params.scaling_factor))
+        for poly_degree in range(1, MAX_POLY_DEGREE + 1):
+            coeffs = rng.uniform(-1, 1, poly_degree + 1)
+            result = self.evaluator.evaluate_polynomial(ciph, coeffs.tolist(), self.relin_key,
+                                                        basis)
+            decoded = np.array(self.encoder.decode(self.decryptor.decrypt(result))).real
+            error = np.abs(decoded - evaluate(values, coeffs)).max()
+            self.assertLess(error, MAX_ERROR, 'Degree %d' % poly_degree)
+            # The depth is at most m + 1 for a degree below 2^m.
+            self.assertGreaterEqual(result.level, NUM_LEVELS - poly_degree.bit_length() - 1,
+                                    'Degree %d' % poly_degree)
+
+    def test_evaluate_power_basis(self):
+        self.run_test_evaluate(POWER_BASIS, np.polynomial.polynomial.polyval)
+
+    def test_evaluate_chebyshev_basis(self):
+        self.run_test_evaluate(CHEBYSHEV_BASIS, np.polynomial.chebyshev.chebval)
+
+
+if __name__ == '__main__':
+    res = unittest.main(verbosity=3, exit=False)
@@ -0,0 +1,73 @@
+"""Compares the list-based NTT with the vectorized NTT.
+
+Runs the forward and inverse FTT for polynomial degrees 2^10 through 2^15.
+To run, use
+python3 tests/util/ntt_performance.py"""
+
+import random
+import time
+import unittest
+import colorama
+from colorama import Fore, Style
+
+from util.crt import CRTContext
+from util.ntt import NTTContext, VectorizedNTTContext
+from util.polynomial import Polynomial
+
+PRIME_SIZE = 59
+LOG_DEGREES = range(10, 16)
+
+
+class TestNTTPerformance(unittest.TestCase):
+
+    colorama.init(autoreset=True)
+
+    def time_transforms(self, ntt, coeffs):
+        start_time = time.perf_counter()
+        transformed = ntt.ftt_fwd(coeffs)
+        fwd_time = time.perf_counter() - start_time
+
+        start_time = time.perf_counter()
+        inverse = ntt.ftt_inv(transformed)
+        inv_time = time.perf_counter() - start_time
+
+        self.assertEqual(inverse, coeffs)
+        return fwd_time, inv_time, transformed
+
+    def test_ntt_time(self):
+        for log_degree in LOG_DEGREES:
+            degree = 1 << log_degree
+            crt = CRTContext(1, PRIME_SIZE, degree)
+            prime = crt.primes[0]
+            vectorized = crt.ntts[0]
+            self.assertIsInstance(vectorized, VectorizedNTTContext)
+            scalar = NTTContext(degree, prime, vectorized.roots_of_unity[1])
+            coeffs = [random.randrange(0, prime) for _ in range(degree)]
+
+            scalar_fwd, scalar_inv, scalar_out = self.time_transforms(scalar, coeffs)
+            vector_fwd, vector_inv, vector_out = self.time_transforms(vectorized, coeffs)
+            self.assertEqual(scalar_out, vector_out)
+
+            print(Fore.BLUE + Style.BRIGHT + "Polynomial degree: 2^%d" % log_degree)
+            print(Fore.RED + Style.BRIGHT + "\t Forward FTT: %f s list, %f s vectorized (%.1fx)"
+                  % (scalar_fwd, vector_fwd, scalar_fwd / vector_fwd))
+            print(Fore.RED + Style.BRIGHT + "\t Inverse FTT: %f s list, %f s vectorized (%.1fx)"
+                  % (scalar_inv, vector_inv, scalar_inv / vector_inv))
+
+    def test_multiply_crt_time(self):
+        for log_degree in LOG_DEGREES:
+            degree = 1 << log_degree
+            crt = CRTContext(4, PRIME_SIZE, degree)
+            poly1 = Polynomial(degree, [random.randrange(-2 ** 100, 2 ** 100) for _ in range(degree)])
+            poly2 = Polynomial(degree, [random.randrange(-2 ** 100, 2 ** 100) for _ in range(degree)])
+
+            start_time = time.perf_counter()
+            poly1.multiply_crt(poly2, crt)
+            total_time = time.perf_counter() - start_time
+
+            print(Fore.BLUE + Style.BRIGHT + "Polynomial degree: 2^%d" % log_degree)
+            print(Fore.RED + Style.BRIGHT + "\t multiply_crt with 4 primes: %f s" % total_time)
+
+
+if __name__ == '__main__':
+    res = unittest.main(verbosity=3, exit=False)
@@ -0,0 +1,72 @@
+"""A module to convert residues between two RNS bases without big integers.
+"""
+import numpy as np
+
+import util.modular_operations as modops
+
+
+class BaseConverter:
+
+    """An instance of fast base conversion between two sets of primes.
+
+    For a value x with residues x_i modulo the primes a_i of the source base
+    A, the conversion computes
+
+        sum_i [x_i * (A/a_i)^(-1)]_(a_i) * (A/a_i)  (mod b_j)
+
+    for each prime b_j of the target base. This equals x + u * A for some
+    integer 0 <= u < len(A), so the conversion is exact up to a small
+    multiple of A, which the schemes that use it tolerate.
+
+    Attributes:
+        source (CRTContext): Context of the source base A.
+        target (CRTContext): Context of the target base B.
+        hat_inv (ndarray): Values (A/a_i)^(-1) mod a_i as a column.
+        hat_inv_shoup (ndarray): Shoup companions of hat_inv.
+        hat_table (ndarray): Matrix whose entry (j, i) is (A/a_i) mod b_j.
+        hat_table_shoup (ndarray): Shoup companions of hat_table.
+    """
+
+    def __init__(self, source, target):
+        """Inits BaseConverter with precomputed constants.
+
+        Args:
+            source (CRTContext): Context of the source base.
+            target (CRTContext): Context of the target base.
+        """
+        assert source.prime_column is not None and target.prime_column is not None, \
+            'Base conversion requires word-size primes'
+        self.source = source
+        self.target = target
+
+        self.hat_inv, self.hat_inv_shoup = source.crt_inv_column
+        table = [[source.crt_vals[i] % b for i in range(len(source.primes))]
+                 for b in target.primes]
+        table_shoup = [[modops.shoup_precompute(val, target.primes[j]) for val in row]
+                       for j, row in enumerate(table)]
+        self.hat_table = modops.to_word_array(table)
+        self.hat_table_shoup = modops.to_word_array(table_shoup)
+
+    def convert(self, residues):
+        """Converts residues in coefficient form to the target base.
+
+        Args:
+            residues (ndarray): Array with one row of residues for each prime
+                of the source base.
+
+        Returns:
+            Array with one row of residues for each prime of the target base.
+        """
+        scaled = modops.mul_mod_shoup(residues, self.hat_inv, self.hat_inv_shoup,
+                                      self.source.prime_column)
+        target_primes = self.target.prime_column
+        result = np.zeros((len(self.target.primes), residues.shape[-1]), dtype=np.uint64)
+
+        for i in range(len(self.source.primes)):
+            # Shoup multiplication is correct for any word-size input, so the residues
+            # modulo a_i do not have to be reduced modulo b_j first.
+            term = modops.mul_mod_shoup(scaled[i], self.hat_table[:, i:i + 1],
+                                        self.hat_table_shoup[:, i:i + 1], target_primes)
+            result = modops.add_mod(result, term, target_primes)
+
+        return result
@@ -1,6 +1,5 @@
 """A module to perform bit operations.
 """
-from math import log
 
 def reverse_bits(value, width):
     """Reverses bits of an integer.
@@ -19,6 +18,23 @@ def reverse_bits(value, width):
     binary_val = '{:0{width}b}'.format(value, width=width)
     return int(binary_val[::-1], 2)
 
+def bit_reverse_indices(length):
+    """Computes the bit-reversal permutation of the given length.
+
+    Builds the permutation by doubling, so that no index is reversed bit by bit.
+    For example, the permutation of length 8 is [0, 4, 2, 6, 1, 5, 3, 7].
+
+    Args:
+        length (int): Length of permutation. Must be a power of two.
+
+    Returns:
+        A list whose ith entry is the bits of i reversed.
+    """
+    indices = [0]
+    while len(indices) < length:
+        indices = [2 * i for i in indices] + [2 * i + 1 for i in indices]
+    return indices
+
 def bit_reverse_vec(values):
     """Reverses list by reversing the bits of the indices.
 
@@ -33,7 +49,48 @@ def bit_reverse_vec(values):
     Returns:
         The reversed list based on indices.
     """
-    result = [0] * len(values)
-    for i in range(len(values)):
-        result[i] = values[reverse_bits(i, int(log(len(values), 2)))]
-    return result
\ No newline at end of file
+    return [values[i] for i in bit_reverse_indices(len(values))]
+
+def pack_ints(values, width):
+    """Packs integers into one large integer.
+
+    Computes sum(values[i] * 2^(8 * width * i)), i.e. evaluates the polynomial
+    with coefficients values at 2^(8 * width). The work is linear in the size
+    of the result, since the digits are joined as bytes.
+
+    Args:
+        values (list): Integers, each of absolute value less than 2^(8 * width).
+            They may be negative.
+        width (int): Number of bytes for each value.
+
+    Returns:
+        The packed int value.
+    """
+    positive = b''.join((c if c > 0 else 0).to_bytes(width, 'little') for c in values)
+    packed = int.from_bytes(positive, 'little')
+    if any(c < 0 for c in values):
+        negative = b''.join((-c if c < 0 else 0).to_bytes(width, 'little') for c in values)
+        packed -= int.from_bytes(negative, 'little')
+    return packed
+
+def unpack_ints(value, width, count):
+    """Unpacks a large integer into signed integers.
+
+    Inverts pack_ints: finds the values of absolute value less than
+    2^(8 * width - 1) such that value = sum(values[i] * 2^(8 * width * i)).
+
+    Args:
+        value (int): Packed integer.
+        width (int): Number of bytes for each value.
+        count (int): Number of values.
+
+    Returns:
+        A list of count integers.
+    """
+    # Shift each digit by half its range, so that all digits are nonnegative and can be
+    # read off the bytes directly.
+    half = 1 << (8 * width - 1)
+    bias = int.from_bytes((b'\x00' * (width - 1) + b'\x80') * count, 'little')
+    digits = (value + bias).to_bytes(width * count, 'little')
+    return [int.from_bytes(digits[i:i + width], 'little') - half
+            for i in range(0, width * count, width)]
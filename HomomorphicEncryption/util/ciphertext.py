@@ -1,20 +1,32 @@
 """A module to keep track of a ciphertext."""
+import sys
+
+from util.rns_polynomial import COEFF_DOMAIN, NTT_DOMAIN
 
 class Ciphertext:
 
     """An instance of a ciphertext.
 
     This is a wrapper class for a ciphertext, which consists
-    of two polynomial.
+    of two polynomial, or three before a product is relinearized.
 
     Attributes:
         c0 (Polynomial): First element of ciphertext.
         c1 (Polynomial): Second element of ciphertext.
         scaling_factor (float): Scaling factor.
         modulus (int): Ciphertext modulus.
+        level (int): Level in the modulus chain for full-RNS CKKS, where c0 and
+            c1 are RNSPolynomials. It is None otherwise.
+        c2 (Polynomial): Third element of a product that has not been relinearized,
+            which decrypts with the square of the secret key, or None.
+        pending_scale (float): Factor that the ciphertext is still to be rescaled by
+            in lazy-rescale mode, or None.
     """
 
-    def __init__(self, c0, c1, scaling_factor=None, modulus=None):
+    __slots__ = ('c0', 'c1', 'scaling_factor', 'modulus', 'level', 'c2', 'pending_scale')
+
+    def __init__(self, c0, c1, scaling_factor=None, modulus=None, level=None, c2=None,
+                 pending_scale=None):
         """Sets ciphertext to given polynomials.
 
         Args:
@@ -22,11 +34,45 @@ class Ciphertext:
             c1 (Polynomial): Second element of ciphertext.
             scaling_factor (float): Scaling factor. Can be None for BFV.
             modulus (int): Ciphertext modulus. Can be None for BFV.
+            level (int): Level in the modulus chain. Can be None if the ciphertext
+                is not in full-RNS form.
+            c2 (Polynomial): Third element of ciphertext. Can be None if the
+                ciphertext has only two elements.
+            pending_scale (float): Factor to rescale by later. Can be None if the
+                ciphertext is not waiting to be rescaled.
         """
         self.c0 = c0
         self.c1 = c1
         self.scaling_factor = scaling_factor
         self.modulus = modulus
+        self.level = level
+        self.c2 = c2
+        self.pending_scale = pending_scale
+
+    @property
+    def domain(self):
+        """Returns the domain in which the ciphertext is stored.
+
+        Returns:
+            NTT_DOMAIN if some component is only stored in NTT form, and
+            COEFF_DOMAIN otherwise. Components in NTT form are transformed
+            back when their coefficients are needed, e.g. for rescaling or
+            decryption.
+        """
+        if any(c.domain == NTT_DOMAIN for c in (self.c0, self.c1, self.c2) if c is not None):
+            return NTT_DOMAIN
+        return COEFF_DOMAIN
+
+    def memory_size(self):
+        """Returns the number of bytes used by the ciphertext.
+
+        Returns:
+            The size of the object and its polynomials.
+        """
+        size = sys.getsizeof(self) + self.c0.memory_size() + self.c1.memory_size()
+        if self.c2 is not None:
+            size += self.c2.memory_size()
+        return size
 
     def __str__(self):
         """Represents Ciphertext as a string.
@@ -34,4 +80,7 @@ class Ciphertext:
         Returns:
             A string which represents the Ciphertext.
         """
-        return 'c0: ' + str(self.c0) + '\n + c1: ' + str(self.c1)
+        string = 'c0: ' + str(self.c0) + '\n + c1: ' + str(self.c1)
+        if self.c2 is not None:
+            string += '\n + c2: ' + str(self.c2)
+        return string
@@ -1,8 +1,17 @@
 """A module to split a large number into its prime factors using the Chinese Remainder Theorem (CRT).
 """
 
+import numpy as np
+
+import util.modular_operations as modops
 import util.number_theory as nbtheory
-from util.ntt import NTTContext
+from util.ntt import NTTContext, VectorizedNTTContext, ntt_merged_fwd, ntt_merged_inv
+
+# Bit width of the limbs used to combine residues into big integers. Products of two
+# limbs summed over a few hundred primes stay below 2^53, so they are exact in floating point.
+LIMB_BITS = 16
+LIMB_MASK = np.uint64((1 << LIMB_BITS) - 1)
+LIMBS_PER_WORD = 64 // LIMB_BITS
 
 class CRTContext:
 
@@ -14,20 +23,74 @@ class CRTContext:
         poly_degree (int): Polynomial ring degree.
         primes (list): List of primes.
         modulus (int): Large modulus, product of all primes.
+        ntts (list): NTTContext for each prime.
+        vectorized (bool): Whether all ntts are VectorizedNTTContexts, so that the
+            residues of all primes can be transformed at once.
+        roots, roots_inv (ndarray): Twiddle tables of all ntts stacked into
+            (L x N) arrays, if vectorized.
+        degree_inv, scaled_root_inv (tuple): Scaling constants of the inverse
+            transforms of all ntts and their Shoup companions as (L x 1) arrays,
+            if vectorized.
+        prime_column (ndarray): Primes as an (L x 1) array of unsigned 64-bit
+            integers, which broadcasts against (L x N) residue arrays.
+            It is None if some prime is too large for word-size arithmetic.
+        barrett_ratios (ndarray): Barrett ratios of the primes as an (L x 1) array.
+        barrett_shifts (ndarray): Bit lengths of the primes as an (L x 1) array.
+        crt_inv_column (tuple): The crt_inv_vals and their Shoup companions as
+            (L x 1) arrays.
+        prime_inv_floats (ndarray): Inverses of the primes as an (L x 1) array
+            of floats.
+        crt_val_limbs (ndarray): Matrix that maps the 16-bit limbs of residues
+            y_i to the 16-bit limbs of sum(y_i * crt_vals[i]).
     """
 
-    def __init__(self, num_primes, prime_size, poly_degree):
+    def __init__(self, num_primes, prime_size, poly_degree, vectorized=True):
         """Inits CRTContext with a list of primes.
 
         Args:
             num_primes (int): Number of primes.
             prime_size (int): Minimum number of bits in primes.
             poly_degree (int): Polynomial degree of ring.
+            vectorized (bool): Whether to use vectorized NTTs on word-size residues.
+                This is ignored if the primes are too large for word-size arithmetic.
         """
         self.poly_degree = poly_degree
         self.generate_primes(num_primes, prime_size, mod=2*poly_degree)
-        self.generate_ntt_contexts()
+        self.generate_ntt_contexts(vectorized)
+        self.precompute_modulus()
+
+    @classmethod
+    def from_primes(cls, primes, poly_degree, ntts=None, vectorized=True):
+        """Creates a CRTContext for the given primes.
+
+        Args:
+            primes (list): List of primes, which must be 1 (mod 2 * poly_degree).
+            poly_degree (int): Polynomial degree of ring.
+            ntts (list): NTTContext for each prime. Contexts that share primes can
+                share their NTTContexts. If it is None, new ones are generated.
+            vectorized (bool): Whether to use vectorized NTTs on word-size residues.
+                This is ignored if ntts are given.
+
+        Returns:
+            A CRTContext with the given primes.
+        """
+        crt = cls.__new__(cls)
+        crt.poly_degree = poly_degree
+        crt.primes = list(primes)
+        if ntts is None:
+            crt.generate_ntt_contexts(vectorized)
+        else:
+            assert len(ntts) == len(crt.primes)
+            crt.ntts = list(ntts)
+            crt.vectorized = all(isinstance(ntt, VectorizedNTTContext) for ntt in crt.ntts)
+            if crt.vectorized:
+                crt.precompute_stacked_ntts()
+        crt.precompute_modulus()
+        return crt
 
+    def precompute_modulus(self):
+        """Computes the product of all primes and the constants for CRT.
+        """
         self.modulus = 1
         for prime in self.primes:
             self.modulus *= prime
@@ -50,14 +113,39 @@ class CRTContext:
                 possible_prime += mod
             self.primes[i] = possible_prime
 
-    def generate_ntt_contexts(self):
+    def generate_ntt_contexts(self, vectorized=True):
         """Generates NTTContexts for each primes.
+
+        Args:
+            vectorized (bool): Whether to use VectorizedNTTContexts, if all primes
+                are small enough.
         """
+        self.vectorized = vectorized and max(self.primes) < (1 << modops.MAX_MODULUS_BITS)
         self.ntts = []
         for prime in self.primes:
-            ntt = NTTContext(self.poly_degree, prime)
+            if self.vectorized:
+                ntt = VectorizedNTTContext(self.poly_degree, prime)
+            else:
+                ntt = NTTContext(self.poly_degree, prime)
             self.ntts.append(ntt)
 
+        if self.vectorized:
+            self.precompute_stacked_ntts()
+
+    def precompute_stacked_ntts(self):
+        """Stacks the twiddle tables of all primes, so that an (L x N) array of
+        residues can be transformed at once.
+        """
+        def stack_column(tables):
+            return tuple(np.stack(table) for table in zip(*tables))
+
+        self.roots = np.stack([ntt.roots for ntt in self.ntts])
+        self.roots_shoup = np.stack([ntt.roots_shoup for ntt in self.ntts])
+        self.roots_inv = np.stack([ntt.roots_inv for ntt in self.ntts])
+        self.roots_inv_shoup = np.stack([ntt.roots_inv_shoup for ntt in self.ntts])
+        self.degree_inv = stack_column([ntt.degree_inv_word for ntt in self.ntts])
+        self.scaled_root_inv = stack_column([ntt.scaled_root_inv_word for ntt in self.ntts])
+
     def precompute_crt(self):
         """Perform precomputations required for switching representations.
         """
@@ -68,6 +156,49 @@ class CRTContext:
             self.crt_vals[i] = self.modulus // self.primes[i]
             self.crt_inv_vals[i] = nbtheory.mod_inv(self.crt_vals[i], self.primes[i])
 
+        # Precompute word-size constants for the RNS representation.
+        self.prime_column = None
+        self.barrett_ratios = None
+        self.barrett_shifts = None
+        if max(self.primes) >= (1 << modops.MAX_MODULUS_BITS):
+            return
+
+        barrett = [modops.barrett_precompute(prime) for prime in self.primes]
+        self.prime_column = modops.to_word_array(self.primes).reshape(num_primes, 1)
+        self.barrett_ratios = modops.to_word_array([b[0] for b in barrett]).reshape(num_primes, 1)
+        self.barrett_shifts = modops.to_word_array([b[1] for b in barrett]).reshape(num_primes, 1)
+
+        crt_inv_shoup = [modops.shoup_precompute(self.crt_inv_vals[i], self.primes[i])
+                         for i in range(num_primes)]
+        self.crt_inv_column = (modops.to_word_array(self.crt_inv_vals).reshape(num_primes, 1),
+                               modops.to_word_array(crt_inv_shoup).reshape(num_primes, 1))
+        self.prime_inv_floats = np.array([1 / prime for prime in self.primes]).reshape(num_primes, 1)
+
+        # Row u, column (LIMBS_PER_WORD * i + t) holds limb (u - t) of crt_vals[i], so that
+        # multiplying by the limbs of y_i gives the limbs of sum(y_i * crt_vals[i]) before carrying.
+        val_limbs = [self.to_limbs(val) for val in self.crt_vals]
+        num_limbs = max(len(limbs) for limbs in val_limbs) + LIMBS_PER_WORD
+        self.crt_val_limbs = np.zeros((num_limbs, LIMBS_PER_WORD * num_primes))
+        for i, limbs in enumerate(val_limbs):
+            for t in range(LIMBS_PER_WORD):
+                self.crt_val_limbs[t:t + len(limbs), LIMBS_PER_WORD * i + t] = limbs
+
+    @staticmethod
+    def to_limbs(value):
+        """Splits a nonnegative integer into 16-bit limbs.
+
+        Args:
+            value (int): Integer to split.
+
+        Returns:
+            A list of limbs, least significant first.
+        """
+        limbs = []
+        while value:
+            limbs.append(value & ((1 << LIMB_BITS) - 1))
+            value >>= LIMB_BITS
+        return limbs
+
     def crt(self, value):
         """Transform value to CRT representation.
 
@@ -92,4 +223,151 @@ class CRTContext:
             regular_rep_val += intermed_val
             regular_rep_val %= self.modulus
 
-        return regular_rep_val
\ No newline at end of file
+        return regular_rep_val
+
+    def crt_poly(self, coeffs):
+        """Transforms all coefficients of a polynomial to CRT representation.
+
+        Args:
+            coeffs (list): List of integer coefficients, which may be negative.
+
+        Returns:
+            An (L x N) array of unsigned 64-bit integers, where row i holds the
+            coefficients modulo the ith prime.
+        """
+        big_coeffs = np.array([int(c) for c in coeffs], dtype=object)
+        residues = np.empty((len(self.primes), len(coeffs)), dtype=np.uint64)
+        for i, prime in enumerate(self.primes):
+            residues[i] = (big_coeffs % prime).astype(np.uint64)
+        return residues
+
+    def reconstruct_poly(self, residues, centered=True):
+        """Reconstructs all coefficients of a polynomial from the CRT representation.
+
+        For word-size primes, the whole polynomial is reconstructed at once. With
+        y_i = x_i * crt_inv_vals[i] (mod p_i), the value is X = sum(y_i * crt_vals[i])
+        reduced modulo Q, and X / Q = sum(y_i / p_i), so the multiple of Q to
+        subtract is found in floating point. The sum X is computed exactly as a
+        product of matrices of 16-bit limbs, and the limbs are converted to
+        integers by their bytes.
+
+        Args:
+            residues (ndarray): (L x N) array or list of lists, where row i holds
+                the coefficients modulo the ith prime.
+            centered (bool): Whether to return coefficients in (-Q/2, Q/2] or in [0, Q).
+
+        Returns:
+            A list of coefficients in the range (-Q/2, Q/2] or [0, Q), where Q is the
+            product of all primes.
+        """
+        assert len(residues) == len(self.primes)
+        if self.prime_column is None:
+            return self.reconstruct_poly_big(residues, centered)
+
+        residues = modops.to_word_array(residues)
+        num_coeffs = residues.shape[1]
+        inv_vals, inv_vals_shoup = self.crt_inv_column
+        scaled = modops.mul_mod_shoup(residues, inv_vals, inv_vals_shoup, self.prime_column)
+
+        # Compute the multiple of Q in sum(y_i * crt_vals[i]).
+        quotient = (scaled * self.prime_inv_floats).sum(axis=0)
+        multiples = np.rint(quotient) if centered else np.floor(quotient)
+
+        # Multiply limbs of y_i with the limbs of crt_vals[i], and carry.
+        scaled_limbs = np.empty((LIMBS_PER_WORD * len(self.primes), num_coeffs))
+        for t in range(LIMBS_PER_WORD):
+            scaled_limbs[t::LIMBS_PER_WORD] = (scaled >> np.uint64(LIMB_BITS * t)) & LIMB_MASK
+        limb_sums = (self.crt_val_limbs @ scaled_limbs).astype(np.uint64)
+
+        num_limbs = len(limb_sums) + LIMBS_PER_WORD
+        limbs = np.zeros((num_coeffs, num_limbs), dtype='<u2')
+        carry = np.zeros(num_coeffs, dtype=np.uint64)
+        for u in range(num_limbs):
+            if u < len(limb_sums):
+                carry += limb_sums[u]
+            limbs[:, u] = carry & LIMB_MASK
+            carry >>= np.uint64(LIMB_BITS)
+
+        data = limbs.tobytes()
+        width = 2 * num_limbs
+        sums = [int.from_bytes(data[i:i + width], 'little')
+                for i in range(0, width * num_coeffs, width)]
+
+        # The floating-point multiple can be off by one at the boundaries of the range.
+        half_modulus = self.modulus // 2
+        low, high = (-half_modulus, half_modulus) if centered else (0, self.modulus - 1)
+        coeffs = [0] * num_coeffs
+        for i, (total, multiple) in enumerate(zip(sums, multiples.tolist())):
+            c = total - int(multiple) * self.modulus
+            if c > high:
+                c -= self.modulus
+            elif c < low:
+                c += self.modulus
+            coeffs[i] = c
+        return coeffs
+
+    def reconstruct_poly_big(self, residues, centered=True):
+        """Reconstructs all coefficients of a polynomial with big-integer arithmetic.
+
+        This works for primes of any size.
+
+        Args:
+            residues (ndarray): (L x N) array or list of lists, where row i holds
+                the coefficients modulo the ith prime.
+            centered (bool): Whether to return coefficients in (-Q/2, Q/2] or in [0, Q).
+
+        Returns:
+            A list of coefficients in the range (-Q/2, Q/2] or [0, Q), where Q is the
+            product of all primes.
+        """
+        half_modulus = self.modulus // 2
+        big_values = np.zeros(len(residues[0]), dtype=object)
+
+        for i, prime in enumerate(self.primes):
+            intermed_vals = (np.asarray(residues[i]).astype(object) * self.crt_inv_vals[i]) % prime
+            big_values += intermed_vals * self.crt_vals[i]
+
+        big_values %= self.modulus
+        if not centered:
+            return [int(c) for c in big_values]
+        return [int(c) - self.modulus if c > half_modulus else int(c) for c in big_values]
+
+    def ntt_fwd(self, residues):
+        """Runs forward FTT on the residues of all primes at once.
+
+        Args:
+            residues (ndarray): (L x N) array, where row i holds residues modulo
+                the ith prime.
+
+        Returns:
+            (L x N) array of transformed residues in bit-reversed order.
+        """
+        assert self.vectorized, 'CRT context does not have vectorized NTTs'
+        return ntt_merged_fwd(residues, self.roots, self.roots_shoup, self.prime_column)
+
+    def ntt_inv(self, residues):
+        """Runs inverse FTT on the residues of all primes at once.
+
+        Args:
+            residues (ndarray): (L x N) array, where row i holds residues modulo
+                the ith prime, in bit-reversed order.
+
+        Returns:
+            (L x N) array of inversely transformed residues.
+        """
+        assert self.vectorized, 'CRT context does not have vectorized NTTs'
+        return ntt_merged_inv(residues, self.roots_inv, self.roots_inv_shoup, self.degree_inv,
+                              self.scaled_root_inv, self.prime_column)
+
+    def multiply_residues(self, residues1, residues2):
+        """Multiplies residues of all primes pointwise.
+
+        Args:
+            residues1 (ndarray): First (L x N) array of residues.
+            residues2 (ndarray): Second (L x N) array of residues.
+
+        Returns:
+            (L x N) array of the pointwise products.
+        """
+        return modops.mul_mod(residues1, residues2, self.prime_column, self.barrett_ratios,
+                              self.barrett_shifts)
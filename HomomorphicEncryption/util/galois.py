@@ -0,0 +1,105 @@
+"""A module to precompute the Galois automorphisms m(X) -> m(X^k) of the
+ring Z[x]/(x^d + 1), which rotate and conjugate CKKS slots.
+"""
+import numpy as np
+
+from util.bit_operations import bit_reverse_indices
+
+# Automorphisms are cached by (degree, galois_elt).
+_AUTOMORPHISMS = {}
+
+
+class GaloisAutomorphism:
+
+    """Precomputed tables for the automorphism m(X) -> m(X^k) for an odd k.
+
+    Coefficient i of m moves to x^(i * k), and since x^d = -1, it changes
+    sign if i * k mod 2d is at least d. Both are stored in gather form, so
+    that the new coefficients are computed with one indexing operation.
+
+    In NTT form, the jth value of m is m(psi^e) for e = 2 * rev(j) + 1, where
+    rev reverses the bits of j. The automorphism maps it to m(psi^(e * k)),
+    which is another value of m, so it is a permutation without signs.
+
+    Attributes:
+        degree (int): Degree d of the quotient polynomial x^d + 1.
+        galois_elt (int): Odd exponent k modulo 2d.
+        index (ndarray): The new coefficient j is +-m[index[j]].
+        negate (ndarray): Boolean mask of new coefficients that change sign.
+        ntt_index (ndarray): The new jth NTT value is the old value at ntt_index[j].
+    """
+
+    def __init__(self, degree, galois_elt):
+        """Inits GaloisAutomorphism with the gather tables.
+
+        Args:
+            degree (int): Degree d of the quotient polynomial.
+            galois_elt (int): Odd exponent k.
+        """
+        assert galois_elt % 2 == 1, 'Galois element must be odd'
+        self.degree = degree
+        self.galois_elt = galois_elt % (2 * degree)
+
+        powers = (np.arange(degree, dtype=np.int64) * self.galois_elt) % (2 * degree)
+        self.index = np.empty(degree, dtype=np.int64)
+        self.index[powers % degree] = np.arange(degree, dtype=np.int64)
+        self.negate = np.empty(degree, dtype=bool)
+        self.negate[powers % degree] = powers >= degree
+
+        rev = np.array(bit_reverse_indices(degree), dtype=np.int64)
+        exponents = ((2 * rev + 1) * self.galois_elt) % (2 * degree)
+        self.ntt_index = rev[(exponents - 1) // 2]
+
+    def apply(self, coeffs):
+        """Applies the automorphism to a list of integer coefficients.
+
+        Args:
+            coeffs (list): Coefficients of m.
+
+        Returns:
+            A list with the coefficients of m(X^k).
+        """
+        values = np.array(coeffs, dtype=object)[self.index]
+        values[self.negate] = -values[self.negate]
+        return values.tolist()
+
+
+def get_automorphism(degree, galois_elt):
+    """Returns the cached tables of an automorphism.
+
+    Args:
+        degree (int): Degree d of the quotient polynomial.
+        galois_elt (int): Odd exponent k.
+
+    Returns:
+        The GaloisAutomorphism for m(X) -> m(X^k).
+    """
+    key = (degree, galois_elt % (2 * degree))
+    if key not in _AUTOMORPHISMS:
+        _AUTOMORPHISMS[key] = GaloisAutomorphism(degree, galois_elt)
+    return _AUTOMORPHISMS[key]
+
+
+def rotation_galois_elt(degree, rotation):
+    """Computes the Galois element that rotates slots to the left.
+
+    Args:
+        degree (int): Degree d of the quotient polynomial.
+        rotation (int): Number of slots to rotate by.
+
+    Returns:
+        5^rotation mod 2d, computed without the full power 5^rotation.
+    """
+    return pow(5, rotation % (degree // 2), 2 * degree)
+
+
+def conjugation_galois_elt(degree):
+    """Computes the Galois element that conjugates slots.
+
+    Args:
+        degree (int): Degree d of the quotient polynomial.
+
+    Returns:
+        2d - 1, the Galois element for m(X) -> m(X^(-1)).
+    """
+    return 2 * degree - 1
@@ -2,6 +2,8 @@
 """
 from math import log
 
+import numpy as np
+
 def matrix_vector_multiply(mat, vec):
     """Multiplies a matrix by a vector.
 
@@ -116,3 +118,37 @@ def transpose_matrix(matrix):
             transpose[j][i] = matrix[i][j]
 
     return transpose
+
+def multiply_diagonals(diagonals1, diagonals2, length):
+    """Multiplies two matrices given by their nonzero diagonals.
+
+    Diagonal k of a matrix A is (A_0k, A_1(k+1), ..., A_N(k-1)), so that
+    A * v is the sum over k of diagonal k times v rotated by k.
+
+    Args:
+        diagonals1 (dict): Nonzero diagonals of the first matrix, indexed by k.
+        diagonals2 (dict): Nonzero diagonals of the second matrix, indexed by k.
+        length (int): Size of the matrices.
+
+    Returns:
+        Nonzero diagonals of the product of the first and second matrix.
+    """
+    prod = {}
+    for k1, diag1 in diagonals1.items():
+        for k2, diag2 in diagonals2.items():
+            k = (k1 + k2) % length
+            term = np.asarray(diag1) * np.roll(diag2, -k1)
+            prod[k] = prod[k] + term if k in prod else term
+    return prod
+
+def conjugate_transpose_diagonals(diagonals, length):
+    """Computes the conjugate transpose of a matrix given by its nonzero diagonals.
+
+    Args:
+        diagonals (dict): Nonzero diagonals of the matrix, indexed by k.
+        length (int): Size of the matrix.
+
+    Returns:
+        Nonzero diagonals of the conjugate transpose of the matrix.
+    """
+    return {(-k) % length: np.roll(np.conj(diag), k) for k, diag in diagonals.items()}
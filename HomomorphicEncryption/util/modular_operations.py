@@ -0,0 +1,194 @@
+"""A module to perform word-size modular arithmetic on arrays of residues.
+
+All functions operate on NumPy arrays of unsigned 64-bit integers, and the
+moduli must be smaller than 2^62, so that sums of a few residues never
+overflow a machine word. Moduli may be scalars or arrays that broadcast
+against the values (for instance, a column of primes for an RNS matrix).
+"""
+
+import numpy as np
+
+LOW_MASK = np.uint64(0xFFFFFFFF)
+HALF_WIDTH = np.uint64(32)
+MAX_MODULUS_BITS = 62
+
+
+def to_word_array(values):
+    """Converts values to a NumPy array of unsigned 64-bit integers.
+
+    Args:
+        values (list): Values, each of which must be in [0, 2^64).
+
+    Returns:
+        An array of unsigned 64-bit integers.
+    """
+    return np.asarray(values, dtype=np.uint64)
+
+def check_modulus(modulus):
+    """Checks that a modulus is small enough for word-size arithmetic.
+
+    Args:
+        modulus (int): Modulus to check.
+    """
+    assert 1 < modulus < (1 << MAX_MODULUS_BITS), "Modulus must be smaller than 2^" \
+        + str(MAX_MODULUS_BITS) + " for word-size arithmetic: " + str(modulus)
+
+def mul_wide(a, b):
+    """Multiplies two arrays into 128-bit products.
+
+    Splits both operands into 32-bit halves, so that all partial products
+    fit into a 64-bit word.
+
+    Args:
+        a (ndarray): First operand.
+        b (ndarray): Second operand.
+
+    Returns:
+        A tuple (hi, lo) of arrays with the high and low words of a * b.
+    """
+    a_lo = a & LOW_MASK
+    a_hi = a >> HALF_WIDTH
+    b_lo = b & LOW_MASK
+    b_hi = b >> HALF_WIDTH
+
+    lo_lo = a_lo * b_lo
+    lo_hi = a_lo * b_hi
+    hi_lo = a_hi * b_lo
+    hi_hi = a_hi * b_hi
+
+    middle = (lo_lo >> HALF_WIDTH) + (lo_hi & LOW_MASK) + (hi_lo & LOW_MASK)
+    lo = (middle << HALF_WIDTH) | (lo_lo & LOW_MASK)
+    hi = hi_hi + (lo_hi >> HALF_WIDTH) + (hi_lo >> HALF_WIDTH) + (middle >> HALF_WIDTH)
+    return hi, lo
+
+def mul_hi(a, b):
+    """Computes the high word of the 128-bit products of two arrays.
+
+    Args:
+        a (ndarray): First operand.
+        b (ndarray): Second operand.
+
+    Returns:
+        An array with the high 64 bits of a * b.
+    """
+    return mul_wide(a, b)[0]
+
+def reduce_once(values, modulus):
+    """Reduces values in [0, 2 * modulus) to [0, modulus).
+
+    Args:
+        values (ndarray): Values to reduce.
+        modulus (ndarray): Modulus.
+
+    Returns:
+        The reduced values.
+    """
+    # If values < modulus, the subtraction wraps around to a huge value.
+    return np.minimum(values, values - modulus)
+
+def add_mod(a, b, modulus):
+    """Adds two arrays of residues.
+
+    Args:
+        a (ndarray): First summand, with entries in [0, modulus).
+        b (ndarray): Second summand, with entries in [0, modulus).
+        modulus (ndarray): Modulus.
+
+    Returns:
+        The sum a + b (mod modulus).
+    """
+    return reduce_once(a + b, modulus)
+
+def sub_mod(a, b, modulus):
+    """Subtracts two arrays of residues.
+
+    Args:
+        a (ndarray): Minuend, with entries in [0, modulus).
+        b (ndarray): Subtrahend, with entries in [0, modulus).
+        modulus (ndarray): Modulus.
+
+    Returns:
+        The difference a - b (mod modulus).
+    """
+    diff = a - b
+    # If a < b, the difference wraps around, and adding the modulus wraps it back.
+    return np.minimum(diff, diff + modulus)
+
+def neg_mod(a, modulus):
+    """Negates an array of residues.
+
+    Args:
+        a (ndarray): Values to negate, with entries in [0, modulus).
+        modulus (ndarray): Modulus.
+
+    Returns:
+        The negation -a (mod modulus).
+    """
+    return sub_mod(np.zeros_like(a), a, modulus)
+
+def barrett_precompute(modulus):
+    """Precomputes the constants for Barrett reduction.
+
+    Args:
+        modulus (int): Modulus, smaller than 2^62.
+
+    Returns:
+        A tuple (ratio, shift), where shift is the bit length k of the modulus
+        and ratio = floor(2^(2k) / modulus).
+    """
+    check_modulus(modulus)
+    shift = modulus.bit_length()
+    return (1 << (2 * shift)) // modulus, shift
+
+def mul_mod(a, b, modulus, ratio, shift):
+    """Multiplies two arrays of residues with Barrett reduction.
+
+    Args:
+        a (ndarray): First factor, with entries in [0, modulus).
+        b (ndarray): Second factor, with entries in [0, modulus).
+        modulus (ndarray): Modulus, smaller than 2^62.
+        ratio (ndarray): Barrett ratio from barrett_precompute.
+        shift (ndarray): Bit length of the modulus from barrett_precompute.
+
+    Returns:
+        The product a * b (mod modulus).
+    """
+    prod_hi, prod_lo = mul_wide(a, b)
+    # Estimate the quotient as ((prod >> (k - 1)) * ratio) >> (k + 1).
+    estimate = (prod_lo >> (shift - np.uint64(1))) | (prod_hi << (np.uint64(65) - shift))
+    quot_hi, quot_lo = mul_wide(estimate, ratio)
+    quotient = (quot_lo >> (shift + np.uint64(1))) | (quot_hi << (np.uint64(63) - shift))
+
+    # The remainder is at most 3 * modulus, so it fits into the low word.
+    remainder = prod_lo - quotient * modulus
+    remainder = reduce_once(remainder, 2 * modulus)
+    return reduce_once(remainder, modulus)
+
+def shoup_precompute(value, modulus):
+    """Precomputes the Shoup companion of a constant.
+
+    Args:
+        value (int): Constant in [0, modulus) that will be multiplied often.
+        modulus (int): Modulus, smaller than 2^62.
+
+    Returns:
+        The companion floor(value * 2^64 / modulus).
+    """
+    return (int(value) << 64) // modulus
+
+def mul_mod_shoup(a, value, value_shoup, modulus):
+    """Multiplies an array of residues by precomputed constants.
+
+    Uses Shoup's method, which needs one high and two low products.
+
+    Args:
+        a (ndarray): Values to multiply, with entries in [0, modulus).
+        value (ndarray): Constants in [0, modulus).
+        value_shoup (ndarray): Shoup companions of the constants.
+        modulus (ndarray): Modulus, smaller than 2^62.
+
+    Returns:
+        The product a * value (mod modulus).
+    """
+    quotient = mul_hi(a, value_shoup)
+    return reduce_once(a * value - quotient * modulus, modulus)
@@ -3,8 +3,12 @@ and Fermat Theoretic Transform (FTT).
 """
 
 from math import log, pi, cos, sin
+
+import numpy as np
+
+import util.modular_operations as modops
 import util.number_theory as nbtheory
-from util.bit_operations import bit_reverse_vec, reverse_bits
+from util.bit_operations import bit_reverse_indices, bit_reverse_vec, reverse_bits
 
 class NTTContext:
     """An instance of Number/Fermat Theoretic Transform parameters.
@@ -25,6 +29,12 @@ class NTTContext:
             where w is a root of unity.
         reversed_bits (list): The ith member of the list is the bits of i
             reversed, used in the iterative implementation of NTT.
+        roots_of_unity_rev (list): The ith member of the list is w^(rev(i)),
+            where rev(i) is i with its bits reversed, used in the merged FTT.
+        roots_of_unity_inv_rev (list): The ith member of the list is w^(-rev(i)).
+        degree_inv (int): Inverse of the degree modulo coeff_modulus.
+        scaled_root_inv (int): Product degree_inv * w^(-rev(1)), which
+            merges the scaling into the last stage of the inverse FTT.
     """
 
     def __init__(self, poly_degree, coeff_modulus, root_of_unity=None):
@@ -79,6 +89,14 @@ class NTTContext:
         for i in range(self.degree):
             self.reversed_bits[i] = reverse_bits(i, width) % self.degree
 
+        # Store powers of root of unity in bit-reversed order for the merged FTT, so that
+        # the twist by w^i is folded into the butterflies.
+        self.roots_of_unity_rev = [self.roots_of_unity[i] for i in self.reversed_bits]
+        self.roots_of_unity_inv_rev = [self.roots_of_unity_inv[i] for i in self.reversed_bits]
+        self.degree_inv = nbtheory.mod_inv(self.degree, self.coeff_modulus)
+        self.scaled_root_inv = \
+            (self.degree_inv * self.roots_of_unity_inv_rev[1 % self.degree]) % self.coeff_modulus
+
     def ntt(self, coeffs, rou):
         """Runs NTT on the given coefficients.
 
@@ -98,7 +116,7 @@ class NTTContext:
         assert len(rou) == num_coeffs, \
             "Length of the roots of unity is too small. Length is " + len(rou)
 
-        result = bit_reverse_vec(coeffs)
+        result = [coeffs[i] for i in self.reversed_bits]
 
         log_num_coeffs = int(log(num_coeffs, 2))
 
@@ -122,7 +140,11 @@ class NTTContext:
     def ftt_fwd(self, coeffs):
         """Runs forward FTT on the given coefficients.
 
-        Runs forward FTT with the given coefficients and parameters in the context.
+        Runs the merged negacyclic transform of Longa and Naehrig: a Cooley-Tukey
+        NTT whose twiddle factors are odd powers of w in bit-reversed order, so
+        that neither a twist by w^i nor a bit-reversal permutation is needed.
+        The output is the evaluation at w^(2 rev(j) + 1) in position j, i.e. the
+        FTT output in bit-reversed order.
 
         Args:
             coeffs (list): List of coefficients to transform. Must be the
@@ -134,16 +156,29 @@ class NTTContext:
         num_coeffs = len(coeffs)
         assert num_coeffs == self.degree, "ftt_fwd: input length does not match context degree"
 
-        # We use the FTT input given in the FTT paper.
-        ftt_input = [(int(coeffs[i]) * self.roots_of_unity[i]) % self.coeff_modulus
-                     for i in range(num_coeffs)]
+        result = [int(c) % self.coeff_modulus for c in coeffs]
+        half = num_coeffs // 2
+        num_blocks = 1
+
+        while num_blocks < num_coeffs:
+            for i in range(num_blocks):
+                root = self.roots_of_unity_rev[num_blocks + i]
+                start = 2 * i * half
+                for j in range(start, start + half):
+                    omega_factor = (result[j + half] * root) % self.coeff_modulus
+                    result[j + half] = (result[j] - omega_factor) % self.coeff_modulus
+                    result[j] = (result[j] + omega_factor) % self.coeff_modulus
+            num_blocks *= 2
+            half //= 2
 
-        return self.ntt(coeffs=ftt_input, rou=self.roots_of_unity)
+        return result
 
     def ftt_inv(self, coeffs):
         """Runs inverse FTT on the given coefficients.
 
-        Runs inverse FTT with the given coefficients and parameters in the context.
+        Runs the Gentleman-Sande counterpart of ftt_fwd, which takes the
+        bit-reversed output of ftt_fwd back to coefficients in natural order.
+        The scaling by 1/n is merged into the last stage.
 
         Args:
             coeffs (list): List of coefficients to transform. Must be the
@@ -155,16 +190,226 @@ class NTTContext:
         num_coeffs = len(coeffs)
         assert num_coeffs == self.degree, "ntt_inv: input length does not match context degree"
 
-        to_scale_down = self.ntt(coeffs=coeffs, rou=self.roots_of_unity_inv)
-        poly_degree_inv = nbtheory.mod_inv(self.degree, self.coeff_modulus)
-
-        # We scale down the FTT output given in the FTT paper.
-        result = [(int(to_scale_down[i]) * self.roots_of_unity_inv[i] * poly_degree_inv) \
-                  % self.coeff_modulus for i in range(num_coeffs)]
+        result = [int(c) % self.coeff_modulus for c in coeffs]
+        half = 1
+        num_blocks = num_coeffs // 2
+
+        while num_blocks > 1:
+            for i in range(num_blocks):
+                root = self.roots_of_unity_inv_rev[num_blocks + i]
+                start = 2 * i * half
+                for j in range(start, start + half):
+                    diff = result[j] - result[j + half]
+                    result[j] = (result[j] + result[j + half]) % self.coeff_modulus
+                    result[j + half] = (diff * root) % self.coeff_modulus
+            num_blocks //= 2
+            half *= 2
+
+        # In the last stage, scale down by 1/n along with the butterfly.
+        for j in range(half if num_coeffs > 1 else 0):
+            diff = result[j] - result[j + half]
+            result[j] = ((result[j] + result[j + half]) * self.degree_inv) % self.coeff_modulus
+            result[j + half] = (diff * self.scaled_root_inv) % self.coeff_modulus
 
         return result
 
 
+def ntt_merged_fwd(values, roots, roots_shoup, modulus):
+    """Runs the merged negacyclic FTT on arrays of residues.
+
+    Each Cooley-Tukey stage is a handful of array operations over all
+    butterflies at once. The output is in bit-reversed order, as in
+    NTTContext.ftt_fwd.
+
+    Args:
+        values (ndarray): Array of shape (..., N) with residues in [0, modulus).
+        roots (ndarray): Array of shape (..., N) with the powers of the root of
+            unity in bit-reversed order.
+        roots_shoup (ndarray): Shoup companions of roots.
+        modulus (ndarray): Modulus, which broadcasts against values.
+
+    Returns:
+        Array of transformed residues.
+    """
+    shape = values.shape
+    degree = shape[-1]
+    block_modulus = np.expand_dims(modulus, -1)
+    result = values
+    num_blocks = 1
+
+    while num_blocks < degree:
+        blocks = result.reshape(shape[:-1] + (num_blocks, 2, -1))
+        stage_roots = roots[..., num_blocks:2 * num_blocks, None]
+        stage_roots_shoup = roots_shoup[..., num_blocks:2 * num_blocks, None]
+        even = blocks[..., 0, :]
+        odd = modops.mul_mod_shoup(blocks[..., 1, :], stage_roots, stage_roots_shoup,
+                                   block_modulus)
+        blocks = np.stack((modops.add_mod(even, odd, block_modulus),
+                           modops.sub_mod(even, odd, block_modulus)), axis=-2)
+        result = blocks.reshape(shape)
+        num_blocks *= 2
+
+    return result
+
+def ntt_merged_inv(values, roots_inv, roots_inv_shoup, degree_inv, scaled_root_inv, modulus):
+    """Runs the merged inverse negacyclic FTT on arrays of residues.
+
+    Runs the Gentleman-Sande stages of NTTContext.ftt_inv, which take
+    bit-reversed input to natural order. The scaling by 1/n is merged into
+    the last stage.
+
+    Args:
+        values (ndarray): Array of shape (..., N) with residues in [0, modulus).
+        roots_inv (ndarray): Array of shape (..., N) with the powers of the inverse
+            root of unity in bit-reversed order.
+        roots_inv_shoup (ndarray): Shoup companions of roots_inv.
+        degree_inv (tuple): Inverse of N and its Shoup companion, which broadcast
+            against values.
+        scaled_root_inv (tuple): Product of the inverse of N and roots_inv[1], and
+            its Shoup companion, which broadcast against values.
+        modulus (ndarray): Modulus, which broadcasts against values.
+
+    Returns:
+        Array of inversely transformed residues.
+    """
+    shape = values.shape
+    block_modulus = np.expand_dims(modulus, -1)
+    result = values
+    num_blocks = shape[-1] // 2
+
+    while num_blocks > 1:
+        blocks = result.reshape(shape[:-1] + (num_blocks, 2, -1))
+        stage_roots = roots_inv[..., num_blocks:2 * num_blocks, None]
+        stage_roots_shoup = roots_inv_shoup[..., num_blocks:2 * num_blocks, None]
+        even = blocks[..., 0, :]
+        odd = blocks[..., 1, :]
+        diff = modops.sub_mod(even, odd, block_modulus)
+        blocks = np.stack((modops.add_mod(even, odd, block_modulus),
+                           modops.mul_mod_shoup(diff, stage_roots, stage_roots_shoup,
+                                                block_modulus)), axis=-2)
+        result = blocks.reshape(shape)
+        num_blocks //= 2
+
+    # In the last stage, scale down by 1/n along with the butterfly.
+    half = shape[-1] // 2
+    even = result[..., :half]
+    odd = result[..., half:]
+    total = modops.add_mod(even, odd, modulus)
+    diff = modops.sub_mod(even, odd, modulus)
+    return np.concatenate((modops.mul_mod_shoup(total, degree_inv[0], degree_inv[1], modulus),
+                           modops.mul_mod_shoup(diff, scaled_root_inv[0], scaled_root_inv[1],
+                                                modulus)), axis=-1)
+
+
+class VectorizedNTTContext(NTTContext):
+    """An NTTContext whose transforms run as array operations on word-size residues.
+
+    The coefficient modulus must be smaller than 2^62. All twiddle factors are
+    precomputed along with their Shoup companions, so each butterfly stage of
+    the transform is a handful of NumPy operations on unsigned 64-bit integers.
+
+    Attributes:
+        modulus_word (ndarray): Coefficient modulus as an unsigned 64-bit integer.
+        roots (ndarray): Powers of the root of unity in bit-reversed order,
+            as in roots_of_unity_rev.
+        roots_shoup (ndarray): Shoup companions of roots.
+        roots_inv (ndarray): Powers of the inverse root of unity in bit-reversed
+            order, as in roots_of_unity_inv_rev.
+        roots_inv_shoup (ndarray): Shoup companions of roots_inv.
+        degree_inv_word (tuple): Inverse of the degree and its Shoup companion.
+        scaled_root_inv_word (tuple): The scaled_root_inv and its Shoup companion.
+    """
+
+    def __init__(self, poly_degree, coeff_modulus, root_of_unity=None):
+        """Inits VectorizedNTTContext with a word-size coefficient modulus.
+
+        Args:
+            poly_degree (int): Degree of the polynomial ring.
+            coeff_modulus (int): Modulus for coefficients of the polynomial. Must
+                be smaller than 2^62.
+            root_of_unity (int): Root of unity to perform the NTT with. If it
+                takes its default value of None, we compute a root of unity to
+                use.
+        """
+        modops.check_modulus(coeff_modulus)
+        super().__init__(poly_degree, coeff_modulus, root_of_unity)
+        self.precompute_vectorized()
+
+    def shoup_table(self, values):
+        """Converts a list of constants to arrays for Shoup multiplication.
+
+        Args:
+            values (list): Constants in [0, coeff_modulus).
+
+        Returns:
+            A tuple of arrays with the constants and their Shoup companions.
+        """
+        shoup = [modops.shoup_precompute(val, self.coeff_modulus) for val in values]
+        return modops.to_word_array(values), modops.to_word_array(shoup)
+
+    def precompute_vectorized(self):
+        """Precomputes the twiddle tables for the vectorized transforms.
+        """
+        self.modulus_word = np.uint64(self.coeff_modulus)
+        self.roots, self.roots_shoup = self.shoup_table(self.roots_of_unity_rev)
+        self.roots_inv, self.roots_inv_shoup = self.shoup_table(self.roots_of_unity_inv_rev)
+        self.degree_inv_word = self.shoup_table([self.degree_inv])
+        self.scaled_root_inv_word = self.shoup_table([self.scaled_root_inv])
+
+    def ftt_fwd_array(self, values):
+        """Runs forward FTT on an array of residues.
+
+        Args:
+            values (ndarray): Array of shape (..., N) with residues in
+                [0, coeff_modulus).
+
+        Returns:
+            Array of transformed residues in bit-reversed order.
+        """
+        return ntt_merged_fwd(values, self.roots, self.roots_shoup, self.modulus_word)
+
+    def ftt_inv_array(self, values):
+        """Runs inverse FTT on an array of residues.
+
+        Args:
+            values (ndarray): Array of shape (..., N) with residues in
+                [0, coeff_modulus), in bit-reversed order.
+
+        Returns:
+            Array of inversely transformed residues.
+        """
+        return ntt_merged_inv(values, self.roots_inv, self.roots_inv_shoup, self.degree_inv_word,
+                              self.scaled_root_inv_word, self.modulus_word)
+
+    def ftt_fwd(self, coeffs):
+        """Runs forward FTT on the given coefficients.
+
+        Args:
+            coeffs (list): List of integer coefficients to transform. Must be the
+                length of the polynomial degree.
+
+        Returns:
+            List of transformed coefficients.
+        """
+        assert len(coeffs) == self.degree, "ftt_fwd: input length does not match context degree"
+        values = modops.to_word_array([int(c) % self.coeff_modulus for c in coeffs])
+        return self.ftt_fwd_array(values).tolist()
+
+    def ftt_inv(self, coeffs):
+        """Runs inverse FTT on the given coefficients.
+
+        Args:
+            coeffs (list): List of integer coefficients to transform. Must be the
+                length of the polynomial degree.
+
+        Returns:
+            List of inversely transformed coefficients.
+        """
+        assert len(coeffs) == self.degree, "ntt_inv: input length does not match context degree"
+        values = modops.to_word_array([int(c) % self.coeff_modulus for c in coeffs])
+        return self.ftt_inv_array(values).tolist()
+
+
 class FFTContext:
     """An instance of Fast Fourier Transform (FFT) parameters.
 
@@ -179,6 +424,8 @@ class FFTContext:
             for 0 <= i < fft_length / 4.
         reversed_bits (list): The ith member of the list is the bits of i
             reversed, used in the iterative implementation of FFT.
+        embedding_tables (dict): Twiddle factors of each stage of the embedding,
+            indexed by the number of values and the direction.
     """
     def __init__(self, fft_length):
         """Inits FFTContext with a length for the FFT vector.
@@ -214,6 +461,8 @@ class FFTContext:
         for i in range(1, num_slots):
             self.rot_group[i] = (5 * self.rot_group[i - 1]) % self.fft_length
 
+        self.embedding_tables = {}
+
     def fft(self, coeffs, rou):
         """Runs FFT on the given coefficients.
 
@@ -372,3 +621,83 @@ class FFTContext:
             to_scale_down[i] /= num_coeffs
 
         return to_scale_down
+
+    def embedding_twiddles(self, num_coeffs, inverse=False):
+        """Returns the twiddle factors of the stages of the embedding.
+
+        The tables are computed once for each length and direction.
+
+        Args:
+            num_coeffs (int): Number of values to transform.
+            inverse (bool): Whether to return the factors of embedding_inv.
+
+        Returns:
+            A list of arrays, where the array for logm = 1, 2, ... holds the
+            factors for i = 0, ..., 2^(logm - 1) - 1 of that stage.
+        """
+        key = (num_coeffs, inverse)
+        if key not in self.embedding_tables:
+            roots = np.array(self.roots_of_unity_inv if inverse else self.roots_of_unity)
+            rot_group = np.array(self.rot_group, dtype=np.int64)
+            tables = []
+            for logm in range(1, int(log(num_coeffs, 2)) + 1):
+                idx_mod = 1 << (logm + 2)
+                gap = self.fft_length // idx_mod
+                tables.append(roots[(rot_group[:1 << (logm - 1)] % idx_mod) * gap])
+            self.embedding_tables[key] = tables
+        return self.embedding_tables[key]
+
+    def embedding_batch(self, values):
+        """Computes the canonical embedding of several vectors at once.
+
+        Runs the same butterflies as embedding on all rows, with each stage
+        vectorized over the rows and blocks.
+
+        Args:
+            values (ndarray): (B x n) array of complex numbers, with one vector
+                of coefficients per row.
+
+        Returns:
+            A (B x n) complex array, whose rows are the embeddings of the rows.
+        """
+        values = np.asarray(values, dtype=np.complex128)
+        num_rows, num_coeffs = values.shape
+        self.check_embedding_input(values[0])
+        result = values[:, bit_reverse_indices(num_coeffs)]
+
+        for logm, twiddles in enumerate(self.embedding_twiddles(num_coeffs), 1):
+            half = 1 << (logm - 1)
+            blocks = result.reshape(num_rows, num_coeffs // (2 * half), 2, half)
+            omega_factor = twiddles * blocks[:, :, 1, :]
+            butterfly_plus = blocks[:, :, 0, :] + omega_factor
+            butterfly_minus = blocks[:, :, 0, :] - omega_factor
+            blocks[:, :, 0, :] = butterfly_plus
+            blocks[:, :, 1, :] = butterfly_minus
+
+        return result
+
+    def embedding_inv_batch(self, values):
+        """Computes the inverse embedding of several vectors at once.
+
+        Args:
+            values (ndarray): (B x n) array of complex numbers, with one vector
+                of slots per row.
+
+        Returns:
+            A (B x n) complex array, whose rows are the inverse embeddings of the rows.
+        """
+        values = np.asarray(values, dtype=np.complex128)
+        num_rows, num_coeffs = values.shape
+        self.check_embedding_input(values[0])
+        result = values.copy()
+
+        tables = self.embedding_twiddles(num_coeffs, inverse=True)
+        for logm in range(len(tables), 0, -1):
+            half = 1 << (logm - 1)
+            blocks = result.reshape(num_rows, num_coeffs // (2 * half), 2, half)
+            butterfly_plus = blocks[:, :, 0, :] + blocks[:, :, 1, :]
+            butterfly_minus = blocks[:, :, 0, :] - blocks[:, :, 1, :]
+            blocks[:, :, 0, :] = butterfly_plus
+            blocks[:, :, 1, :] = butterfly_minus * tables[logm - 1]
+
+        return result[:, bit_reverse_indices(num_coeffs)] / num_coeffs
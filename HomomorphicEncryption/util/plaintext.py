@@ -1,4 +1,5 @@
 """A module to keep track of a plaintext."""
+import sys
 
 class Plaintext:
 
@@ -12,6 +13,8 @@ class Plaintext:
         scaling_factor (float): Scaling factor.
     """
 
+    __slots__ = ('poly', 'scaling_factor')
+
     def __init__(self, poly, scaling_factor=None):
         """Sets plaintext to given polynomial.
 
@@ -22,6 +25,14 @@ class Plaintext:
         self.poly = poly
         self.scaling_factor = scaling_factor
 
+    def memory_size(self):
+        """Returns the number of bytes used by the plaintext.
+
+        Returns:
+            The size of the object and its polynomial.
+        """
+        return sys.getsizeof(self) + self.poly.memory_size()
+
     def __str__(self):
         """Represents plaintext as a readable string.
 
@@ -1,7 +1,13 @@
 """A module to handle polynomial arithmetic in the quotient ring
 Z_a[x]/f(x).
 """
+from array import array
+import sys
+
+from util.bit_operations import pack_ints, unpack_ints
+from util.galois import get_automorphism, rotation_galois_elt, conjugation_galois_elt
 from util.ntt import NTTContext, FFTContext
+from util.rns_polynomial import RNSPolynomial, COEFF_DOMAIN, NTT_DOMAIN
 
 
 class Polynomial:
@@ -11,13 +17,30 @@ class Polynomial:
     The polynomial keeps track of the ring degree d, the coefficient
     modulus a, and the coefficients in an array.
 
+    Multiplications with a vectorized CRTContext leave the product in NTT
+    (evaluation) form. Additions, subtractions, reductions and further products
+    of such polynomials stay in NTT form, and the coefficients are only
+    computed when they are first accessed. The NTT form of a polynomial is
+    cached, so that multiplying by the same polynomial again does not
+    transform it again. The coefficient list must not be modified in place.
+
+    Integer coefficients that fit into 64 bits are stored in an array of
+    machine words instead of a list of int objects. Such arrays are read-only
+    like the lists: writing a value that does not fit into 64 bits raises an
+    OverflowError, so new coefficients are computed in a list and passed to a
+    new Polynomial.
+
     Attributes:
         ring_degree (int): Degree d of polynomial that determines the
             quotient ring R.
         coeffs (array): Array of coefficients of polynomial, where coeffs[i]
             is the coefficient for x^i.
+        domain (str): COEFF_DOMAIN if the coefficients are available, or
+            NTT_DOMAIN if the polynomial is only stored in NTT form.
     """
 
+    __slots__ = ('ring_degree', '_coeffs', '_ntt_poly', '_bound', '_reduction')
+
     def __init__(self, degree, coeffs):
         """Inits Polynomial in the ring R_a with the given coefficients.
 
@@ -32,6 +55,157 @@ class Polynomial:
 
         self.coeffs = coeffs
 
+    @classmethod
+    def from_ntt(cls, ntt_poly, bound, reduction=None):
+        """Creates a polynomial which is only stored in NTT form.
+
+        The coefficients are the integer polynomial V represented by ntt_poly,
+        reduced as given by reduction.
+
+        Args:
+            ntt_poly (RNSPolynomial): Polynomial in NTT form.
+            bound (int): Bound on the absolute value of the coefficients of V.
+                Must be smaller than half the modulus of ntt_poly.
+            reduction (tuple): Pair (modulus, centered) of a pending reduction
+                of the coefficients of V, or None if V is exact.
+
+        Returns:
+            A Polynomial in NTT form.
+        """
+        poly = cls.__new__(cls)
+        poly.ring_degree = ntt_poly.ring_degree
+        poly._coeffs = None
+        poly._ntt_poly = ntt_poly
+        poly._bound = bound
+        poly._reduction = reduction
+        return poly
+
+    @property
+    def coeffs(self):
+        """Returns the coefficients, transforming from NTT form if needed.
+        """
+        if self._coeffs is None:
+            self.transform_from_ntt()
+        return self._coeffs
+
+    @coeffs.setter
+    def coeffs(self, coeffs):
+        """Sets the coefficients, and drops any cached NTT form.
+        """
+        if not isinstance(coeffs, array):
+            try:
+                coeffs = array('q', coeffs)
+            except (OverflowError, TypeError):
+                pass
+        self._coeffs = coeffs
+        self._ntt_poly = None
+        self._bound = None
+        self._reduction = None
+
+    @property
+    def domain(self):
+        """Returns the domain in which the polynomial is stored.
+        """
+        return COEFF_DOMAIN if self._coeffs is not None else NTT_DOMAIN
+
+    def transform_from_ntt(self):
+        """Computes the coefficients from the NTT form.
+
+        Applies any pending reduction. The NTT form is only kept if it is
+        exact, i.e. if there was no pending reduction.
+        """
+        exact = self._ntt_poly.to_polynomial()
+        if self._reduction:
+            modulus, centered = self._reduction
+            if centered:
+                exact = exact.mod_small(modulus)
+            else:
+                exact = exact.mod(modulus)
+            self._ntt_poly = None
+            self._bound = None
+            self._reduction = None
+        self._coeffs = exact._coeffs
+
+    def to_ntt(self, crt, coeff_modulus=None):
+        """Returns the NTT form of the polynomial.
+
+        The NTT form is computed once per CRT context and cached.
+
+        Args:
+            crt (CRTContext): Context with vectorized NTTs.
+            coeff_modulus (int): Modulus in which the NTT form has to be
+                correct. If the polynomial has a pending reduction modulo a
+                multiple of coeff_modulus, the unreduced NTT form is returned.
+                If it is None, the NTT form is exact.
+
+        Returns:
+            An RNSPolynomial in NTT form.
+        """
+        if self._coeffs is None:
+            same_context = self._ntt_poly.crt_context is crt
+            if same_context and self.reduction_allows(coeff_modulus):
+                return self._ntt_poly
+            self.transform_from_ntt()
+
+        if self._ntt_poly is None or self._ntt_poly.crt_context is not crt:
+            self._ntt_poly = RNSPolynomial.from_polynomial(self, crt).to_ntt()
+            self._bound = max(abs(int(c)) for c in self._coeffs)
+        return self._ntt_poly
+
+    def reduction_allows(self, coeff_modulus):
+        """Checks whether the pending reduction keeps values modulo coeff_modulus.
+
+        Args:
+            coeff_modulus (int): Modulus in which values have to be correct.
+
+        Returns:
+            True if there is no pending reduction, or if the pending reduction is
+            modulo a multiple of coeff_modulus.
+        """
+        if self._reduction is None:
+            return True
+        return bool(coeff_modulus) and self._reduction[0] % coeff_modulus == 0
+
+    def ntt_context(self, poly):
+        """Finds the CRT context in which an operation with poly can stay in NTT form.
+
+        Args:
+            poly (Polynomial): Other operand.
+
+        Returns:
+            The CRT context of an operand that is only stored in NTT form, or
+            None if both operands have coefficients.
+        """
+        for operand in (self, poly):
+            if operand._coeffs is None:
+                return operand._ntt_poly.crt_context
+        return None
+
+    def add_ntt(self, poly, crt, coeff_modulus, negate=False):
+        """Adds or subtracts two polynomials in NTT form.
+
+        Args:
+            poly (Polynomial): Polynomial to be added to the current polynomial.
+            crt (CRTContext): Context with vectorized NTTs.
+            coeff_modulus (int): Modulus a of coefficients of polynomial
+                ring R_a.
+            negate (bool): Whether to subtract poly instead.
+
+        Returns:
+            A Polynomial in NTT form, or None if the sum could overflow the
+            modulus of the CRT context.
+        """
+        a = self.to_ntt(crt, coeff_modulus)
+        b = poly.to_ntt(crt, coeff_modulus)
+        bound = self._bound + poly._bound
+        if 2 * bound >= crt.modulus:
+            return None
+
+        reduction = (coeff_modulus, False) if coeff_modulus else None
+        if negate:
+            return Polynomial.from_ntt(a.subtract(b), bound, reduction)
+        return Polynomial.from_ntt(a.add(b), bound, reduction)
+
     def add(self, poly, coeff_modulus=None):
         """Adds two polynomials in the ring.
 
@@ -48,6 +222,12 @@ class Polynomial:
         """
         assert isinstance(poly, Polynomial)
 
+        crt = self.ntt_context(poly)
+        if crt:
+            poly_sum = self.add_ntt(poly, crt, coeff_modulus)
+            if poly_sum:
+                return poly_sum
+
         poly_sum = Polynomial(self.ring_degree, [0] * self.ring_degree)
 
         poly_sum.coeffs = [self.coeffs[i] + poly.coeffs[i] for i in range(self.ring_degree)]
@@ -71,6 +251,12 @@ class Polynomial:
         """
         assert isinstance(poly, Polynomial)
 
+        crt = self.ntt_context(poly)
+        if crt:
+            poly_diff = self.add_ntt(poly, crt, coeff_modulus, negate=True)
+            if poly_diff:
+                return poly_diff
+
         poly_diff = Polynomial(self.ring_degree, [0] * self.ring_degree)
 
         poly_diff.coeffs = [self.coeffs[i] - poly.coeffs[i] for i in range(self.ring_degree)]
@@ -82,7 +268,9 @@ class Polynomial:
         """Multiplies two polynomials in the ring using NTT.
 
         Multiplies the current polynomial to poly inside the ring R_a
-        using the Number Theoretic Transform (NTT) in O(nlogn).
+        using the Number Theoretic Transform (NTT) in O(nlogn). If neither
+        an NTTContext nor a CRTContext is given, it multiplies exactly with
+        Kronecker substitution.
 
         Args:
             poly (Polynomial): Polynomial to be multiplied to the current
@@ -100,7 +288,7 @@ class Polynomial:
             A Polynomial which is the product of the two polynomials.
         """
         if crt:
-            return self.multiply_crt(poly, crt)
+            return self.multiply_crt(poly, crt, coeff_modulus)
 
         if ntt:
             a = ntt.ftt_fwd(self.coeffs)
@@ -109,27 +297,50 @@ class Polynomial:
             prod = ntt.ftt_inv(ab)
             return Polynomial(self.ring_degree, prod)
 
-        return self.multiply_naive(poly, coeff_modulus)
+        return self.multiply_kronecker(poly, coeff_modulus)
 
-    def multiply_crt(self, poly, crt):
+    def multiply_crt(self, poly, crt, coeff_modulus=None):
         """Multiplies two polynomials in the ring in CRT representation.
 
         Multiplies the current polynomial to poly inside the ring by
         splitting it into Chinese Remainder Theorem subrings for the primes
         given. For each subring, we multiply using NTT and recombine with CRT.
 
+        If the CRT context has vectorized NTTs, the product is left in NTT
+        form and only recombined when its coefficients are needed.
+
         Args:
             poly (Polynomial): Polynomial to be multiplied to the current
                 polynomial.
             crt (CRTContext): An instance of the CRTContext object, which
                 was created with primes whose product is the coefficient
                 modulus.
+            coeff_modulus (int): Modulus a of coefficients of polynomial
+                ring R_a. Operands with a pending reduction modulo a multiple
+                of it are multiplied without reducing them first. It defaults
+                to None, in which case the product is exact.
 
         Returns:
             A Polynomial which is the product of the two polynomials.
         """
         assert isinstance(poly, Polynomial)
 
+        if crt.vectorized:
+            a = self.to_ntt(crt, coeff_modulus)
+            b = poly.to_ntt(crt, coeff_modulus)
+            pending = not (self.reduction_allows(None) and poly.reduction_allows(None))
+            bound = self.ring_degree * self._bound * poly._bound
+
+            if pending and 2 * bound >= crt.modulus:
+                # Reduce the operands first, so that the product does not overflow.
+                a = self.to_ntt(crt)
+                b = poly.to_ntt(crt)
+                pending = False
+                bound = self.ring_degree * self._bound * poly._bound
+
+            reduction = (coeff_modulus, True) if pending else None
+            return Polynomial.from_ntt(a.multiply(b), bound, reduction)
+
         poly_prods = []
 
         # Perform NTT for each prime factor.
@@ -138,12 +349,8 @@ class Polynomial:
             poly_prods.append(prod)
 
         # Combine the products with CRT.
-        final_coeffs = [0] * self.ring_degree
-        for i in range(self.ring_degree):
-            values = [p.coeffs[i] for p in poly_prods]
-            final_coeffs[i] = crt.reconstruct(values)
-
-        return Polynomial(self.ring_degree, final_coeffs).mod_small(crt.modulus)
+        final_coeffs = crt.reconstruct_poly([prod.coeffs for prod in poly_prods])
+        return Polynomial(self.ring_degree, final_coeffs)
 
     def multiply_fft(self, poly, round=True):
         """Multiplies two polynomials in the ring using FFT.
@@ -161,8 +368,8 @@ class Polynomial:
         assert isinstance(poly, Polynomial)
 
         fft = FFTContext(self.ring_degree * 8)
-        a = fft.fft_fwd(self.coeffs + [0] * self.ring_degree)
-        b = fft.fft_fwd(poly.coeffs + [0] * self.ring_degree)
+        a = fft.fft_fwd(list(self.coeffs) + [0] * self.ring_degree)
+        b = fft.fft_fwd(list(poly.coeffs) + [0] * self.ring_degree)
         ab = [a[i] * b[i] for i in range(self.ring_degree * 2)]
         prod = fft.fft_inv(ab)
         poly_prod = [0] * self.ring_degree
@@ -179,6 +386,46 @@ class Polynomial:
         else:
             return Polynomial(self.ring_degree, poly_prod)
 
+    def multiply_kronecker(self, poly, coeff_modulus=None):
+        """Multiplies two polynomials in the ring with Kronecker substitution.
+
+        Evaluates both polynomials at a large power of two, so that their
+        coefficients are packed into one integer each, multiplies the two
+        integers, and reads the coefficients of the product off the digits.
+        The product is exact for any coefficient modulus, and the integer
+        multiplication runs in subquadratic time.
+
+        Args:
+            poly (Polynomial): Polynomial to be multiplied to the current
+                polynomial.
+            coeff_modulus (int): Modulus a of coefficients of polynomial
+                ring R_a. If it is None, the coefficients are not reduced.
+
+        Returns:
+            A Polynomial which is the product of the two polynomials.
+        """
+        assert isinstance(poly, Polynomial)
+        a = self.coeffs
+        b = poly.coeffs
+        if coeff_modulus:
+            a = [c % coeff_modulus for c in a]
+            b = [c % coeff_modulus for c in b]
+
+        # Each coefficient of the product is a sum of at most d products, and must
+        # fit into a signed digit of the given width.
+        bound_bits = max(abs(c) for c in a).bit_length() + max(abs(c) for c in b).bit_length() \
+            + self.ring_degree.bit_length() + 1
+        width = (bound_bits + 7) // 8
+
+        prod = unpack_ints(pack_ints(a, width) * pack_ints(b, width), width, 2 * self.ring_degree)
+
+        # Since x^d = -1, the coefficient for x^(d + i) is subtracted from the one for x^i.
+        poly_prod = [prod[i] - prod[i + self.ring_degree] for i in range(self.ring_degree)]
+        if coeff_modulus:
+            poly_prod = [c % coeff_modulus for c in poly_prod]
+
+        return Polynomial(self.ring_degree, poly_prod)
+
     def multiply_naive(self, poly, coeff_modulus=None):
         """Multiplies two polynomials in the ring in O(n^2).
 
@@ -196,8 +443,9 @@ class Polynomial:
         """
         assert isinstance(poly, Polynomial)
 
-        poly_prod = Polynomial(self.ring_degree,
-                               [0] * self.ring_degree)
+        # The coefficients are accumulated in a list, since partial sums may not fit
+        # into the machine words of a coefficient array.
+        prod_coeffs = [0] * self.ring_degree
 
         for d in range(2 * self.ring_degree - 1):
             # Since x^d = -1, the degree is taken mod d, and the sign
@@ -210,12 +458,12 @@ class Polynomial:
             for i in range(self.ring_degree):
                 if 0 <= d - i < self.ring_degree:
                     coeff += self.coeffs[i] * poly.coeffs[d - i]
-            poly_prod.coeffs[index] += sign * coeff
+            prod_coeffs[index] += sign * coeff
 
             if coeff_modulus:
-                poly_prod.coeffs[index] %= coeff_modulus
+                prod_coeffs[index] %= coeff_modulus
 
-        return poly_prod
+        return Polynomial(self.ring_degree, prod_coeffs)
 
     def scalar_multiply(self, scalar, coeff_modulus=None):
         """Multiplies polynomial by a scalar.
@@ -238,6 +486,24 @@ class Polynomial:
             new_coeffs = [(scalar * c) for c in self.coeffs]
         return Polynomial(self.ring_degree, new_coeffs)
 
+    def multiply_monomial(self, power):
+        """Multiplies polynomial by the monomial x^power.
+
+        Since x^d = -1 in the ring, this shifts the coefficients by power
+        places, and negates the coefficients that wrap around.
+
+        Args:
+            power (int): Exponent of the monomial, with 0 <= power < d.
+
+        Returns:
+            A Polynomial which is the product of the polynomial and x^power.
+        """
+        assert 0 <= power < self.ring_degree, 'Exponent must be between 0 and d - 1'
+        split = self.ring_degree - power
+        coeffs = self.coeffs
+        new_coeffs = [-c for c in coeffs[split:]] + list(coeffs[:split])
+        return Polynomial(self.ring_degree, new_coeffs)
+
     def scalar_integer_divide(self, scalar, coeff_modulus=None):
         """Divides polynomial by a scalar.
 
@@ -264,21 +530,15 @@ class Polynomial:
 
         Rotates all the plaintext coefficients to the left such that the x^r
         coefficient is now the coefficient for x^0. We do so by applying the
-        transformation m(X) -> m(X^k), where k = 5^r in the ciphertext
-        polynomial.
+        transformation m(X) -> m(X^k), where k = 5^r mod 2d in the ciphertext
+        polynomial, with a cached gather table.
 
         Returns:
             A rotated Polynomial.
         """
-        k = 5 ** r
-        new_coeffs = [0] * self.ring_degree
-        for i in range(self.ring_degree):
-            index = (i * k) % (2 * self.ring_degree)
-            if index < self.ring_degree:
-                new_coeffs[index] = self.coeffs[i]
-            else:
-                new_coeffs[index - self.ring_degree] = -self.coeffs[i]
-        return Polynomial(self.ring_degree, new_coeffs)
+        automorphism = get_automorphism(self.ring_degree,
+                                        rotation_galois_elt(self.ring_degree, r))
+        return Polynomial(self.ring_degree, automorphism.apply(self.coeffs))
 
     def conjugate(self):
         """Conjugates plaintext coefficients.
@@ -289,11 +549,9 @@ class Polynomial:
         Returns:
             A conjugated Polynomial.
         """
-        new_coeffs = [0] * self.ring_degree
-        new_coeffs[0] = self.coeffs[0]
-        for i in range(1, self.ring_degree):
-            new_coeffs[i] = -self.coeffs[self.ring_degree - i]
-        return Polynomial(self.ring_degree, new_coeffs)
+        automorphism = get_automorphism(self.ring_degree,
+                                        conjugation_galois_elt(self.ring_degree))
+        return Polynomial(self.ring_degree, automorphism.apply(self.coeffs))
 
     def round(self):
         """Rounds all coefficients to nearest integer.
@@ -338,6 +596,9 @@ class Polynomial:
         Returns:
             A Polynomial whose coefficients are modulo coeff_modulus.
         """
+        if self._coeffs is None and self.reduction_allows(coeff_modulus):
+            return Polynomial.from_ntt(self._ntt_poly, self._bound, (coeff_modulus, False))
+
         new_coeffs = [c % coeff_modulus for c in self.coeffs]
         return Polynomial(self.ring_degree, new_coeffs)
 
@@ -355,6 +616,9 @@ class Polynomial:
         Returns:
             A Polynomial whose coefficients are modulo coeff_modulus.
         """
+        if self._coeffs is None and self.reduction_allows(coeff_modulus):
+            return Polynomial.from_ntt(self._ntt_poly, self._bound, (coeff_modulus, True))
+
         try:
             new_coeffs = [c % coeff_modulus for c in self.coeffs]
             new_coeffs = [c - coeff_modulus if c > coeff_modulus // 2 else c for c in new_coeffs]
@@ -403,6 +667,21 @@ class Polynomial:
 
         return result
 
+    def memory_size(self):
+        """Returns the number of bytes used by the polynomial.
+
+        Returns:
+            The size of the object, its coefficients and its cached NTT form.
+        """
+        size = sys.getsizeof(self)
+        if self._coeffs is not None:
+            size += sys.getsizeof(self._coeffs)
+            if not isinstance(self._coeffs, array):
+                size += sum(sys.getsizeof(c) for c in self._coeffs)
+        if self._ntt_poly is not None:
+            size += self._ntt_poly.memory_size()
+        return size
+
     def __str__(self):
         """Represents polynomial as a readable string.
 
@@ -0,0 +1,72 @@
+"""A module to manipulate coefficients of univariate polynomials in the power
+and Chebyshev bases.
+"""
+import numpy as np
+
+POWER_BASIS = 'power'
+CHEBYSHEV_BASIS = 'chebyshev'
+
+def trim_coeffs(coeffs):
+    """Removes trailing zero coefficients.
+
+    Args:
+        coeffs (list): Coefficients, with the constant term first.
+
+    Returns:
+        A list of coefficients whose last entry is nonzero, or [0].
+    """
+    coeffs = list(coeffs)
+    while len(coeffs) > 1 and coeffs[-1] == 0:
+        coeffs.pop()
+    return coeffs or [0]
+
+def split_coeffs(coeffs, degree, basis=POWER_BASIS):
+    """Divides a polynomial by the basis polynomial of the given degree.
+
+    Computes q and r such that p = q * B_degree + r, where r has degree
+    smaller than degree, and q and r are in the same basis as p. In the
+    Chebyshev basis, this uses T_i = 2 * T_degree * T_(i - degree) - T_(2 * degree - i),
+    so the degree of p must be smaller than 2 * degree.
+
+    Args:
+        coeffs (list): Coefficients of p, with the constant term first.
+        degree (int): Degree of the basis polynomial B_degree, x^degree or T_degree.
+        basis (str): POWER_BASIS or CHEBYSHEV_BASIS.
+
+    Returns:
+        A tuple (q, r) of the coefficients of the quotient and remainder.
+    """
+    assert basis in (POWER_BASIS, CHEBYSHEV_BASIS), 'Unknown basis ' + str(basis)
+    if len(coeffs) <= degree:
+        return [0], list(coeffs)
+    if basis == POWER_BASIS:
+        return list(coeffs[degree:]), list(coeffs[:degree])
+
+    assert len(coeffs) <= 2 * degree, 'Degree of polynomial must be smaller than 2 * degree'
+    quotient = [coeffs[degree]] + [2 * c for c in coeffs[degree + 1:]]
+    remainder = list(coeffs[:degree])
+    for i in range(degree + 1, len(coeffs)):
+        remainder[2 * degree - i] -= coeffs[i]
+    return quotient, remainder
+
+def chebyshev_interpolate(func, degree):
+    """Interpolates a function on [-1, 1] in the Chebyshev basis.
+
+    Interpolates at the degree + 1 Chebyshev nodes, which is close to the
+    best approximation of the given degree for smooth functions.
+
+    Args:
+        func (function): Function to interpolate, which takes and returns
+            NumPy arrays.
+        degree (int): Degree of the interpolant.
+
+    Returns:
+        A list of coefficients of T_0, ..., T_degree.
+    """
+    num_nodes = degree + 1
+    angles = np.pi * (np.arange(num_nodes) + 0.5) / num_nodes
+    values = func(np.cos(angles))
+    # T_k(cos t) = cos(k * t), so the coefficients are a discrete cosine transform.
+    coeffs = 2 / num_nodes * np.cos(np.outer(np.arange(num_nodes), angles)).dot(values)
+    coeffs[0] /= 2
+    return coeffs.tolist()
@@ -1,4 +1,5 @@
 """A module to keep track of a public key."""
+import sys
 
 class PublicKey:
 
@@ -12,6 +13,8 @@ class PublicKey:
         p1 (Polynomial): Second element of public key.
     """
 
+    __slots__ = ('p0', 'p1')
+
     def __init__(self, p0, p1):
         """Sets public key to given inputs.
 
@@ -22,6 +25,14 @@ class PublicKey:
         self.p0 = p0
         self.p1 = p1
 
+    def memory_size(self):
+        """Returns the number of bytes used by the key.
+
+        Returns:
+            The size of the object and its polynomials.
+        """
+        return sys.getsizeof(self) + self.p0.memory_size() + self.p1.memory_size()
+
     def __str__(self):
         """Represents PublicKey as a string.
 
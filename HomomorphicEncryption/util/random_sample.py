@@ -1,6 +1,12 @@
 """A module to sample randomly from various distributions."""
+import hashlib
 import random
 
+import numpy as np
+
+# Number of bytes of a seed for sample_uniform_from_seed.
+SEED_SIZE = 32
+
 def sample_uniform(min_val, max_val, num_samples):
     """Samples from a uniform distribution.
 
@@ -24,6 +30,75 @@ def sample_uniform(min_val, max_val, num_samples):
         for _ in range(num_samples)]
 
 
+def sample_seed():
+    """Samples a seed for the deterministic samplers.
+
+    Returns:
+        A random bytes object of length SEED_SIZE.
+    """
+    return random.getrandbits(8 * SEED_SIZE).to_bytes(SEED_SIZE, 'little')
+
+def expand_seed(seed, index, num_bytes):
+    """Expands a seed into a stream of pseudorandom bytes with SHAKE-256.
+
+    Args:
+        seed (bytes): Seed to expand.
+        index (int): Index of the stream, so that one seed gives independent
+            streams for different indices.
+        num_bytes (int): Number of bytes of the stream.
+
+    Returns:
+        The first num_bytes bytes of the stream.
+    """
+    return hashlib.shake_256(seed + index.to_bytes(8, 'little')).digest(num_bytes)
+
+def sample_uniform_from_seed(seed, modulus, num_samples, index=0):
+    """Samples from a uniform distribution, deterministically from a seed.
+
+    Each sample is reduced from 64 more bits than the modulus has, so it is
+    within statistical distance 2^-64 of uniform in [0, modulus).
+
+    Args:
+        seed (bytes): Seed to expand.
+        modulus (int): Samples are in the range [0, modulus).
+        num_samples (int): Number of samples to be drawn.
+        index (int): Index of the stream of the seed.
+
+    Returns:
+        A list of sampled values.
+    """
+    size = (modulus.bit_length() + 64 + 7) // 8
+    stream = expand_seed(seed, index, size * num_samples)
+    return [int.from_bytes(stream[i * size:(i + 1) * size], 'little') % modulus
+            for i in range(num_samples)]
+
+def sample_words_from_seed(seed, modulus, num_samples, index=0):
+    """Samples words from a uniform distribution, deterministically from a seed.
+
+    Words of the stream are masked to the bit length of the modulus and
+    rejected if they are too large, so the samples are exactly uniform.
+
+    Args:
+        seed (bytes): Seed to expand.
+        modulus (int): Samples are in the range [0, modulus), where the modulus
+            has at most 64 bits.
+        num_samples (int): Number of samples to be drawn.
+        index (int): Index of the stream of the seed.
+
+    Returns:
+        An array of unsigned 64-bit integers.
+    """
+    mask = np.uint64((1 << modulus.bit_length()) - 1)
+    # At least half of the masked words are accepted.
+    num_words = 2 * num_samples + 16
+    while True:
+        words = np.frombuffer(expand_seed(seed, index, 8 * num_words), dtype='<u8') & mask
+        words = words[words < np.uint64(modulus)]
+        if len(words) >= num_samples:
+            return words[:num_samples].astype(np.uint64)
+        num_words *= 2
+
+
 def sample_triangle(num_samples):
     """Samples from a discrete triangle distribution.
 
@@ -0,0 +1,326 @@
+"""A module to handle polynomial arithmetic in the quotient ring
+Z_Q[x]/f(x) in residue number system (RNS) representation.
+"""
+import sys
+
+import numpy as np
+
+import util.modular_operations as modops
+from util.galois import get_automorphism
+
+COEFF_DOMAIN = 'coeff'
+NTT_DOMAIN = 'ntt'
+
+
+class RNSPolynomial:
+    """A polynomial in the ring R_Q, stored by its residues modulo each prime of Q.
+
+    Here, R is the quotient ring Z[x]/f(x), where f(x) = x^d + 1, and Q is the
+    product of the primes of a CRTContext. Instead of a list of big integers,
+    the coefficients are stored in an (L x N) array of unsigned 64-bit integers,
+    whose ith row holds the coefficients modulo the ith prime. All ring
+    operations are vectorized over this array.
+
+    The residues are either in coefficient form or in NTT (evaluation) form,
+    as given by the domain. Additions and products keep the NTT form, and the
+    polynomial is only transformed back when the coefficients are needed.
+
+    Attributes:
+        ring_degree (int): Degree d of polynomial that determines the
+            quotient ring R.
+        residues (ndarray): (L x N) array of residues, where residues[i][j]
+            is the coefficient for x^j modulo the ith prime in coefficient form,
+            or the jth NTT value modulo the ith prime in NTT form.
+        crt_context (CRTContext): Context with the primes of the representation.
+        domain (str): COEFF_DOMAIN or NTT_DOMAIN.
+    """
+
+    __slots__ = ('ring_degree', 'residues', 'crt_context', 'domain')
+
+    def __init__(self, degree, residues, crt_context, domain=COEFF_DOMAIN):
+        """Inits RNSPolynomial with the given residues.
+
+        Args:
+            degree (int): Degree of quotient polynomial for ring R_Q.
+            residues (ndarray): (L x N) array of unsigned 64-bit integers, where row i
+                holds the residues modulo the ith prime of crt_context.
+            crt_context (CRTContext): Context with the primes of the representation.
+            domain (str): COEFF_DOMAIN if residues are coefficients, or NTT_DOMAIN
+                if they are NTT values.
+        """
+        assert crt_context.prime_column is not None, \
+            'Primes of CRT context are too large for the RNS representation'
+        assert residues.shape == (len(crt_context.primes), degree), 'Shape of residue array ' \
+            + str(residues.shape) + ' does not match the CRT context and degree ' + str(degree)
+
+        assert domain in (COEFF_DOMAIN, NTT_DOMAIN), 'Unknown domain ' + str(domain)
+        assert domain == COEFF_DOMAIN or crt_context.vectorized, \
+            'NTT form requires a CRT context with vectorized NTTs'
+
+        self.ring_degree = degree
+        self.residues = residues
+        self.crt_context = crt_context
+        self.domain = domain
+
+    @classmethod
+    def from_polynomial(cls, poly, crt_context):
+        """Converts a polynomial with integer coefficients to RNS representation.
+
+        Args:
+            poly (Polynomial): Polynomial with integer coefficients.
+            crt_context (CRTContext): Context with the primes of the representation.
+
+        Returns:
+            An RNSPolynomial with the residues of poly.
+        """
+        return cls(poly.ring_degree, crt_context.crt_poly(poly.coeffs), crt_context)
+
+    def to_polynomial(self):
+        """Converts polynomial back to a list of big-integer coefficients.
+
+        Returns:
+            A Polynomial with coefficients in the range (-Q/2, Q/2].
+        """
+        # Imported here, since Polynomial keeps its NTT form as an RNSPolynomial.
+        from util.polynomial import Polynomial
+        coeffs = self.crt_context.reconstruct_poly(self.to_coeff().residues)
+        return Polynomial(self.ring_degree, coeffs)
+
+    def to_ntt(self):
+        """Transforms polynomial to NTT form.
+
+        Returns:
+            An RNSPolynomial in NTT form. This is the polynomial itself if it
+            is already in NTT form.
+        """
+        if self.domain == NTT_DOMAIN:
+            return self
+        return RNSPolynomial(self.ring_degree, self.crt_context.ntt_fwd(self.residues),
+                             self.crt_context, NTT_DOMAIN)
+
+    def to_coeff(self):
+        """Transforms polynomial to coefficient form.
+
+        Returns:
+            An RNSPolynomial in coefficient form. This is the polynomial itself
+            if it is already in coefficient form.
+        """
+        if self.domain == COEFF_DOMAIN:
+            return self
+        return RNSPolynomial(self.ring_degree, self.crt_context.ntt_inv(self.residues),
+                             self.crt_context, COEFF_DOMAIN)
+
+    def to_domain(self, domain):
+        """Transforms polynomial to the given domain.
+
+        Args:
+            domain (str): COEFF_DOMAIN or NTT_DOMAIN.
+
+        Returns:
+            An RNSPolynomial in the given domain.
+        """
+        if domain == NTT_DOMAIN:
+            return self.to_ntt()
+        return self.to_coeff()
+
+    def check_context(self, poly):
+        """Checks that the given polynomial has the same RNS representation.
+
+        Args:
+            poly (RNSPolynomial): Polynomial to check.
+        """
+        assert isinstance(poly, RNSPolynomial)
+        assert poly.crt_context is self.crt_context, 'Polynomials use different CRT contexts'
+
+    def with_residues(self, residues):
+        """Creates a polynomial with the same context and domain.
+
+        Args:
+            residues (ndarray): New (L x N) array of residues.
+
+        Returns:
+            An RNSPolynomial with the given residues.
+        """
+        return RNSPolynomial(self.ring_degree, residues, self.crt_context, self.domain)
+
+    def restrict(self, crt_context):
+        """Keeps the residues for the primes of another CRT context.
+
+        This drops limbs, e.g. to lower the modulus of a ciphertext, or picks
+        the limbs of a key for a smaller modulus. Residues do not change when
+        limbs are dropped, so this works in both domains.
+
+        Args:
+            crt_context (CRTContext): Context whose primes are all primes of the
+                current context.
+
+        Returns:
+            An RNSPolynomial in the given context.
+        """
+        if crt_context is self.crt_context:
+            return self
+        rows = {prime: i for i, prime in enumerate(self.crt_context.primes)}
+        assert all(prime in rows for prime in crt_context.primes), \
+            'Primes of new CRT context must be in the current CRT context'
+        indices = [rows[prime] for prime in crt_context.primes]
+        if indices == list(range(len(indices))):
+            residues = self.residues[:len(indices)]
+        else:
+            residues = self.residues[indices]
+        return RNSPolynomial(self.ring_degree, residues, crt_context, self.domain)
+
+    def automorphism(self, galois_elt):
+        """Applies the automorphism m(X) -> m(X^k) for an odd k.
+
+        The gather tables are cached for each k. In NTT form, the
+        automorphism only permutes the values, and the polynomial stays in
+        NTT form.
+
+        Args:
+            galois_elt (int): Odd exponent k.
+
+        Returns:
+            An RNSPolynomial in the domain of the current polynomial for the
+            transformed polynomial.
+        """
+        automorphism = get_automorphism(self.ring_degree, galois_elt)
+        if self.domain == NTT_DOMAIN:
+            return self.with_residues(self.residues[:, automorphism.ntt_index])
+
+        residues = self.residues[:, automorphism.index]
+        negated = modops.neg_mod(residues, self.crt_context.prime_column)
+        return self.with_residues(np.where(automorphism.negate, negated, residues))
+
+    def add(self, poly):
+        """Adds two polynomials in the ring.
+
+        The sum is in the domain of the current polynomial.
+
+        Args:
+            poly (RNSPolynomial): Polynomial to be added to the current
+                polynomial.
+
+        Returns:
+            An RNSPolynomial which is the sum of the two polynomials.
+        """
+        self.check_context(poly)
+        other = poly.to_domain(self.domain)
+        new_residues = modops.add_mod(self.residues, other.residues, self.crt_context.prime_column)
+        return self.with_residues(new_residues)
+
+    def subtract(self, poly):
+        """Subtracts second polynomial from first polynomial in the ring.
+
+        Computes self - poly in the domain of the current polynomial.
+
+        Args:
+            poly (RNSPolynomial): Polynomial to be subtracted from the current
+                polynomial.
+
+        Returns:
+            An RNSPolynomial which is the difference between the two polynomials.
+        """
+        self.check_context(poly)
+        other = poly.to_domain(self.domain)
+        new_residues = modops.sub_mod(self.residues, other.residues, self.crt_context.prime_column)
+        return self.with_residues(new_residues)
+
+    def negate(self):
+        """Negates polynomial in the ring.
+
+        Returns:
+            An RNSPolynomial which is the negation of the current polynomial.
+        """
+        new_residues = modops.neg_mod(self.residues, self.crt_context.prime_column)
+        return self.with_residues(new_residues)
+
+    def scalar_multiply(self, scalar):
+        """Multiplies polynomial by an integer scalar.
+
+        Args:
+            scalar (int): Scalar to be multiplied to the current polynomial.
+                It may be negative or larger than the primes.
+
+        Returns:
+            An RNSPolynomial which is the product of the polynomial and the
+            scalar.
+        """
+        primes = self.crt_context.primes
+        values = [int(scalar) % p for p in primes]
+        values_shoup = [modops.shoup_precompute(values[i], primes[i]) for i in range(len(primes))]
+        new_residues = modops.mul_mod_shoup(self.residues,
+                                            modops.to_word_array(values).reshape(-1, 1),
+                                            modops.to_word_array(values_shoup).reshape(-1, 1),
+                                            self.crt_context.prime_column)
+        return self.with_residues(new_residues)
+
+    def multiply_monomial(self, power):
+        """Multiplies polynomial in coefficient form by the monomial x^power.
+
+        Since x^d = -1 in the ring, this shifts the coefficients by power
+        places, and negates the coefficients that wrap around.
+
+        Args:
+            power (int): Exponent of the monomial, with 0 <= power < d.
+
+        Returns:
+            An RNSPolynomial in coefficient form which is the product of the
+            polynomial and x^power.
+        """
+        assert self.domain == COEFF_DOMAIN, 'Monomial product requires coefficient form'
+        assert 0 <= power < self.ring_degree, 'Exponent must be between 0 and d - 1'
+        split = self.ring_degree - power
+        new_residues = np.empty_like(self.residues)
+        new_residues[:, power:] = self.residues[:, :split]
+        new_residues[:, :power] = modops.neg_mod(self.residues[:, split:],
+                                                 self.crt_context.prime_column)
+        return self.with_residues(new_residues)
+
+    def multiply(self, poly):
+        """Multiplies two polynomials in the ring using NTT.
+
+        Multiplies the residues modulo each prime with the NTT of that prime. If the
+        CRT context has vectorized NTTs, the residues of all primes are transformed
+        at once, and the product is left in NTT form. Operands which are already
+        in NTT form are not transformed again.
+
+        Args:
+            poly (RNSPolynomial): Polynomial to be multiplied to the current
+                polynomial.
+
+        Returns:
+            An RNSPolynomial which is the product of the two polynomials.
+        """
+        self.check_context(poly)
+        crt = self.crt_context
+
+        if crt.vectorized:
+            prod = crt.multiply_residues(self.to_ntt().residues, poly.to_ntt().residues)
+            return RNSPolynomial(self.ring_degree, prod, crt, NTT_DOMAIN)
+
+        new_residues = np.empty_like(self.residues)
+
+        for i, ntt in enumerate(crt.ntts):
+            a = modops.to_word_array(ntt.ftt_fwd(self.residues[i].tolist()))
+            b = modops.to_word_array(ntt.ftt_fwd(poly.residues[i].tolist()))
+            ab = modops.mul_mod(a, b, crt.prime_column[i], crt.barrett_ratios[i],
+                                crt.barrett_shifts[i])
+            new_residues[i] = ntt.ftt_inv(ab.tolist())
+
+        return RNSPolynomial(self.ring_degree, new_residues, crt)
+
+    def memory_size(self):
+        """Returns the number of bytes used by the polynomial.
+
+        Returns:
+            The size of the object and its residues.
+        """
+        return sys.getsizeof(self) + self.residues.nbytes
+
+    def __str__(self):
+        """Represents polynomial as a readable string.
+
+        Returns:
+            A string which represents the RNSPolynomial.
+        """
+        return str(self.to_polynomial())
@@ -1,4 +1,5 @@
 """A module to keep track of a rotation key."""
+import sys
 
 class RotationKey:
 
@@ -11,6 +12,8 @@ class RotationKey:
         key (PublicKey): Key values.
     """
 
+    __slots__ = ('rotation', 'key')
+
     def __init__(self, r, key):
         """Sets rotation key to given inputs.
 
@@ -21,6 +24,14 @@ class RotationKey:
         self.rotation = r
         self.key = key
 
+    def memory_size(self):
+        """Returns the number of bytes used by the rotation key.
+
+        Returns:
+            The size of the object and its key.
+        """
+        return sys.getsizeof(self) + self.key.memory_size()
+
     def __str__(self):
         """Represents RotationKey as a string.
 
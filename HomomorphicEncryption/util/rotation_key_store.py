@@ -0,0 +1,133 @@
+"""A module to store rotation keys in a file that is mapped into memory."""
+from collections import OrderedDict
+from collections.abc import Mapping
+import mmap
+import struct
+
+from util.serialization import dump, loads
+
+MAGIC = b'HERK'
+VERSION = 1
+
+# Header with the magic bytes, version and number of keys, and an index entry
+# with the rotation, offset and size of a key.
+_HEADER = '<4sBI'
+_ENTRY = '<qQQ'
+
+
+class RotationKeyStore(Mapping):
+
+    """A read-only dictionary of rotation keys, backed by a memory-mapped file.
+
+    The file starts with an index of the offset and size of each key,
+    followed by the keys in the binary format of util.serialization. Keys
+    are only deserialized when they are first looked up, and the last
+    cache_size keys are kept. In full-RNS mode, the residues of a key share
+    memory with the mapped file, so processes which open the same file
+    share one copy of the keys in the page cache.
+
+    The store can be passed as rot_keys to the methods of CKKSEvaluator.
+
+    Attributes:
+        path (str): Path of the file.
+        params: Parameters whose CRT contexts are used for the keys, or None.
+        cache_size (int): Number of deserialized keys to keep.
+        index (dict): Offset and size of each key, indexed by rotation.
+    """
+
+    def __init__(self, path, params=None, cache_size=32):
+        """Opens a key store and reads its index.
+
+        Args:
+            path (str): Path of a file written by RotationKeyStore.write.
+            params: Parameters whose CRT contexts are used for the keys, e.g.
+                CKKSParameters, or None.
+            cache_size (int): Number of deserialized keys to keep.
+        """
+        self.path = path
+        self.params = params
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        with open(path, 'rb') as key_file:
+            self._mmap = mmap.mmap(key_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, num_keys = struct.unpack_from(_HEADER, self._mmap, 0)
+        assert magic == MAGIC, path + ' is not a rotation key store'
+        assert version == VERSION, 'Unsupported key store version %d' % version
+        self.index = {}
+        position = struct.calcsize(_HEADER)
+        for _ in range(num_keys):
+            rotation, offset, size = struct.unpack_from(_ENTRY, self._mmap, position)
+            self.index[rotation] = (offset, size)
+            position += struct.calcsize(_ENTRY)
+
+    @staticmethod
+    def write(path, rot_keys):
+        """Writes rotation keys to a key store file.
+
+        Args:
+            path (str): Path of the file.
+            rot_keys (dict (RotationKey)): Rotation keys, indexed by rotation.
+        """
+        rotations = sorted(rot_keys)
+        entries = []
+        with open(path, 'wb') as key_file:
+            key_file.write(struct.pack(_HEADER, MAGIC, VERSION, len(rotations)))
+            key_file.write(b'\x00' * struct.calcsize(_ENTRY) * len(rotations))
+            for rotation in rotations:
+                offset = key_file.tell()
+                dump(rot_keys[rotation], key_file)
+                entries.append(struct.pack(_ENTRY, rotation, offset, key_file.tell() - offset))
+            key_file.seek(struct.calcsize(_HEADER))
+            key_file.write(b''.join(entries))
+
+    def __getitem__(self, rotation):
+        """Returns the key of a rotation, deserializing it on first use.
+
+        Args:
+            rotation (int): Rotation of the key.
+
+        Returns:
+            The RotationKey.
+        """
+        if rotation in self._cache:
+            self._cache.move_to_end(rotation)
+            return self._cache[rotation]
+
+        assert self._mmap is not None, 'Key store is closed'
+        offset, size = self.index[rotation]
+        key = loads(memoryview(self._mmap)[offset:offset + size], self.params)
+        self._cache[rotation] = key
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return key
+
+    def __contains__(self, rotation):
+        """Checks whether the store has a key for a rotation, without loading it."""
+        return rotation in self.index
+
+    def __iter__(self):
+        """Iterates over the rotations with keys."""
+        return iter(self.index)
+
+    def __len__(self):
+        """Returns the number of keys."""
+        return len(self.index)
+
+    def close(self):
+        """Drops the cached keys and unmaps the file.
+
+        In full-RNS mode, the residues of keys that were returned by the store
+        are views of the mapped file. If such keys are still alive, the file
+        cannot be unmapped yet, so the store only drops its reference, and the
+        file is unmapped once the last of these keys is garbage collected.
+        The keys stay valid until then. No keys can be looked up after closing.
+        """
+        if self._mmap is None:
+            return
+        self._cache.clear()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+        self._mmap = None
@@ -1,4 +1,7 @@
 """A module to keep track of a secret key."""
+import sys
+
+from util.ternary_polynomial import TernaryPolynomial
 
 class SecretKey:
 
@@ -9,8 +12,12 @@ class SecretKey:
 
     Attributes:
         s (Polynomial): Secret key.
+        ternary_s (TernaryPolynomial): Secret key in sparse form, used for
+            fast products. It is None if s is not ternary.
     """
 
+    __slots__ = ('s', 'ternary_s')
+
     def __init__(self, s):
         """Sets public key to given inputs.
 
@@ -18,6 +25,36 @@ class SecretKey:
             s (Polynomial): Secret key.
         """
         self.s = s
+        self.ternary_s = TernaryPolynomial.from_polynomial(s) \
+            if TernaryPolynomial.is_ternary(s) else None
+
+    def multiply(self, poly, coeff_modulus):
+        """Multiplies a polynomial by the secret key without NTT.
+
+        Uses the sparse form of the secret key if it is ternary.
+
+        Args:
+            poly (Polynomial): Polynomial to be multiplied by the secret key.
+            coeff_modulus (int): Modulus a of coefficients of polynomial
+                ring R_a.
+
+        Returns:
+            A Polynomial which is the product of poly and the secret key.
+        """
+        if self.ternary_s is not None:
+            return self.ternary_s.multiply(poly, coeff_modulus)
+        return poly.multiply(self.s, coeff_modulus)
+
+    def memory_size(self):
+        """Returns the number of bytes used by the secret key.
+
+        Returns:
+            The size of the object and both forms of the key.
+        """
+        size = sys.getsizeof(self) + self.s.memory_size()
+        if self.ternary_s is not None:
+            size += self.ternary_s.memory_size()
+        return size
 
     def __str__(self):
         """Represents secret key as a string.
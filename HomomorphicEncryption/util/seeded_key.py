@@ -0,0 +1,131 @@
+"""A module to keep track of a key whose uniform part is generated from a seed."""
+from collections import OrderedDict
+import sys
+
+import numpy as np
+
+from util.polynomial import Polynomial
+from util.public_key import PublicKey
+from util.random_sample import sample_uniform_from_seed, sample_words_from_seed
+from util.rns_polynomial import RNSPolynomial, NTT_DOMAIN
+
+# Number of expanded polynomials kept for keys that are not cached.
+EXPANSION_CACHE_SIZE = 16
+
+# Expanded polynomials, indexed by seed, degree and modulus, in order of use.
+_EXPANDED = OrderedDict()
+
+
+def expand_uniform(seed, degree, modulus=None, crt_context=None):
+    """Generates a uniformly random polynomial from a seed.
+
+    In RNS representation, the residues modulo each prime are sampled from
+    the stream of the seed with the prime as index, directly as NTT values,
+    so the residues of a prime do not depend on the other primes.
+
+    Args:
+        seed (bytes): Seed of the polynomial.
+        degree (int): Degree d of the quotient polynomial.
+        modulus (int): Modulus of the coefficients for a Polynomial.
+        crt_context (CRTContext): Context of the primes for an RNSPolynomial.
+
+    Returns:
+        A Polynomial modulo modulus, or an RNSPolynomial in NTT form.
+    """
+    if crt_context:
+        residues = [sample_words_from_seed(seed, prime, degree, prime)
+                    for prime in crt_context.primes]
+        return RNSPolynomial(degree, np.array(residues), crt_context, NTT_DOMAIN)
+    return Polynomial(degree, sample_uniform_from_seed(seed, modulus, degree))
+
+
+class SeededPublicKey(PublicKey):
+
+    """An instance of a public or switching key whose second element is
+    generated from a seed.
+
+    The second element of a public key or switching key is uniformly random,
+    so only the seed is stored, and the polynomial is expanded when it is
+    first used. If cache is set, it is then kept with the key. Otherwise,
+    the last EXPANSION_CACHE_SIZE expanded polynomials of all keys are kept,
+    which bounds the memory of many rotation keys.
+
+    Attributes:
+        p0 (Polynomial): First element of key.
+        seed (bytes): Seed of the second element.
+        degree (int): Degree d of the quotient polynomial.
+        modulus (int): Modulus of the second element in big-integer mode, or None.
+        crt_context (CRTContext): Context of the second element in RNS mode, or None.
+        cache (bool): Whether to keep the expanded second element with the key.
+    """
+
+    __slots__ = ('seed', 'degree', 'modulus', 'crt_context', 'cache', '_p1')
+
+    def __init__(self, p0, seed, degree, modulus=None, crt_context=None, cache=True):
+        """Sets key to given inputs.
+
+        Args:
+            p0 (Polynomial): First element of key.
+            seed (bytes): Seed of the second element.
+            degree (int): Degree d of the quotient polynomial.
+            modulus (int): Modulus of the second element in big-integer mode.
+            crt_context (CRTContext): Context of the second element in RNS mode.
+            cache (bool): Whether to keep the expanded second element with the key.
+        """
+        assert modulus or crt_context, 'Seeded key needs a modulus or a CRT context'
+        self.p0 = p0
+        self.seed = seed
+        self.degree = degree
+        self.modulus = modulus
+        self.crt_context = crt_context
+        self.cache = cache
+        self._p1 = None
+
+    @property
+    def p1(self):
+        """Returns the second element of the key, expanding it if necessary.
+
+        Returns:
+            Second element of the key.
+        """
+        if self._p1 is not None:
+            return self._p1
+        if self.cache:
+            self._p1 = self.expand()
+            return self._p1
+
+        key = (self.seed, self.degree, self.modulus,
+               tuple(self.crt_context.primes) if self.crt_context else None)
+        if key in _EXPANDED:
+            _EXPANDED.move_to_end(key)
+        else:
+            _EXPANDED[key] = self.expand()
+            if len(_EXPANDED) > EXPANSION_CACHE_SIZE:
+                _EXPANDED.popitem(last=False)
+        return _EXPANDED[key]
+
+    def expand(self):
+        """Generates the second element of the key from its seed.
+
+        Returns:
+            The second element of the key.
+        """
+        return expand_uniform(self.seed, self.degree, self.modulus, self.crt_context)
+
+    def memory_size(self):
+        """Returns the number of bytes used by the key.
+
+        Shared expanded polynomials are not counted.
+
+        Returns:
+            The size of the object, its first element, its seed, and its
+            second element if it is kept with the key.
+        """
+        size = sys.getsizeof(self) + self.p0.memory_size() + sys.getsizeof(self.seed)
+        if self._p1 is not None:
+            size += self._p1.memory_size()
+        return size
+
+    def compress(self):
+        """Drops the expanded second element, so that only the seed is kept."""
+        self._p1 = None
@@ -0,0 +1,397 @@
+"""A module to serialize ciphertexts, plaintexts and keys in a compact binary format.
+
+Every object starts with a header of the magic bytes b'HEOB', the format
+version and a type tag. All integers are little-endian. Polynomials in RNS
+representation are stored as their primes, followed by one 64-bit word per
+residue, and are read back as arrays that share memory with the buffer.
+Polynomials with big-integer coefficients are stored with a fixed number of
+bytes per coefficient, where a coefficient c is stored as c + 2^(8w - 1) in
+w bytes. Scaling factors are stored exactly, as integers in big-integer mode
+and as 64-bit floats in full-RNS mode. Nested objects, e.g. the polynomials
+of a ciphertext, are stored without the magic bytes and version.
+"""
+import io
+import math
+import struct
+
+import numpy as np
+
+from bfv.bfv_relin_key import BFVRelinKey
+from util.bit_operations import pack_ints, unpack_ints
+from util.ciphertext import Ciphertext
+from util.crt import CRTContext
+from util.plaintext import Plaintext
+from util.polynomial import Polynomial
+from util.public_key import PublicKey
+from util.rns_polynomial import RNSPolynomial, COEFF_DOMAIN, NTT_DOMAIN
+from util.rotation_key import RotationKey
+from util.seeded_key import SeededPublicKey
+from util.switching_key import SwitchingKey
+
+MAGIC = b'HEOB'
+VERSION = 2
+
+# Type tags.
+POLYNOMIAL = 1
+RNS_POLYNOMIAL = 2
+CIPHERTEXT = 3
+PLAINTEXT = 4
+PUBLIC_KEY = 5
+SEEDED_PUBLIC_KEY = 6
+SWITCHING_KEY = 7
+ROTATION_KEY = 8
+BFV_RELIN_KEY = 9
+
+_DOMAINS = [COEFF_DOMAIN, NTT_DOMAIN]
+
+# Tags of scaling factors, which are None, exact integers or floats.
+_NO_SCALE = 0
+_INT_SCALE = 1
+_FLOAT_SCALE = 2
+
+# Dtype of residues in the format.
+_WORD = np.dtype('<u8')
+
+
+def dumps(obj):
+    """Serializes an object to bytes.
+
+    Args:
+        obj: Ciphertext, Plaintext, PublicKey, SeededPublicKey, SwitchingKey,
+            RotationKey, BFVRelinKey, Polynomial or RNSPolynomial.
+
+    Returns:
+        A bytes object.
+    """
+    stream = io.BytesIO()
+    dump(obj, stream)
+    return stream.getvalue()
+
+
+def dump(obj, stream):
+    """Writes an object to a binary stream.
+
+    Arrays of residues are written directly from their memory.
+
+    Args:
+        obj: Object to serialize, as for dumps.
+        stream: Binary file-like object with a write method.
+    """
+    stream.write(MAGIC + struct.pack('<B', VERSION))
+    BinaryWriter(stream).write(obj)
+
+
+def loads(buffer, params=None, offset=0):
+    """Deserializes an object from a buffer.
+
+    Residues of RNS polynomials are read as arrays which share memory with
+    the buffer, so e.g. a memory-mapped file is not copied.
+
+    Args:
+        buffer: Object that supports the buffer protocol, e.g. bytes or mmap.
+        params: Parameters whose CRT contexts are used for RNS polynomials
+            with the same primes, e.g. CKKSParameters. Can be None, in which
+            case a CRTContext is created for each set of primes.
+        offset (int): Position of the object in the buffer.
+
+    Returns:
+        The deserialized object.
+    """
+    reader = BinaryReader(buffer, params, offset)
+    magic = reader.read_bytes(len(MAGIC))
+    assert magic == MAGIC, 'Buffer does not contain a serialized object'
+    version = reader.read_struct('<B')[0]
+    assert version == VERSION, 'Unsupported format version %d' % version
+    return reader.read()
+
+
+class BinaryWriter:
+
+    """Writes objects in the binary format to a stream.
+
+    Attributes:
+        stream: Binary file-like object.
+    """
+
+    def __init__(self, stream):
+        """Inits BinaryWriter.
+
+        Args:
+            stream: Binary file-like object with a write method.
+        """
+        self.stream = stream
+
+    def write_struct(self, fmt, *values):
+        """Writes values packed with a struct format."""
+        self.stream.write(struct.pack(fmt, *values))
+
+    def write_int(self, value):
+        """Writes an integer of any size with its sign and length."""
+        value = int(value)
+        data = abs(value).to_bytes((abs(value).bit_length() + 7) // 8, 'little')
+        self.write_struct('<BI', value < 0, len(data))
+        self.stream.write(data)
+
+    def write_optional_int(self, value):
+        """Writes an integer which may be None."""
+        self.write_struct('<B', value is not None)
+        if value is not None:
+            self.write_int(value)
+
+    def write_scaling_factor(self, value):
+        """Writes a scaling factor which may be None, keeping integers exact."""
+        if value is None:
+            self.write_struct('<B', _NO_SCALE)
+        elif isinstance(value, int):
+            self.write_struct('<B', _INT_SCALE)
+            self.write_int(value)
+        else:
+            self.write_struct('<Bd', _FLOAT_SCALE, value)
+
+    def write(self, obj):
+        """Writes a type tag and the object.
+
+        Args:
+            obj: Object to serialize.
+        """
+        # SeededPublicKey is a subclass of PublicKey, so it is checked first.
+        if isinstance(obj, SeededPublicKey):
+            self.write_seeded_key(obj)
+        elif isinstance(obj, PublicKey):
+            self.write_struct('<B', PUBLIC_KEY)
+            self.write(obj.p0)
+            self.write(obj.p1)
+        elif isinstance(obj, Ciphertext):
+            assert obj.c2 is None, 'Ciphertext must be relinearized before it is serialized'
+            assert obj.pending_scale is None, 'Ciphertext must be rescaled before it is serialized'
+            self.write_struct('<B', CIPHERTEXT)
+            self.write_struct('<i', -1 if obj.level is None else obj.level)
+            self.write_scaling_factor(obj.scaling_factor)
+            self.write_optional_int(obj.modulus)
+            self.write(obj.c0)
+            self.write(obj.c1)
+        elif isinstance(obj, Plaintext):
+            self.write_struct('<B', PLAINTEXT)
+            self.write_scaling_factor(obj.scaling_factor)
+            self.write(obj.poly)
+        elif isinstance(obj, SwitchingKey):
+            self.write_struct('<BI', SWITCHING_KEY, len(obj.keys))
+            for key in obj.keys:
+                self.write(key)
+        elif isinstance(obj, RotationKey):
+            self.write_struct('<Bq', ROTATION_KEY, obj.rotation)
+            self.write(obj.key)
+        elif isinstance(obj, BFVRelinKey):
+            self.write_struct('<B', BFV_RELIN_KEY)
+            self.write_int(obj.base)
+            self.write_struct('<I', len(obj.keys))
+            for key in obj.keys:
+                self.write(key[0])
+                self.write(key[1])
+        elif isinstance(obj, RNSPolynomial):
+            self.write_rns_polynomial(obj)
+        elif isinstance(obj, Polynomial):
+            self.write_polynomial(obj)
+        else:
+            raise TypeError('Cannot serialize object of type ' + type(obj).__name__)
+
+    def write_polynomial(self, poly):
+        """Writes a polynomial with big-integer coefficients.
+
+        Args:
+            poly (Polynomial): Polynomial to write.
+        """
+        coeffs = [int(c) for c in poly.coeffs]
+        bits = max(max(coeffs), -min(coeffs)).bit_length() + 1
+        # Limbs are 64 bits wide.
+        width = 8 * max(1, int(math.ceil(bits / 64)))
+        self.write_struct('<BII', POLYNOMIAL, poly.ring_degree, width)
+        bias = int.from_bytes((b'\x00' * (width - 1) + b'\x80') * len(coeffs), 'little')
+        self.stream.write((pack_ints(coeffs, width) + bias).to_bytes(width * len(coeffs), 'little'))
+
+    def write_rns_polynomial(self, poly):
+        """Writes a polynomial in RNS representation.
+
+        Args:
+            poly (RNSPolynomial): Polynomial to write.
+        """
+        primes = poly.crt_context.primes
+        self.write_struct('<BIIB', RNS_POLYNOMIAL, poly.ring_degree, len(primes),
+                          _DOMAINS.index(poly.domain))
+        self.stream.write(np.asarray(primes, dtype=_WORD).data)
+        self.stream.write(np.ascontiguousarray(poly.residues, dtype=_WORD).data)
+
+    def write_seeded_key(self, key):
+        """Writes a key whose second element is generated from a seed.
+
+        Args:
+            key (SeededPublicKey): Key to write.
+        """
+        self.write_struct('<BII', SEEDED_PUBLIC_KEY, key.degree, len(key.seed))
+        self.stream.write(key.seed)
+        self.write_optional_int(key.modulus)
+        primes = key.crt_context.primes if key.crt_context else []
+        self.write_struct('<I', len(primes))
+        self.stream.write(np.asarray(primes, dtype=_WORD).data)
+        self.write(key.p0)
+
+
+class BinaryReader:
+
+    """Reads objects in the binary format from a buffer.
+
+    Attributes:
+        buffer (memoryview): View of the buffer.
+        offset (int): Position of the next byte to read.
+        contexts (dict): CRT contexts, indexed by their tuple of primes.
+    """
+
+    def __init__(self, buffer, params=None, offset=0):
+        """Inits BinaryReader.
+
+        Args:
+            buffer: Object that supports the buffer protocol.
+            params: Parameters with CRT contexts to reuse, or None.
+            offset (int): Position of the first byte to read.
+        """
+        self.buffer = memoryview(buffer).cast('B')
+        self.offset = offset
+        self.contexts = {}
+        if params is not None:
+            contexts = []
+            if getattr(params, 'chain', None):
+                contexts += params.chain.level_contexts + params.chain.extended_contexts
+            if getattr(params, 'crt_context', None):
+                contexts.append(params.crt_context)
+            for crt in contexts:
+                self.contexts.setdefault(tuple(crt.primes), crt)
+
+    def read_bytes(self, size):
+        """Reads bytes, copying them."""
+        data = self.buffer[self.offset:self.offset + size].tobytes()
+        self.offset += size
+        return data
+
+    def read_struct(self, fmt):
+        """Reads values packed with a struct format."""
+        values = struct.unpack_from(fmt, self.buffer, self.offset)
+        self.offset += struct.calcsize(fmt)
+        return values
+
+    def read_int(self):
+        """Reads an integer written by BinaryWriter.write_int."""
+        negative, size = self.read_struct('<BI')
+        value = int.from_bytes(self.buffer[self.offset:self.offset + size], 'little')
+        self.offset += size
+        return -value if negative else value
+
+    def read_optional_int(self):
+        """Reads an integer which may be None."""
+        return self.read_int() if self.read_struct('<B')[0] else None
+
+    def read_scaling_factor(self):
+        """Reads a scaling factor written by BinaryWriter.write_scaling_factor."""
+        tag = self.read_struct('<B')[0]
+        if tag == _INT_SCALE:
+            return self.read_int()
+        if tag == _FLOAT_SCALE:
+            return self.read_struct('<d')[0]
+        assert tag == _NO_SCALE, 'Unknown scaling factor tag %d' % tag
+        return None
+
+    def read_words(self, count):
+        """Returns an array of 64-bit words which shares memory with the buffer."""
+        words = np.frombuffer(self.buffer, dtype=_WORD, count=count, offset=self.offset)
+        self.offset += 8 * count
+        return words
+
+    def context(self, primes, degree):
+        """Returns the CRT context of a list of primes.
+
+        Args:
+            primes (list): Primes of the context.
+            degree (int): Degree of the polynomials.
+
+        Returns:
+            A CRTContext from the parameters, or a new one.
+        """
+        key = tuple(primes)
+        if key not in self.contexts:
+            self.contexts[key] = CRTContext.from_primes(list(primes), degree)
+        return self.contexts[key]
+
+    def read(self):
+        """Reads a type tag and the object.
+
+        Returns:
+            The deserialized object.
+        """
+        tag = self.read_struct('<B')[0]
+        if tag == PUBLIC_KEY:
+            return PublicKey(self.read(), self.read())
+        if tag == CIPHERTEXT:
+            level = self.read_struct('<i')[0]
+            scaling_factor = self.read_scaling_factor()
+            modulus = self.read_optional_int()
+            c0 = self.read()
+            c1 = self.read()
+            return Ciphertext(c0, c1, scaling_factor, modulus, None if level < 0 else level)
+        if tag == PLAINTEXT:
+            scaling_factor = self.read_scaling_factor()
+            return Plaintext(self.read(), scaling_factor)
+        if tag == SWITCHING_KEY:
+            num_keys = self.read_struct('<I')[0]
+            return SwitchingKey([self.read() for _ in range(num_keys)])
+        if tag == ROTATION_KEY:
+            rotation = self.read_struct('<q')[0]
+            return RotationKey(rotation, self.read())
+        if tag == BFV_RELIN_KEY:
+            base = self.read_int()
+            num_keys = self.read_struct('<I')[0]
+            return BFVRelinKey(base, [(self.read(), self.read()) for _ in range(num_keys)])
+        if tag == POLYNOMIAL:
+            return self.read_polynomial()
+        if tag == RNS_POLYNOMIAL:
+            return self.read_rns_polynomial()
+        if tag == SEEDED_PUBLIC_KEY:
+            return self.read_seeded_key()
+        raise ValueError('Unknown type tag %d' % tag)
+
+    def read_polynomial(self):
+        """Reads a polynomial with big-integer coefficients, after its tag.
+
+        Returns:
+            A Polynomial.
+        """
+        degree, width = self.read_struct('<II')
+        size = width * degree
+        bias = int.from_bytes((b'\x00' * (width - 1) + b'\x80') * degree, 'little')
+        value = int.from_bytes(self.buffer[self.offset:self.offset + size], 'little') - bias
+        self.offset += size
+        return Polynomial(degree, unpack_ints(value, width, degree))
+
+    def read_rns_polynomial(self):
+        """Reads a polynomial in RNS representation, after its tag.
+
+        Returns:
+            An RNSPolynomial whose residues share memory with the buffer.
+        """
+        degree, num_primes, domain = self.read_struct('<IIB')
+        primes = [int(prime) for prime in self.read_words(num_primes)]
+        residues = self.read_words(num_primes * degree).reshape(num_primes, degree)
+        return RNSPolynomial(degree, residues, self.context(primes, degree), _DOMAINS[domain])
+
+    def read_seeded_key(self):
+        """Reads a key whose second element is generated from a seed, after its tag.
+
+        Returns:
+            A SeededPublicKey.
+        """
+        degree, seed_size = self.read_struct('<II')
+        seed = self.read_bytes(seed_size)
+        modulus = self.read_optional_int()
+        num_primes = self.read_struct('<I')[0]
+        primes = [int(prime) for prime in self.read_words(num_primes)]
+        crt_context = self.context(primes, degree) if primes else None
+        p0 = self.read()
+        return SeededPublicKey(p0, seed, degree, modulus, crt_context)
@@ -0,0 +1,59 @@
+"""A module to keep track of a switching key with digit decomposition."""
+import sys
+
+class SwitchingKey:
+
+    """An instance of a switching key for hybrid key switching.
+
+    The switching key consists of one pair of polynomials for each digit
+    of the decomposition of the ciphertext modulus, generated from
+    key_generator.py.
+
+    Attributes:
+        keys (list of PublicKeys): Pair of polynomials for each digit.
+    """
+
+    __slots__ = ('keys',)
+
+    def __init__(self, keys):
+        """Sets switching key to given inputs.
+
+        Args:
+            keys (list of PublicKeys): Pair of polynomials for each digit.
+        """
+        self.keys = keys
+
+    @property
+    def p0(self):
+        """Returns the first element of the key for a single digit.
+
+        Returns:
+            First element of the key of the first digit.
+        """
+        return self.keys[0].p0
+
+    @property
+    def p1(self):
+        """Returns the second element of the key for a single digit.
+
+        Returns:
+            Second element of the key of the first digit.
+        """
+        return self.keys[0].p1
+
+    def memory_size(self):
+        """Returns the number of bytes used by the switching key.
+
+        Returns:
+            The size of the object and the keys of all digits.
+        """
+        return sys.getsizeof(self) + sys.getsizeof(self.keys) \
+            + sum(key.memory_size() for key in self.keys)
+
+    def __str__(self):
+        """Represents SwitchingKey as a string.
+
+        Returns:
+            A string which represents the SwitchingKey.
+        """
+        return '\n'.join('Digit %d:\n' % i + str(key) for i, key in enumerate(self.keys))
@@ -0,0 +1,136 @@
+"""A module to handle sparse polynomials with coefficients in {-1, 0, 1},
+such as secret keys and small errors.
+"""
+import sys
+
+import numpy as np
+
+from util.polynomial import Polynomial
+
+# Largest product magnitude for which products are accumulated in 64-bit integers.
+WORD_BOUND = 1 << 62
+
+
+class TernaryPolynomial:
+    """A polynomial in the ring R whose coefficients are all in {-1, 0, 1}.
+
+    Here, R is the quotient ring Z[x]/f(x), where f(x) = x^d + 1. Only the
+    indices and signs of the nonzero coefficients are stored. Multiplying a
+    polynomial by x^i only shifts its coefficients and negates the ones that
+    wrap around, so a product with a ternary polynomial of Hamming weight h
+    is a sum of h signed shifts, which needs O(h * d) additions and no
+    multiplications.
+
+    Attributes:
+        ring_degree (int): Degree d of polynomial that determines the
+            quotient ring R.
+        indices (ndarray): Exponents of the nonzero coefficients.
+        signs (ndarray): Nonzero coefficients, each 1 or -1.
+    """
+
+    __slots__ = ('ring_degree', 'indices', 'signs')
+
+    def __init__(self, degree, indices, signs):
+        """Inits TernaryPolynomial with the nonzero coefficients.
+
+        Args:
+            degree (int): Degree of quotient polynomial for ring R.
+            indices (list): Exponents of the nonzero coefficients.
+            signs (list): Nonzero coefficients, each 1 or -1.
+        """
+        assert len(indices) == len(signs), 'Number of indices and signs must be the same'
+        self.ring_degree = degree
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.signs = np.asarray(signs, dtype=np.int8)
+
+        assert np.all((self.indices >= 0) & (self.indices < degree)), 'Index out of range'
+        assert np.all(np.abs(self.signs) == 1), 'Signs must be 1 or -1'
+
+    def memory_size(self):
+        """Returns the number of bytes used by the polynomial.
+
+        Returns:
+            The size of the object and its arrays.
+        """
+        return sys.getsizeof(self) + self.indices.nbytes + self.signs.nbytes
+
+    @staticmethod
+    def is_ternary(poly):
+        """Checks whether all coefficients of a polynomial are in {-1, 0, 1}.
+
+        Args:
+            poly (Polynomial): Polynomial to check.
+
+        Returns:
+            True if the polynomial is ternary.
+        """
+        return all(c in (-1, 0, 1) for c in poly.coeffs)
+
+    @classmethod
+    def from_polynomial(cls, poly):
+        """Extracts the nonzero coefficients of a ternary polynomial.
+
+        Args:
+            poly (Polynomial): Polynomial with coefficients in {-1, 0, 1}.
+
+        Returns:
+            A TernaryPolynomial with the same coefficients.
+        """
+        assert cls.is_ternary(poly), 'Polynomial is not ternary'
+        indices = [i for i, c in enumerate(poly.coeffs) if c != 0]
+        return cls(poly.ring_degree, indices, [poly.coeffs[i] for i in indices])
+
+    def to_polynomial(self):
+        """Converts polynomial to a Polynomial with a full coefficient list.
+
+        Returns:
+            A Polynomial with the same coefficients.
+        """
+        coeffs = [0] * self.ring_degree
+        for i, sign in zip(self.indices.tolist(), self.signs.tolist()):
+            coeffs[i] = sign
+        return Polynomial(self.ring_degree, coeffs)
+
+    def multiply(self, poly, coeff_modulus=None):
+        """Multiplies a polynomial by the current ternary polynomial.
+
+        For each nonzero coefficient s * x^i, adds the coefficients of poly
+        shifted by i to the accumulator for sign s, and the ones that wrap
+        around to the accumulator for sign -s. Each shift is a single array
+        addition. The coefficients are accumulated in 64-bit integers if the
+        result is small enough, and as Python integers otherwise.
+
+        Args:
+            poly (Polynomial): Polynomial to be multiplied to the current
+                polynomial.
+            coeff_modulus (int): Modulus a of coefficients of polynomial
+                ring R_a. If it is None, the coefficients are not reduced.
+
+        Returns:
+            A Polynomial which is the product of the two polynomials.
+        """
+        assert isinstance(poly, Polynomial)
+        assert poly.ring_degree == self.ring_degree, 'Polynomials have different degrees'
+        degree = self.ring_degree
+
+        coeffs = poly.coeffs
+        if coeff_modulus:
+            coeffs = [c % coeff_modulus for c in coeffs]
+        max_coeff = max(abs(c) for c in coeffs)
+        dtype = np.int64 if max_coeff * max(len(self.indices), 1) < WORD_BOUND else object
+
+        values = np.array(coeffs, dtype=dtype)
+        plus = np.zeros(degree, dtype=dtype)
+        minus = np.zeros(degree, dtype=dtype)
+
+        for i, sign in zip(self.indices.tolist(), self.signs.tolist()):
+            # Since x^d = -1, the coefficients shifted past x^(d - 1) change sign.
+            same, flipped = (plus, minus) if sign > 0 else (minus, plus)
+            same[i:] += values[:degree - i]
+            flipped[:i] += values[degree - i:]
+
+        prod = [int(c) for c in plus - minus]
+        if coeff_modulus:
+            prod = [c % coeff_modulus for c in prod]
+
+        return Polynomial(degree, prod)